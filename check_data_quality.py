@@ -1,188 +1,476 @@
 #!/usr/bin/env python3
 """
 Data Quality Check Script
-Compare December 2025 vs January 2026 data in PGE meter database
+Compare arbitrary periods (or every month) in the PGE meter database
+
+All statistics are computed as aggregate SQL inside SQLite, so the report
+never loads the meter_data table into memory. Each meter gets its own
+report; several meters are analysed in parallel, one connection per thread.
+
+Usage:
+    python check_data_quality.py                          # last two months
+    python check_data_quality.py --period 2025-12 --period 2026-01
+    python check_data_quality.py --period 2026-01-01:2026-01-15
+    python check_data_quality.py --all-months --json      # JSON to stdout
+    python check_data_quality.py --all-months --json-out logs/data-quality.json --fail-on critical
+    python check_data_quality.py --meter 12345 --period 2026-01
 """
 
+import sys
+import json
+import math
 import sqlite3
-import pandas as pd
-from datetime import datetime
-
-# Connect to database
-conn = sqlite3.connect('data/pge_meter_data.sqlite')
-
-# Query all data
-query = "SELECT dttm_start, value, hour FROM meter_data ORDER BY dttm_start"
-df = pd.read_sql_query(query, conn)
-conn.close()
-
-# Convert to datetime
-df['dttm_start'] = pd.to_datetime(df['dttm_start'])
-df['date'] = df['dttm_start'].dt.date
-df['month'] = df['dttm_start'].dt.to_period('M')
-
-print("=" * 80)
-print("DATA QUALITY ANALYSIS: December 2025 vs January 2026")
-print("=" * 80)
-
-# Overall summary
-print("\n1. OVERALL DATA SUMMARY")
-print("-" * 80)
-print(f"Total records: {len(df)}")
-print(f"Date range: {df['dttm_start'].min()} to {df['dttm_start'].max()}")
-print(f"Total days: {df['date'].nunique()}")
-
-# Monthly breakdown
-print("\n2. MONTHLY BREAKDOWN")
-print("-" * 80)
-monthly_stats = df.groupby('month').agg({
-    'value': ['count', 'sum', 'mean', 'min', 'max', 'std'],
-    'date': 'nunique'
-}).round(2)
-monthly_stats.columns = ['Records', 'Total_kWh', 'Avg_kWh', 'Min_kWh', 'Max_kWh', 'Std_kWh', 'Days']
-print(monthly_stats)
-
-# December 2025 analysis
-dec_2025 = df[df['month'] == '2025-12']
-jan_2026 = df[df['month'] == '2026-01']
-
-print("\n3. DECEMBER 2025 DETAILS")
-print("-" * 80)
-if len(dec_2025) > 0:
-    print(f"Records: {len(dec_2025)}")
-    print(f"Days: {dec_2025['date'].nunique()}")
-    print(f"Date range: {dec_2025['dttm_start'].min()} to {dec_2025['dttm_start'].max()}")
-    print(f"Total consumption: {dec_2025['value'].sum():.2f} kWh")
-    print(f"Average hourly: {dec_2025['value'].mean():.2f} kWh")
-    print(f"Daily average: {dec_2025.groupby('date')['value'].sum().mean():.2f} kWh/day")
-    print(f"Min hourly: {dec_2025['value'].min():.2f} kWh")
-    print(f"Max hourly: {dec_2025['value'].max():.2f} kWh")
-    print(f"Std dev: {dec_2025['value'].std():.2f} kWh")
-
-    # Check for gaps
-    dec_daily = dec_2025.groupby('date').size()
-    print(f"\nRecords per day (expected 24 for hourly data):")
-    print(f"  Min: {dec_daily.min()}, Max: {dec_daily.max()}, Avg: {dec_daily.mean():.1f}")
-    missing_days = dec_daily[dec_daily < 24]
-    if len(missing_days) > 0:
-        print(f"  WARNING: {len(missing_days)} days with incomplete data:")
-        for date, count in missing_days.items():
-            print(f"    {date}: {count} records (missing {24-count})")
-else:
-    print("NO DATA FOUND FOR DECEMBER 2025")
-
-print("\n4. JANUARY 2026 DETAILS")
-print("-" * 80)
-if len(jan_2026) > 0:
-    print(f"Records: {len(jan_2026)}")
-    print(f"Days: {jan_2026['date'].nunique()}")
-    print(f"Date range: {jan_2026['dttm_start'].min()} to {jan_2026['dttm_start'].max()}")
-    print(f"Total consumption: {jan_2026['value'].sum():.2f} kWh")
-    print(f"Average hourly: {jan_2026['value'].mean():.2f} kWh")
-    print(f"Daily average: {jan_2026.groupby('date')['value'].sum().mean():.2f} kWh/day")
-    print(f"Min hourly: {jan_2026['value'].min():.2f} kWh")
-    print(f"Max hourly: {jan_2026['value'].max():.2f} kWh")
-    print(f"Std dev: {jan_2026['value'].std():.2f} kWh")
-
-    # Check for gaps
-    jan_daily = jan_2026.groupby('date').size()
-    print(f"\nRecords per day (expected 24 for hourly data):")
-    print(f"  Min: {jan_daily.min()}, Max: {jan_daily.max()}, Avg: {jan_daily.mean():.1f}")
-    missing_days = jan_daily[jan_daily < 24]
-    if len(missing_days) > 0:
-        print(f"  WARNING: {len(missing_days)} days with incomplete data:")
-        for date, count in missing_days.items():
-            print(f"    {date}: {count} records (missing {24-count})")
-else:
-    print("NO DATA FOUND FOR JANUARY 2026")
-
-# Comparison
-if len(dec_2025) > 0 and len(jan_2026) > 0:
-    print("\n5. COMPARISON: DECEMBER 2025 vs JANUARY 2026")
+import argparse
+from datetime import date, datetime
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent / 'scripts' / 'automation'))
+import meter_store  # noqa: E402
+import pipeline_metrics  # noqa: E402
+
+DB_FILE = 'data/pge_meter_data.sqlite'
+
+OUTLIER_STD_DEVS = 3               # Values > mean + 3 std are outliers
+MAX_REALISTIC_HOURLY_KWH = 500     # Above this, values are probably still Wh
+MAX_REALISTIC_DAILY_KWH = 200      # Expected for 1-bed apartment: 30-50 kWh/day
+RECORD_COUNT_DIFF_THRESHOLD = 100  # Flag periods whose record counts differ by more
+MAX_PARALLEL_METERS = 4            # Meters analysed at once
+
+ISSUE_LEVELS = ['warning', 'issue', 'critical']
+
+
+def parse_period(spec):
+    """
+    Parse a period spec into (label, start, end) with an exclusive end
+
+    Accepts 'YYYY-MM' for a calendar month or 'YYYY-MM-DD:YYYY-MM-DD' for an
+    inclusive date range.
+    """
+    try:
+        if ':' in spec:
+            first, last = (date.fromisoformat(part) for part in spec.split(':', 1))
+            end = date.fromordinal(last.toordinal() + 1)
+            return spec, first.isoformat(), end.isoformat()
+
+        month_start = datetime.strptime(spec, '%Y-%m').date()
+        if month_start.month == 12:
+            month_end = date(month_start.year + 1, 1, 1)
+        else:
+            month_end = date(month_start.year, month_start.month + 1, 1)
+        return spec, month_start.isoformat(), month_end.isoformat()
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            f"Invalid period '{spec}' (use YYYY-MM or YYYY-MM-DD:YYYY-MM-DD)"
+        )
+
+
+def sample_std(count, total, total_sq):
+    """Sample standard deviation from count, sum and sum of squares"""
+    if not count or count < 2:
+        return None
+    variance = (total_sq - total * total / count) / (count - 1)
+    return math.sqrt(max(variance, 0.0))
+
+
+def has_meter_column(conn):
+    """True if meter_data is keyed by meter (databases from before meters were tracked are not)"""
+    return any(row[1] == 'meter_id' for row in conn.execute("PRAGMA table_info(meter_data)"))
+
+
+def list_meters(conn):
+    """Return every meter id in the database, or [None] for a pre-meter database"""
+    if not has_meter_column(conn):
+        return [None]
+    return [row[0] for row in conn.execute("SELECT DISTINCT meter_id FROM meter_data ORDER BY 1")] or [None]
+
+
+def meter_scope(meter_id):
+    """Return a WHERE condition and its parameters restricting queries to one meter"""
+    if meter_id is None:
+        return "1 = 1", ()
+    return "meter_id = ?", (meter_id,)
+
+
+def overall_summary(conn, meter_id=None):
+    """Total records, date range and number of days in the table"""
+    scope, scope_args = meter_scope(meter_id)
+    records, first, last, days = conn.execute(f"""
+        SELECT COUNT(*), MIN(dttm_start), MAX(dttm_start),
+               COUNT(DISTINCT substr(dttm_start, 1, 10))
+        FROM meter_data
+        WHERE {scope}
+    """, scope_args).fetchone()
+    return {'records': records, 'first': first, 'last': last, 'days': days}
+
+
+MONTHLY_FROM_ROLLUP_SQL = """
+    SELECT month, records, total_kwh, total_kwh / records, min_kwh, max_kwh, sum_sq, days
+    FROM monthly_usage
+    WHERE {scope}
+    ORDER BY month
+"""
+
+MONTHLY_FROM_READINGS_SQL = """
+    SELECT substr(dttm_start, 1, 7) AS month,
+           COUNT(*), SUM(value), AVG(value), MIN(value), MAX(value),
+           SUM(value * value), COUNT(DISTINCT substr(dttm_start, 1, 10))
+    FROM meter_data
+    WHERE {scope}
+    GROUP BY month
+    ORDER BY month
+"""
+
+
+def has_rollups(conn):
+    """True if the ingest-maintained monthly_usage rollup exists and is populated"""
+    try:
+        return conn.execute("SELECT meter_id FROM monthly_usage LIMIT 1").fetchone() is not None
+    except sqlite3.OperationalError:
+        return False
+
+
+def monthly_breakdown(conn, meter_id=None):
+    """Per-month record count, totals and spread (from the rollup when available)"""
+    months = []
+    scope, scope_args = meter_scope(meter_id)
+    query = MONTHLY_FROM_ROLLUP_SQL if has_rollups(conn) and meter_id is not None else MONTHLY_FROM_READINGS_SQL
+    for row in conn.execute(query.format(scope=scope), scope_args):
+        month, records, total, mean, min_value, max_value, total_sq, days = row
+        months.append({
+            'month': month,
+            'records': records,
+            'total_kwh': total,
+            'avg_kwh': mean,
+            'min_kwh': min_value,
+            'max_kwh': max_value,
+            'std_kwh': sample_std(records, total, total_sq),
+            'days': days
+        })
+    return months
+
+
+def expected_readings(day):
+    """Hourly readings in a local day: 24, or 23/25 on DST change days"""
+    start_ts, end_ts = meter_store.day_bounds(day)
+    return (end_ts - start_ts) // 3600
+
+
+def period_stats(conn, label, start, end, meter_id=None):
+    """Aggregate statistics for one period, pushed down to SQLite"""
+    scope, scope_args = meter_scope(meter_id)
+    bounds = scope_args + (start, end)
+    records, first, last, total, mean, min_value, max_value, total_sq, zeros = conn.execute(f"""
+        SELECT COUNT(*), MIN(dttm_start), MAX(dttm_start), SUM(value), AVG(value),
+               MIN(value), MAX(value), SUM(value * value), SUM(value = 0)
+        FROM meter_data
+        WHERE {scope} AND dttm_start >= ? AND dttm_start < ?
+    """, bounds).fetchone()
+
+    stats = {'period': label, 'start': start, 'end': end, 'records': records}
+    if not records:
+        return stats
+
+    daily = conn.execute(f"""
+        SELECT substr(dttm_start, 1, 10) AS reading_date, COUNT(*), SUM(value)
+        FROM meter_data
+        WHERE {scope} AND dttm_start >= ? AND dttm_start < ?
+        GROUP BY reading_date
+        ORDER BY reading_date
+    """, bounds).fetchall()
+    day_counts = [count for _, count, _ in daily]
+    short_days = [(day, count, expected_readings(day)) for day, count, _ in daily
+                  if count < expected_readings(day)]
+
+    std = sample_std(records, total, total_sq)
+    outlier_threshold = mean + OUTLIER_STD_DEVS * std if std is not None else None
+    outliers = {'count': 0, 'max_kwh': None, 'max_at': None}
+    if outlier_threshold is not None:
+        count = conn.execute(f"""
+            SELECT COUNT(*) FROM meter_data
+            WHERE {scope} AND dttm_start >= ? AND dttm_start < ? AND value > ?
+        """, bounds + (outlier_threshold,)).fetchone()[0]
+        outliers['count'] = count
+        if count:
+            outliers['max_at'], outliers['max_kwh'] = conn.execute(f"""
+                SELECT dttm_start, value FROM meter_data
+                WHERE {scope} AND dttm_start >= ? AND dttm_start < ?
+                ORDER BY value DESC LIMIT 1
+            """, bounds).fetchone()
+
+    stats.update({
+        'days': len(daily),
+        'first': first,
+        'last': last,
+        'total_kwh': total,
+        'avg_hourly_kwh': mean,
+        'avg_daily_kwh': sum(day_total for _, _, day_total in daily) / len(daily),
+        'min_kwh': min_value,
+        'max_kwh': max_value,
+        'std_kwh': std,
+        'zero_records': zeros,
+        'zero_pct': zeros / records * 100,
+        'readings_per_day': {
+            'min': min(day_counts),
+            'max': max(day_counts),
+            'avg': sum(day_counts) / len(day_counts)
+        },
+        'complete_days': len(daily) - len(short_days),
+        'incomplete_days': [
+            {'date': day, 'records': count, 'missing': expected - count}
+            for day, count, expected in short_days
+        ],
+        'outlier_threshold_kwh': outlier_threshold,
+        'outliers': outliers
+    })
+    return stats
+
+
+def compare_periods(previous, current):
+    """Change in average daily consumption between two periods"""
+    if not previous['records'] or not current['records']:
+        return None
+    pct_change = (current['avg_daily_kwh'] - previous['avg_daily_kwh']) / previous['avg_daily_kwh'] * 100 \
+        if previous['avg_daily_kwh'] else None
+    return {
+        'from': previous['period'],
+        'to': current['period'],
+        'avg_daily_kwh_from': previous['avg_daily_kwh'],
+        'avg_daily_kwh_to': current['avg_daily_kwh'],
+        'pct_change': pct_change
+    }
+
+
+def detect_issues(overall_max, periods):
+    """Flag suspicious patterns as {'level', 'message'} dicts"""
+    issues = []
+
+    for previous, current in zip(periods, periods[1:]):
+        if previous['records'] and current['records'] and \
+                abs(previous['records'] - current['records']) > RECORD_COUNT_DIFF_THRESHOLD:
+            issues.append({'level': 'issue', 'message':
+                           f"Large difference in record counts ({previous['period']}: "
+                           f"{previous['records']}, {current['period']}: {current['records']})"})
+
+    # Check if values are still in Wh range (too high)
+    if overall_max is not None and overall_max > MAX_REALISTIC_HOURLY_KWH:
+        issues.append({'level': 'critical', 'message':
+                       f"Maximum hourly value is {overall_max:.2f} kWh - likely still in Wh, not kWh! "
+                       f"Expected max hourly for 1-bed apartment: 2-5 kWh"})
+
+    for stats in periods:
+        if not stats['records']:
+            issues.append({'level': 'warning', 'message': f"No data found for {stats['period']}"})
+        elif stats['avg_daily_kwh'] > MAX_REALISTIC_DAILY_KWH:
+            issues.append({'level': 'issue', 'message':
+                           f"{stats['period']} daily average ({stats['avg_daily_kwh']:.0f} kWh/day) "
+                           f"is unrealistically high. Expected for 1-bed apartment: 30-50 kWh/day"})
+
+    return issues
+
+
+def build_report(conn, periods, meter_id=None):
+    """Run every check for one meter and return the report as a JSON-serialisable dict"""
+    overall = overall_summary(conn, meter_id)
+    monthly = monthly_breakdown(conn, meter_id)
+    overall_max = max((month['max_kwh'] for month in monthly), default=None)
+
+    period_results = [period_stats(conn, *period, meter_id=meter_id) for period in periods]
+    comparisons = [
+        comparison for comparison in (
+            compare_periods(previous, current)
+            for previous, current in zip(period_results, period_results[1:])
+        ) if comparison
+    ]
+
+    return {
+        'generated_at': datetime.now().isoformat(timespec='seconds'),
+        'meter_id': meter_id,
+        'overall': overall,
+        'monthly': monthly,
+        'periods': period_results,
+        'comparisons': comparisons,
+        'issues': detect_issues(overall_max, period_results)
+    }
+
+
+def fmt(value, digits=2):
+    """Format an optional number"""
+    return 'n/a' if value is None else f"{value:.{digits}f}"
+
+
+def print_report(report):
+    """Print the human-readable report"""
+    labels = [stats['period'] for stats in report['periods']]
+    print("=" * 80)
+    print(f"DATA QUALITY ANALYSIS: {' vs '.join(labels) if labels else 'no periods'}")
+    if report.get('meter_id') is not None:
+        print(f"Meter: {report['meter_id']}")
+    print("=" * 80)
+
+    overall = report['overall']
+    print("\n1. OVERALL DATA SUMMARY")
+    print("-" * 80)
+    print(f"Total records: {overall['records']}")
+    print(f"Date range: {overall['first']} to {overall['last']}")
+    print(f"Total days: {overall['days']}")
+
+    print("\n2. MONTHLY BREAKDOWN")
+    print("-" * 80)
+    print(f"{'Month':<9}{'Records':>9}{'Total_kWh':>12}{'Avg_kWh':>9}{'Min_kWh':>9}"
+          f"{'Max_kWh':>9}{'Std_kWh':>9}{'Days':>6}")
+    for month in report['monthly']:
+        print(f"{month['month']:<9}{month['records']:>9}{fmt(month['total_kwh']):>12}"
+              f"{fmt(month['avg_kwh']):>9}{fmt(month['min_kwh']):>9}{fmt(month['max_kwh']):>9}"
+              f"{fmt(month['std_kwh']):>9}{month['days']:>6}")
+
+    section = 3
+    for stats in report['periods']:
+        print(f"\n{section}. {stats['period']} DETAILS")
+        print("-" * 80)
+        section += 1
+        if not stats['records']:
+            print(f"NO DATA FOUND FOR {stats['period']}")
+            continue
+
+        print(f"Records: {stats['records']}")
+        print(f"Days: {stats['days']}")
+        print(f"Date range: {stats['first']} to {stats['last']}")
+        print(f"Total consumption: {stats['total_kwh']:.2f} kWh")
+        print(f"Average hourly: {stats['avg_hourly_kwh']:.2f} kWh")
+        print(f"Daily average: {stats['avg_daily_kwh']:.2f} kWh/day")
+        print(f"Min hourly: {stats['min_kwh']:.2f} kWh")
+        print(f"Max hourly: {stats['max_kwh']:.2f} kWh")
+        print(f"Std dev: {fmt(stats['std_kwh'])} kWh")
+        print(f"Zero value records: {stats['zero_records']} ({stats['zero_pct']:.1f}%)")
+
+        per_day = stats['readings_per_day']
+        print("\nRecords per day (expected one per local hour: 24, 23 or 25 on DST days):")
+        print(f"  Min: {per_day['min']}, Max: {per_day['max']}, Avg: {per_day['avg']:.1f}")
+        print(f"  Complete days: {stats['complete_days']}/{stats['days']}")
+        if stats['incomplete_days']:
+            print(f"  WARNING: {len(stats['incomplete_days'])} days with incomplete data:")
+            for day in stats['incomplete_days']:
+                print(f"    {day['date']}: {day['records']} records (missing {day['missing']})")
+
+        outliers = stats['outliers']
+        print(f"Outliers (>{OUTLIER_STD_DEVS} std dev): {outliers['count']}")
+        if outliers['count']:
+            print(f"  Max: {outliers['max_kwh']:.2f} kWh at {outliers['max_at']}")
+
+    if report['comparisons']:
+        print(f"\n{section}. COMPARISON")
+        print("-" * 80)
+        section += 1
+        for comparison in report['comparisons']:
+            print(f"Average daily consumption {comparison['from']} -> {comparison['to']}:")
+            print(f"  {comparison['from']}: {comparison['avg_daily_kwh_from']:.2f} kWh/day")
+            print(f"  {comparison['to']}: {comparison['avg_daily_kwh_to']:.2f} kWh/day")
+            if comparison['pct_change'] is not None:
+                print(f"  Change: {comparison['pct_change']:+.1f}%")
+
+    print(f"\n{section}. DATA QUALITY ISSUES DETECTED")
     print("-" * 80)
+    if not report['issues']:
+        print("✓ No major data quality issues detected!")
+    else:
+        for issue in report['issues']:
+            print(f"⚠ {issue['level'].upper()}: {issue['message']}")
+
+    print("\n" + "=" * 80)
+    print("Analysis complete!")
+    print("=" * 80)
+
+
+def open_database(path):
+    """Open the database read-only"""
+    return sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+
+
+def meter_report(db_path, periods, meter_id):
+    """Build one meter's report on its own connection (safe to run in a worker thread)"""
+    conn = open_database(db_path)
+    try:
+        return build_report(conn, periods, meter_id)
+    finally:
+        conn.close()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Data quality report for the PGE meter database")
+    parser.add_argument('--db', default=DB_FILE, help=f"SQLite database (default: {DB_FILE})")
+    parser.add_argument('--period', action='append', type=parse_period, default=[],
+                        help="Period to analyse: YYYY-MM or YYYY-MM-DD:YYYY-MM-DD (repeatable)")
+    parser.add_argument('--all-months', action='store_true', help="Analyse every month in the database")
+    parser.add_argument('--meter', action='append', default=[],
+                        help="Meter (usage point) id to analyse (repeatable; default: every meter)")
+    parser.add_argument('--jobs', type=int, default=MAX_PARALLEL_METERS,
+                        help=f"Meters analysed in parallel (default: {MAX_PARALLEL_METERS})")
+    parser.add_argument('--json', action='store_true', help="Print the report as JSON instead of text")
+    parser.add_argument('--json-out', metavar='PATH', help="Also write the JSON report to PATH")
+    parser.add_argument('--fail-on', choices=ISSUE_LEVELS,
+                        help="Exit with status 1 if an issue at this level or above is found")
+    return parser.parse_args(argv)
+
+
+def run(args, metrics):
+    """Build, print and save the report; returns the exit code"""
+    conn = open_database(args.db)
+    try:
+        meters = args.meter or list_meters(conn)
+        periods = list(args.period)
+        if args.all_months or not periods:
+            months = [row[0] for row in conn.execute(
+                "SELECT DISTINCT substr(dttm_start, 1, 7) FROM meter_data ORDER BY 1"
+            )]
+            if not args.all_months:
+                # Default: compare the two most recent months
+                months = months[-2:]
+            periods.extend(parse_period(month) for month in months)
+    finally:
+        conn.close()
+
+    with metrics.stage('reports') as stage:
+        with ThreadPoolExecutor(max_workers=max(1, min(args.jobs, len(meters)))) as pool:
+            reports = list(pool.map(lambda meter_id: meter_report(args.db, periods, meter_id), meters))
+        stage['items'] = len(meters) * len(periods)
+    metrics.incr('meters', len(meters))
+    metrics.incr('periods', len(periods))
+
+    if len(reports) == 1:
+        report = reports[0]
+    else:
+        report = {
+            'generated_at': datetime.now().isoformat(timespec='seconds'),
+            'meters': reports,
+            'issues': [dict(issue, meter_id=meter['meter_id']) for meter in reports for issue in meter['issues']]
+        }
+    report['database'] = args.db
+    metrics.incr('issues', len(report['issues']))
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        for meter in reports:
+            print_report(meter)
+
+    if args.json_out:
+        with open(args.json_out, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.fail_on:
+        threshold = ISSUE_LEVELS.index(args.fail_on)
+        if any(ISSUE_LEVELS.index(issue['level']) >= threshold for issue in report['issues']):
+            return 1
+    return 0
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    with pipeline_metrics.instrument('check_data_quality') as metrics:
+        metrics.exit_code = run(args, metrics)
+    return metrics.exit_code
+
 
-    dec_daily_avg = dec_2025.groupby('date')['value'].sum().mean()
-    jan_daily_avg = jan_2026.groupby('date')['value'].sum().mean()
-
-    pct_change = ((jan_daily_avg - dec_daily_avg) / dec_daily_avg) * 100
-
-    print(f"Average daily consumption:")
-    print(f"  December: {dec_daily_avg:.2f} kWh/day")
-    print(f"  January:  {jan_daily_avg:.2f} kWh/day")
-    print(f"  Change:   {pct_change:+.1f}%")
-
-    # Check for unusual patterns
-    print(f"\nData quality indicators:")
-    dec_complete_days = (dec_2025.groupby('date').size() == 24).sum()
-    jan_complete_days = (jan_2026.groupby('date').size() == 24).sum()
-    print(f"  Complete days (24 hours):")
-    print(f"    December: {dec_complete_days}/{dec_2025['date'].nunique()}")
-    print(f"    January:  {jan_complete_days}/{jan_2026['date'].nunique()}")
-
-    # Check for zeros
-    dec_zeros = (dec_2025['value'] == 0).sum()
-    jan_zeros = (jan_2026['value'] == 0).sum()
-    print(f"  Zero value records:")
-    print(f"    December: {dec_zeros} ({dec_zeros/len(dec_2025)*100:.1f}%)")
-    print(f"    January:  {jan_zeros} ({jan_zeros/len(jan_2026)*100:.1f}%)")
-
-    # Check for outliers (values > 3 std devs from mean)
-    dec_mean, dec_std = dec_2025['value'].mean(), dec_2025['value'].std()
-    jan_mean, jan_std = jan_2026['value'].mean(), jan_2026['value'].std()
-
-    dec_outliers = dec_2025[dec_2025['value'] > dec_mean + 3*dec_std]
-    jan_outliers = jan_2026[jan_2026['value'] > jan_mean + 3*jan_std]
-
-    print(f"  Outliers (>3 std dev):")
-    print(f"    December: {len(dec_outliers)}")
-    if len(dec_outliers) > 0:
-        print(f"      Max: {dec_outliers['value'].max():.2f} kWh at {dec_outliers['dttm_start'].iloc[0]}")
-    print(f"    January:  {len(jan_outliers)}")
-    if len(jan_outliers) > 0:
-        print(f"      Max: {jan_outliers['value'].max():.2f} kWh at {jan_outliers['dttm_start'].iloc[0]}")
-
-# Check for suspicious patterns
-print("\n6. DATA QUALITY ISSUES DETECTED")
-print("-" * 80)
-
-issues = []
-
-# Check if December has significantly more/less data than January
-if len(dec_2025) > 0 and len(jan_2026) > 0:
-    if abs(len(dec_2025) - len(jan_2026)) > 100:
-        issues.append(f"ISSUE: Large difference in record counts (Dec: {len(dec_2025)}, Jan: {len(jan_2026)})")
-
-# Check if values are still in Wh range (too high)
-if df['value'].max() > 500:
-    issues.append(f"CRITICAL: Maximum hourly value is {df['value'].max():.2f} kWh - likely still in Wh, not kWh!")
-    issues.append("         Expected max hourly for 1-bed apartment: 2-5 kWh")
-    issues.append("         This suggests the data reprocessing hasn't been run yet")
-
-# Check daily averages
-if len(dec_2025) > 0:
-    dec_daily_avg = dec_2025.groupby('date')['value'].sum().mean()
-    if dec_daily_avg > 200:
-        issues.append(f"ISSUE: December daily average ({dec_daily_avg:.0f} kWh/day) is unrealistically high")
-        issues.append("       Expected for 1-bed apartment: 30-50 kWh/day")
-
-if len(jan_2026) > 0:
-    jan_daily_avg = jan_2026.groupby('date')['value'].sum().mean()
-    if jan_daily_avg > 200:
-        issues.append(f"ISSUE: January daily average ({jan_daily_avg:.0f} kWh/day) is unrealistically high")
-        issues.append("       Expected for 1-bed apartment: 30-50 kWh/day")
-
-# Check for missing data
-if len(dec_2025) == 0:
-    issues.append("WARNING: No data found for December 2025")
-if len(jan_2026) == 0:
-    issues.append("WARNING: No data found for January 2026")
-
-if len(issues) == 0:
-    print("✓ No major data quality issues detected!")
-else:
-    for issue in issues:
-        print(f"⚠ {issue}")
-
-print("\n" + "=" * 80)
-print("Analysis complete!")
-print("=" * 80)
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""
+Meter Data Repair Tool
+Apply a correction rule to readings in a time range, in place
+
+Rules:
+1. --scale FACTOR      Multiply values by FACTOR
+2. --detect-units      Rescale readings that are still in Wh to kWh. PG&E
+                       delivers whole local days, so the unit is decided per
+                       meter day: a day is in Wh when more than half of its
+                       readings exceed --threshold kWh/hour, and then every
+                       reading of that day (small or fractional ones too)
+                       is rescaled
+3. --shift HOURS       Move readings by a whole number of hours
+
+The default is a dry run that previews the affected rows. With --apply the
+correction runs as indexed UPDATEs inside one transaction, the rollup tables
+are refreshed for the affected days, anomaly flags on those days are cleared
+(the detector state is rebuilt on the next ingest), the days' native-resolution
+readings are dropped in favour of the corrected hours and the repair is
+recorded in the data_repairs audit table. Nothing is ever loaded into memory row by row.
+
+Usage:
+    python repair_meter_data.py --period 2026-01 --detect-units
+    python repair_meter_data.py --period 2026-01 --detect-units --apply --note "Wh feed in January"
+    python repair_meter_data.py --period 2026-01-12:2026-01-28 --scale 0.001 --min-value 10 --apply
+    python repair_meter_data.py --period 2025-11-02:2025-11-02 --shift -1 --meter 12345
+"""
+
+import sys
+import json
+import argparse
+from pathlib import Path
+
+from check_data_quality import DB_FILE, parse_period
+
+sys.path.insert(0, str(Path(__file__).parent / 'scripts' / 'automation'))
+import meter_store  # noqa: E402
+import parquet_snapshot  # noqa: E402
+import anomaly_detector  # noqa: E402
+
+WH_PER_KWH = 1000
+
+# Shifted rows get their local dttm_start/hour from the tz_offsets spans
+SHIFTED_LOCAL_SQL = ("datetime(-ts + (SELECT utc_offset FROM tz_offsets"
+                     " WHERE -ts / 3600 BETWEEN first_bucket AND last_bucket), 'unixepoch')")
+DEFAULT_WH_THRESHOLD = 10  # kWh/hour - above this a household reading is almost certainly Wh
+
+
+def build_rule(args):
+    """
+    Translate the CLI options into a rule description
+
+    Returns:
+        Dict with 'name', 'params', the SQL 'where' fragment and its 'args'
+        (applied on top of the time range)
+    """
+    where, where_args = [], []
+    if args.meter:
+        where.append("meter_id = ?")
+        where_args.append(args.meter)
+    if args.min_value is not None:
+        where.append("value > ?")
+        where_args.append(args.min_value)
+    if args.max_value is not None:
+        where.append("value <= ?")
+        where_args.append(args.max_value)
+
+    if args.detect_units:
+        # A Wh feed segment covers whole days whose typical reading is far
+        # above any household kWh/hour; a single kWh spike does not qualify
+        _, start, end = args.period
+        where.append("""(meter_id, substr(dttm_start, 1, 10)) IN (
+            SELECT meter_id, substr(dttm_start, 1, 10) FROM meter_data
+            WHERE dttm_start >= ? AND dttm_start < ?
+            GROUP BY 1, 2
+            HAVING SUM(value > ?) * 2 > COUNT(*)
+        )""")
+        where_args.extend([start, end, args.threshold])
+        return {'name': 'detect-units', 'factor': 1 / WH_PER_KWH,
+                'params': {'threshold': args.threshold, 'factor': 1 / WH_PER_KWH, 'meter': args.meter},
+                'where': where, 'args': where_args}
+
+    if args.scale is not None:
+        return {'name': 'scale', 'factor': args.scale,
+                'params': {'factor': args.scale, 'min_value': args.min_value, 'max_value': args.max_value,
+                           'meter': args.meter},
+                'where': where, 'args': where_args}
+
+    return {'name': 'shift', 'hours': args.shift,
+            'params': {'hours': args.shift, 'min_value': args.min_value, 'max_value': args.max_value,
+                       'meter': args.meter},
+            'where': where, 'args': where_args}
+
+
+def selection(rule, start, end, alias=''):
+    """Return the WHERE clause and parameters selecting the rows to repair"""
+    prefix = f"{alias}." if alias else ''
+    clauses = [f"{prefix}dttm_start >= ?", f"{prefix}dttm_start < ?"]
+    clauses += [
+        clause.replace('value', f"{prefix}value").replace('meter_id', f"{prefix}meter_id")
+        for clause in rule['where']
+    ]
+    return ' AND '.join(clauses), [start, end] + rule['args']
+
+
+def offsets_cte(rule, start, end):
+    """
+    Build a WITH clause defining tz_offsets: the LOCAL_TZ offset of every UTC
+    hour a shift can move readings into, as (first_bucket, last_bucket,
+    utc_offset) spans between DST transitions, so local times are derived in
+    SQL without writing to the database (dry runs open it read-only)
+
+    Returns:
+        (sql, params) to prefix the statement that reads tz_offsets
+    """
+    lo, hi = meter_store.local_to_epoch([start, end])
+    shift = rule['hours'] * 3600
+    spans = []
+    for bucket in range((lo + shift) // 3600 - 1, (hi + shift) // 3600 + 2):
+        offset = meter_store.utc_offset(bucket)
+        if spans and spans[-1][2] == offset:
+            spans[-1][1] = bucket
+        else:
+            spans.append([bucket, bucket, offset])
+    values = ', '.join(['(?, ?, ?)'] * len(spans))
+    return (f"WITH tz_offsets (first_bucket, last_bucket, utc_offset) AS (VALUES {values})",
+            [value for span in spans for value in span])
+
+
+def preview(conn, rule, start, end):
+    """
+    Summarize the rows a rule would change
+
+    Returns:
+        Dict with row count, affected days, before/after totals and ranges,
+        and (for shifts) the number of target slots already occupied
+    """
+    where, params = selection(rule, start, end)
+    rows, first, last, total, min_value, max_value = conn.execute(f"""
+        SELECT COUNT(*), MIN(dttm_start), MAX(dttm_start), SUM(value), MIN(value), MAX(value)
+        FROM meter_data WHERE {where}
+    """, params).fetchone()
+
+    summary = {'rows': rows, 'first': first, 'last': last,
+               'total_before': total, 'min_before': min_value, 'max_before': max_value}
+
+    if 'factor' in rule:
+        factor = rule['factor']
+        summary.update(
+            total_after=total * factor if total is not None else None,
+            min_after=min_value * factor if min_value is not None else None,
+            max_after=max_value * factor if max_value is not None else None,
+        )
+        summary['days'] = conn.execute(f"""
+            SELECT DISTINCT meter_id, substr(dttm_start, 1, 10) FROM meter_data WHERE {where}
+        """, params).fetchall()
+    else:
+        shift = rule['hours'] * 3600
+        offsets, offset_params = offsets_cte(rule, start, end)
+        summary['total_after'] = total
+        summary['days'] = conn.execute(f"""
+            {offsets}
+            SELECT meter_id, substr(dttm_start, 1, 10) FROM meter_data WHERE {where}
+            UNION
+            SELECT meter_id, substr(datetime(ts + ? + utc_offset, 'unixepoch'), 1, 10)
+            FROM meter_data JOIN tz_offsets ON (ts + ?) / 3600 BETWEEN first_bucket AND last_bucket
+            WHERE {where}
+        """, offset_params + params + [shift, shift] + params).fetchall()
+
+        # Target slots held by rows that are not themselves being moved
+        moved_where, moved_params = selection(rule, start, end, alias='m')
+        kept_where, kept_params = selection(rule, start, end, alias='t')
+        summary['collisions'] = conn.execute(f"""
+            SELECT COUNT(*)
+            FROM meter_data m
+            JOIN meter_data t ON t.meter_id = m.meter_id AND t.ts = m.ts + ?
+            WHERE {moved_where} AND NOT ({kept_where})
+        """, [shift] + moved_params + kept_params).fetchone()[0]
+
+    return summary
+
+
+def apply_rule(conn, rule, start, end):
+    """Run the correction UPDATE(s); must be called inside a transaction"""
+    where, params = selection(rule, start, end)
+
+    if 'factor' in rule:
+        return conn.execute(f"UPDATE meter_data SET value = value * ? WHERE {where}",
+                            [rule['factor']] + params).rowcount
+
+    # Park moved rows on negated keys first so rows shifting onto each
+    # other's slots never collide mid-statement, then restore the key and
+    # derive the local time. day/day2 keep the existing numbering from the
+    # first date in the table.
+    offsets, offset_params = offsets_cte(rule, start, end)
+    first = meter_store.first_data_date(conn).isoformat()
+    moved = conn.execute(f"UPDATE meter_data SET ts = -(ts + ?) WHERE {where}",
+                         [rule['hours'] * 3600] + params).rowcount
+
+    conn.execute(f"""
+        {offsets}
+        UPDATE meter_data
+        SET ts = -ts,
+            dttm_start = {SHIFTED_LOCAL_SQL},
+            hour = CAST(strftime('%H', {SHIFTED_LOCAL_SQL}) AS INTEGER),
+            day = CAST(julianday(date({SHIFTED_LOCAL_SQL})) - julianday(?) AS INTEGER) + 1,
+            day2 = CAST(julianday(date({SHIFTED_LOCAL_SQL})) - julianday(?) AS INTEGER) + 1
+        WHERE ts < 0
+    """, offset_params + [first, first])
+    return moved
+
+
+def reset_anomalies(conn, meter_days):
+    """Drop detector state and flags of the repaired days of each meter"""
+    spans = {}
+    for meter_id, day in meter_days:
+        first, last = spans.get(meter_id, (day, day))
+        spans[meter_id] = (min(first, day), max(last, day))
+    for meter_id, (first, last) in spans.items():
+        anomaly_detector.reset(conn, meter_id, meter_store.day_bounds(first)[0], meter_store.day_bounds(last)[1])
+
+
+def repair(conn, rule, start, end, note=None):
+    """
+    Apply a rule in one transaction, refresh rollups and log the repair
+
+    Returns:
+        Number of rows changed
+    """
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        summary = preview(conn, rule, start, end)
+        if summary.get('collisions'):
+            raise ValueError(f"Shift would overwrite {summary['collisions']} existing readings")
+
+        profile_before = meter_store.profile_contributions(conn, summary['days'])
+        changed = apply_rule(conn, rule, start, end)
+        meter_store.refresh_rollups(conn, summary['days'], profile_before)
+        reset_anomalies(conn, summary['days'])
+        meter_store.drop_intervals(conn, summary['days'])
+        conn.execute("""
+            INSERT INTO data_repairs
+                (rule, params, range_start, range_end, rows_affected, total_before, total_after, note)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, (rule['name'], json.dumps(rule['params']), start, end, changed,
+              summary['total_before'], summary['total_after'], note))
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return changed
+
+
+def fmt(value, digits=3):
+    return 'N/A' if value is None else f"{value:.{digits}f}"
+
+
+def print_preview(rule, label, summary):
+    print("=" * 80)
+    print(f"REPAIR PREVIEW: {rule['name']} {json.dumps(rule['params'])} over {label}")
+    print("=" * 80)
+    print(f"Rows affected: {summary['rows']}")
+    if not summary['rows']:
+        return
+    print(f"Date range: {summary['first']} to {summary['last']} ({len(summary['days'])} meter day(s) of rollups)")
+    print(f"Total: {fmt(summary['total_before'], 2)} -> {fmt(summary['total_after'], 2)} kWh")
+    if 'factor' in rule:
+        print(f"Min:   {fmt(summary['min_before'])} -> {fmt(summary['min_after'])} kWh")
+        print(f"Max:   {fmt(summary['max_before'])} -> {fmt(summary['max_after'])} kWh")
+    else:
+        print(f"Collisions with existing readings: {summary['collisions']}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Repair readings in the PGE meter database")
+    parser.add_argument('--db', default=DB_FILE, help=f"SQLite database (default: {DB_FILE})")
+    parser.add_argument('--period', required=True, type=parse_period,
+                        help="Time range: YYYY-MM or YYYY-MM-DD:YYYY-MM-DD")
+
+    rules = parser.add_mutually_exclusive_group(required=True)
+    rules.add_argument('--scale', type=float, metavar='FACTOR', help="Multiply values by FACTOR")
+    rules.add_argument('--detect-units', action='store_true',
+                       help="Convert readings still in Wh to kWh")
+    rules.add_argument('--shift', type=int, metavar='HOURS', help="Move readings by HOURS (may be negative)")
+
+    parser.add_argument('--threshold', type=float, default=DEFAULT_WH_THRESHOLD,
+                        help=f"--detect-units: kWh/hour above which a reading is Wh (default: {DEFAULT_WH_THRESHOLD})")
+    parser.add_argument('--meter', help="Only this meter (usage point) id (default: every meter)")
+    parser.add_argument('--min-value', type=float, help="Only rows with value above this")
+    parser.add_argument('--max-value', type=float, help="Only rows with value at or below this")
+    parser.add_argument('--note', help="Free-text reason stored in the audit log")
+    parser.add_argument('--apply', action='store_true', help="Write the correction (default: dry run)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    label, start, end = args.period
+    rule = build_rule(args)
+
+    try:
+        conn = meter_store.connect(args.db, readonly=not args.apply)
+    except (meter_store.SchemaError, FileNotFoundError) as e:
+        print(f"✗ {e}")
+        return 1
+    try:
+        summary = preview(conn, rule, start, end)
+        print_preview(rule, label, summary)
+
+        if not summary['rows']:
+            print("\n✓ Nothing to repair")
+            return 0
+        if not args.apply:
+            print("\nDry run - rerun with --apply to write these changes")
+            return 0
+        if summary.get('collisions'):
+            print("\n✗ Refusing to shift onto existing readings")
+            return 1
+
+        changed = repair(conn, rule, start, end, args.note)
+        print(f"\n✓ Updated {changed} rows; rollups refreshed and repair logged in data_repairs")
+        parquet_snapshot.update_snapshot(conn)
+    finally:
+        meter_store.close(conn)
+
+    print("  Refresh the RDS backup with: Rscript scripts/automation/process_pge_data.R")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
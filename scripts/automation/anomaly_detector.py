@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Online Anomaly Detection
+
+Scores readings as they are ingested, keeping O(1) state per meter:
+1. A baseline per hour of the week (weekday x hour): running mean and
+   variance over roughly the last ANOMALY_BASELINE_WEEKS weeks, flagging
+   readings more than ANOMALY_Z_THRESHOLD standard deviations away
+2. An exponentially weighted moving average of the hourly series (the
+   moving-average method of anomaly.R), flagging readings more than
+   ANOMALY_EWMA_THRESHOLD weighted standard deviations from it
+3. State lives in `anomaly_baseline` / `anomaly_ewma` and flags in
+   `anomalies`, all in the meter database, so a nightly run only touches
+   the readings it added
+
+Each reading is scored against the state before it, then folded in. A
+meter without state is bootstrapped once from its stored history.
+
+Used by meter_store.upsert_hourly_readings().
+"""
+
+import os
+import math
+import logging
+from datetime import date
+
+logger = logging.getLogger(__name__)
+
+ANOMALY_Z_THRESHOLD = float(os.getenv('PGE_ANOMALY_Z_THRESHOLD', '3.0'))
+ANOMALY_EWMA_THRESHOLD = float(os.getenv('PGE_ANOMALY_EWMA_THRESHOLD', '2.5'))
+ANOMALY_BASELINE_WEEKS = int(os.getenv('PGE_ANOMALY_BASELINE_WEEKS', '8'))
+ANOMALY_EWMA_SPAN_HOURS = int(os.getenv('PGE_ANOMALY_EWMA_SPAN_HOURS', '24'))
+MIN_BASELINE_READINGS = 4           # Weeks of history before an hour of the week is scored
+MIN_STD_KWH = 0.01                  # Floor so flat usage does not divide by zero
+
+SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS anomaly_baseline (
+    meter_id TEXT NOT NULL,
+    hour_of_week INTEGER NOT NULL,  -- weekday * 24 + hour, 0 = Sunday midnight
+    readings INTEGER NOT NULL,
+    mean REAL NOT NULL,
+    variance REAL NOT NULL,
+    PRIMARY KEY (meter_id, hour_of_week)
+);
+CREATE TABLE IF NOT EXISTS anomaly_ewma (
+    meter_id TEXT PRIMARY KEY,
+    readings INTEGER NOT NULL,
+    mean REAL NOT NULL,
+    variance REAL NOT NULL,
+    last_ts INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS anomalies (
+    meter_id TEXT NOT NULL,
+    ts INTEGER NOT NULL,
+    method TEXT NOT NULL,
+    dttm_start TEXT NOT NULL,
+    value REAL NOT NULL,
+    expected REAL NOT NULL,
+    score REAL NOT NULL,
+    detected_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (meter_id, ts, method)
+);
+CREATE INDEX IF NOT EXISTS idx_anomalies_ts ON anomalies(ts);
+"""
+
+STATE_TABLES = ('anomaly_baseline', 'anomaly_ewma')
+
+ANOMALY_SQL = """
+INSERT INTO anomalies (meter_id, ts, method, dttm_start, value, expected, score)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (meter_id, ts, method) DO UPDATE SET
+    value = excluded.value,
+    expected = excluded.expected,
+    score = excluded.score,
+    detected_at = CURRENT_TIMESTAMP
+"""
+
+
+def update_moments(readings, mean, variance, value, window):
+    """
+    Fold one value into a running mean and (population) variance
+
+    Exact (Welford) for the first `window` values, then exponentially
+    weighted with weight 1/window so old readings fade out.
+
+    Returns:
+        (readings, mean, variance)
+    """
+    readings += 1
+    weight = 1.0 / min(readings, window)
+    delta = value - mean
+    mean += weight * delta
+    variance = (1 - weight) * (variance + weight * delta * delta)
+    return readings, mean, variance
+
+
+def z_score(value, mean, variance):
+    return (value - mean) / max(math.sqrt(variance), MIN_STD_KWH)
+
+
+class MeterState:
+    """Anomaly state of one meter, loaded once and written back once"""
+
+    def __init__(self, conn, meter_id):
+        self.meter_id = meter_id
+        self.baseline = {
+            hour_of_week: [readings, mean, variance]
+            for hour_of_week, readings, mean, variance in conn.execute(
+                "SELECT hour_of_week, readings, mean, variance FROM anomaly_baseline WHERE meter_id = ?",
+                (meter_id,))
+        }
+        row = conn.execute("SELECT readings, mean, variance, last_ts FROM anomaly_ewma WHERE meter_id = ?",
+                           (meter_id,)).fetchone()
+        self.exists = row is not None
+        self.ewma = list(row) if row else [0, 0.0, 0.0, None]
+        self.weekdays = {}
+        self.ewma_alpha = 2.0 / (ANOMALY_EWMA_SPAN_HOURS + 1)
+
+    def hour_of_week(self, dttm_start, hour):
+        day = dttm_start[:10]
+        weekday = self.weekdays.get(day)
+        if weekday is None:
+            weekday = self.weekdays[day] = date.fromisoformat(day).isoweekday() % 7
+        return weekday * 24 + hour
+
+    def observe(self, ts, dttm_start, hour, value):
+        """
+        Score one reading against the current state, then fold it in
+
+        Returns:
+            List of (method, expected, score) flags
+        """
+        flags = []
+        slot = self.hour_of_week(dttm_start, hour)
+        readings, mean, variance = self.baseline.get(slot, (0, 0.0, 0.0))
+        if readings >= MIN_BASELINE_READINGS:
+            score = z_score(value, mean, variance)
+            if abs(score) > ANOMALY_Z_THRESHOLD:
+                flags.append(('zscore', mean, score))
+        self.baseline[slot] = list(update_moments(readings, mean, variance, value, ANOMALY_BASELINE_WEEKS))
+
+        # The EWMA follows the series in time order; late backfills only
+        # feed the hour-of-week baseline
+        readings, mean, variance, last_ts = self.ewma
+        if last_ts is None or ts > last_ts:
+            if readings >= ANOMALY_EWMA_SPAN_HOURS:
+                score = z_score(value, mean, variance)
+                if abs(score) > ANOMALY_EWMA_THRESHOLD:
+                    flags.append(('ewma', mean, score))
+            if readings == 0:
+                mean = value
+            delta = value - mean
+            mean += self.ewma_alpha * delta
+            variance = (1 - self.ewma_alpha) * (variance + self.ewma_alpha * delta * delta)
+            self.ewma = [readings + 1, mean, variance, ts]
+        return flags
+
+    def save(self, conn):
+        conn.executemany("""
+            INSERT OR REPLACE INTO anomaly_baseline (meter_id, hour_of_week, readings, mean, variance)
+            VALUES (?, ?, ?, ?, ?)
+        """, ((self.meter_id, slot, *moments) for slot, moments in self.baseline.items()))
+        if self.ewma[3] is not None:
+            conn.execute("""
+                INSERT OR REPLACE INTO anomaly_ewma (meter_id, readings, mean, variance, last_ts)
+                VALUES (?, ?, ?, ?, ?)
+            """, (self.meter_id, *self.ewma))
+
+
+def bootstrap(conn, state):
+    """Replay a meter's stored readings into empty state without flagging"""
+    replayed = 0
+    for ts, dttm_start, hour, value in conn.execute(
+            "SELECT ts, dttm_start, hour, value FROM meter_data WHERE meter_id = ? ORDER BY ts",
+            (state.meter_id,)):
+        state.observe(ts, dttm_start, hour, value)
+        replayed += 1
+    if replayed:
+        logger.info(f"Bootstrapped anomaly state for meter {state.meter_id} from {replayed} readings")
+
+
+def score_new_readings(conn, meter_id, rows):
+    """
+    Score readings that are about to be inserted and record any anomalies
+
+    Must run inside the ingest transaction, before the rows are written.
+
+    Args:
+        rows: (ts, dttm_start, hour, value_kwh) tuples not yet in meter_data
+
+    Returns:
+        Number of anomalies recorded
+    """
+    state = MeterState(conn, meter_id)
+    if not state.exists:
+        bootstrap(conn, state)
+
+    flagged = []
+    for ts, dttm_start, hour, value in sorted(rows):
+        for method, expected, score in state.observe(ts, dttm_start, hour, value):
+            flagged.append((meter_id, ts, method, dttm_start, value, expected, score))
+
+    state.save(conn)
+    conn.executemany(ANOMALY_SQL, flagged)
+    return len(flagged)
+
+
+def reset(conn, meter_id, start_ts=None, end_ts=None):
+    """
+    Drop a meter's anomaly state so it is rebuilt on its next ingest
+
+    Args:
+        start_ts, end_ts: If given, also drop the meter's flags in
+            [start_ts, end_ts), e.g. readings that were repaired in place
+    """
+    for table in STATE_TABLES:
+        conn.execute(f"DELETE FROM {table} WHERE meter_id = ?", (meter_id,))
+    if start_ts is not None:
+        conn.execute("DELETE FROM anomalies WHERE meter_id = ? AND ts >= ? AND ts < ?",
+                     (meter_id, start_ts, end_ts))
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Gap-Aware Backfill Planner
+
+Decides which date ranges to request from the PG&E Share My Data API
+instead of always asking for the last 7 days:
+1. Finds the hours missing from `meter_data` within the lookback window
+   with one interval scan (LAG over each meter's `ts` index)
+2. Widens each gap to whole LOCAL_TZ days, since PG&E publishes usage
+   per day
+3. Merges gaps that are close together into the smallest set of
+   contiguous request windows, each at most PGE_BACKFILL_MAX_WINDOW_DAYS
+   long
+4. Requests the newest PGE_BACKFILL_MAX_REQUESTS windows; the rest are
+   still missing next run and get planned again
+
+Hours newer than PGE_BACKFILL_SETTLE_HOURS are not counted as missing,
+as PG&E has not published them yet. A database with no readings plans
+the whole lookback window. A healthy database plans no requests at all.
+
+Usage:
+    python scripts/automation/backfill_planner.py              # print the plan
+    python scripts/automation/backfill_planner.py --lookback-days 90
+
+Used by fetch_pge_data.py and fetch.sh.
+"""
+
+import os
+import sys
+import time
+import logging
+import argparse
+
+import meter_store
+
+logger = logging.getLogger(__name__)
+
+# Planning window and API limits (override via environment)
+BACKFILL_LOOKBACK_DAYS = int(os.getenv('PGE_BACKFILL_LOOKBACK_DAYS', '30'))
+BACKFILL_SETTLE_HOURS = int(os.getenv('PGE_BACKFILL_SETTLE_HOURS', '24'))
+BACKFILL_MERGE_HOURS = int(os.getenv('PGE_BACKFILL_MERGE_HOURS', '48'))
+BACKFILL_MAX_WINDOW_DAYS = int(os.getenv('PGE_BACKFILL_MAX_WINDOW_DAYS', '30'))
+BACKFILL_MAX_REQUESTS = int(os.getenv('PGE_BACKFILL_MAX_REQUESTS', '4'))
+
+# Missing [gap_start, gap_end) hour ranges per meter. Sentinel readings
+# just before and at the end of the window make leading and trailing gaps
+# show up like any other; rows are read in (meter_id, ts) primary key order.
+GAP_SQL = """
+WITH meters AS (
+    SELECT DISTINCT meter_id FROM meter_data
+),
+bounded AS (
+    SELECT meter_id, ts FROM meter_data WHERE ts >= :start AND ts < :end
+    UNION ALL SELECT meter_id, :start - 3600 FROM meters
+    UNION ALL SELECT meter_id, :end FROM meters
+),
+spaced AS (
+    SELECT meter_id, ts, LAG(ts) OVER (PARTITION BY meter_id ORDER BY ts) AS previous_ts
+    FROM bounded
+)
+SELECT meter_id, previous_ts + 3600 AS gap_start, ts AS gap_end
+FROM spaced
+WHERE ts - previous_ts > 3600
+ORDER BY gap_start
+"""
+
+
+def planning_window(now=None, lookback_days=None, settle_hours=None):
+    """
+    Return the [start, end) ts range checked for gaps
+
+    Ends BACKFILL_SETTLE_HOURS before `now`, aligned to the hour.
+    """
+    now = int(time.time() if now is None else now)
+    lookback_days = BACKFILL_LOOKBACK_DAYS if lookback_days is None else lookback_days
+    settle_hours = BACKFILL_SETTLE_HOURS if settle_hours is None else settle_hours
+    end = now - settle_hours * 3600
+    end -= end % 3600
+    return end - lookback_days * 86400, end
+
+
+def find_gaps(conn, start, end):
+    """
+    Find the hours missing from meter_data between start and end
+
+    Returns:
+        List of (meter_id, gap_start, gap_end) ts ranges sorted by start;
+        a single (None, start, end) if no meter has any readings
+    """
+    gaps = conn.execute(GAP_SQL, {'start': start, 'end': end}).fetchall()
+    if not gaps and not conn.execute("SELECT 1 FROM meter_data LIMIT 1").fetchone():
+        return [(None, start, end)]
+    return gaps
+
+
+def local_day_span(gap_start, gap_end):
+    """Widen a [gap_start, gap_end) ts range to whole LOCAL_TZ days"""
+    (first, _), (last, _) = meter_store.epoch_to_local([gap_start, gap_end - 1])
+    return meter_store.day_bounds(first[:10])[0], meter_store.day_bounds(last[:10])[1]
+
+
+def merge_windows(ranges, merge_seconds, max_window_seconds):
+    """
+    Merge ts ranges into the fewest contiguous windows
+
+    Ranges that overlap or lie within `merge_seconds` of each other are
+    joined; windows longer than `max_window_seconds` are split.
+
+    Returns:
+        List of (start, end) ts windows sorted by start
+    """
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start - merged[-1][1] <= merge_seconds:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+
+    windows = []
+    for start, end in merged:
+        while end - start > max_window_seconds:
+            windows.append((start, start + max_window_seconds))
+            start += max_window_seconds
+        windows.append((start, end))
+    return windows
+
+
+def plan_backfill(conn, now=None, lookback_days=None, settle_hours=None,
+                  max_requests=None):
+    """
+    Plan the request windows needed to fill the gaps in meter_data
+
+    Args:
+        conn: Meter database connection (see meter_store.connect())
+        now: Epoch seconds to plan from (default: current time)
+        lookback_days: Days checked for gaps (default: BACKFILL_LOOKBACK_DAYS)
+        settle_hours: Newest hours not yet expected from PG&E
+            (default: BACKFILL_SETTLE_HOURS)
+        max_requests: Windows requested per run (default: BACKFILL_MAX_REQUESTS)
+
+    Returns:
+        Dict with the planning 'window', the 'gaps' found, the 'requests'
+        to send this run (newest first) and the 'deferred' windows
+    """
+    max_requests = BACKFILL_MAX_REQUESTS if max_requests is None else max_requests
+    start, end = planning_window(now, lookback_days, settle_hours)
+    gaps = find_gaps(conn, start, end)
+    windows = merge_windows(
+        (local_day_span(gap_start, gap_end) for _, gap_start, gap_end in gaps),
+        BACKFILL_MERGE_HOURS * 3600,
+        BACKFILL_MAX_WINDOW_DAYS * 86400,
+    )
+    windows.reverse()
+    return {
+        'window': (start, end),
+        'gaps': gaps,
+        'requests': windows[:max_requests],
+        'deferred': windows[max_requests:],
+    }
+
+
+def describe(window):
+    """Format a (start, end) ts window as local dates"""
+    (first, _), (last, _) = meter_store.epoch_to_local([window[0], window[1] - 1])
+    return f"{first[:10]} to {last[:10]}"
+
+
+def log_plan(plan):
+    missing_hours = sum((gap_end - gap_start) // 3600 for _, gap_start, gap_end in plan['gaps'])
+    meters = len({meter_id for meter_id, _, _ in plan['gaps']})
+    logger.info(f"Backfill window {describe(plan['window'])}: {missing_hours} missing hour(s) "
+                f"across {meters} meter(s) in {len(plan['gaps'])} gap(s)")
+    for window in plan['requests']:
+        logger.info(f"  Request {describe(window)}")
+    if plan['deferred']:
+        logger.warning(f"{len(plan['deferred'])} older window(s) deferred to a later run "
+                       f"(PGE_BACKFILL_MAX_REQUESTS={len(plan['requests'])})")
+
+
+def request_windows(pge_api, windows):
+    """
+    Ask PG&E to publish each window (delivered asynchronously via Supabase)
+
+    Args:
+        pge_api: SelfAccessApi
+        windows: (start, end) ts windows from plan_backfill()
+
+    Returns:
+        Number of requests PG&E accepted
+    """
+    accepted = 0
+    for start, end in windows:
+        try:
+            if pge_api.request_sequential_data(start, end_date=end):
+                accepted += 1
+            else:
+                logger.warning(f"Request for {describe((start, end))} was not accepted")
+        except Exception as e:
+            logger.error(f"Request for {describe((start, end))} failed: {e}")
+    return accepted
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Plan PG&E backfill requests for gaps in meter_data")
+    parser.add_argument('--db', help="Meter database (default: data/pge_meter_data.sqlite)")
+    parser.add_argument('--lookback-days', type=int, default=BACKFILL_LOOKBACK_DAYS)
+    parser.add_argument('--max-requests', type=int, default=BACKFILL_MAX_REQUESTS)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    try:
+        conn = meter_store.connect(args.db, readonly=True)
+    except (meter_store.SchemaError, FileNotFoundError) as e:
+        logger.error(str(e))
+        return 1
+    try:
+        plan = plan_backfill(conn, lookback_days=args.lookback_days, max_requests=args.max_requests)
+    finally:
+        meter_store.close(conn)
+    log_plan(plan)
+    if not plan['requests']:
+        logger.info("No gaps to fill - nothing to request")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+ESPI Payload Cache
+
+Content-addressed on-disk cache of raw ESPI responses:
+1. Entries are keyed by a SHA-256 of the resource URI (which carries the
+   correlationID) and stored gzip-compressed
+2. Entries older than PGE_CACHE_TTL_HOURS are ignored and removed
+3. The cache is capped at PGE_CACHE_MAX_MB, evicting least recently used
+   entries first
+
+Lets a rerun (e.g. after a failed R or mark_processed.py step) read from
+disk instead of the PGE API, and lets parsing be replayed offline.
+"""
+
+import os
+import gzip
+import time
+import hashlib
+import logging
+import threading
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# Cache settings (override via environment)
+CACHE_DIR = Path(os.getenv(
+    'PGE_CACHE_DIR',
+    Path(__file__).parent.parent.parent / 'data' / 'cache' / 'espi'
+))
+CACHE_MAX_MB = float(os.getenv('PGE_CACHE_MAX_MB', '512'))
+CACHE_TTL_HOURS = float(os.getenv('PGE_CACHE_TTL_HOURS', '72'))
+CACHE_ENABLED = os.getenv('PGE_CACHE_DISABLED', '').lower() not in ('true', '1', 'yes')
+
+CACHE_SUFFIX = '.xml.gz'
+
+
+def cache_key(uri):
+    """Return the content address for a resource URI"""
+    return hashlib.sha256(uri.encode('utf-8')).hexdigest()
+
+
+class EspiCache:
+    """Gzip-compressed, size-capped LRU cache of ESPI payloads with a TTL"""
+
+    def __init__(self, cache_dir=CACHE_DIR, max_mb=CACHE_MAX_MB, ttl_hours=CACHE_TTL_HOURS):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.ttl_seconds = ttl_hours * 3600
+        self._lock = threading.Lock()
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, key):
+        return self.cache_dir / key[:2] / f"{key}{CACHE_SUFFIX}"
+
+    def get(self, uri):
+        """
+        Return the cached payload for a URI, or None on a miss
+
+        A hit refreshes the entry's access time, which drives LRU eviction.
+        """
+        path = self._path(cache_key(uri))
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            return None
+
+        now = time.time()
+        if now - stat.st_mtime > self.ttl_seconds:
+            path.unlink(missing_ok=True)
+            return None
+
+        try:
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                payload = f.read()
+        except (OSError, EOFError) as e:
+            logger.warning(f"Discarding unreadable cache entry {path.name}: {e}")
+            path.unlink(missing_ok=True)
+            return None
+
+        # Record the access without changing the write time used for TTL
+        os.utime(path, (now, stat.st_mtime))
+        return payload
+
+    def put(self, uri, payload):
+        """Store a payload, then evict old entries if over the size cap"""
+        path = self._path(cache_key(uri))
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        # Write to a temp file first so readers never see a partial entry
+        tmp_path = path.with_name(f"{path.name}.{threading.get_ident()}.tmp")
+        with gzip.open(tmp_path, 'wt', encoding='utf-8', compresslevel=6) as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+
+        self.evict()
+
+    def discard(self, uri):
+        """Remove a URI's entry (e.g. a payload that turned out to be truncated)"""
+        self._path(cache_key(uri)).unlink(missing_ok=True)
+
+    def entries(self):
+        """List (path, size, last_access, written) for every cache entry"""
+        result = []
+        for path in self.cache_dir.glob(f"*/*{CACHE_SUFFIX}"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            result.append((path, stat.st_size, stat.st_atime, stat.st_mtime))
+        return result
+
+    def evict(self):
+        """Drop expired entries, then least recently used ones until under the cap"""
+        with self._lock:
+            now = time.time()
+            live = []
+            total = 0
+            for path, size, last_access, written in self.entries():
+                if now - written > self.ttl_seconds:
+                    path.unlink(missing_ok=True)
+                    continue
+                live.append((last_access, size, path))
+                total += size
+
+            if total <= self.max_bytes:
+                return
+
+            for last_access, size, path in sorted(live):
+                path.unlink(missing_ok=True)
+                total -= size
+                if total <= self.max_bytes:
+                    break
+
+    def iter_payloads(self):
+        """Yield every unexpired cached payload (for offline parsing/benchmarks)"""
+        now = time.time()
+        for path, size, last_access, written in self.entries():
+            if now - written > self.ttl_seconds:
+                continue
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                yield f.read()
+
+
+def get_cache():
+    """Return the configured cache, or None if caching is disabled"""
+    if not CACHE_ENABLED:
+        return None
+    try:
+        return EspiCache()
+    except OSError as e:
+        logger.warning(f"ESPI cache unavailable ({e}); continuing without it")
+        return None
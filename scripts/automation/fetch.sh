@@ -12,17 +12,37 @@ source "$VENV_PATH/bin/activate"
 
 # Run Python logic
 python3 << 'EOF'
+import sys
+import logging
+
+sys.path.insert(0, "scripts/automation")
+
 from pgesmd_self_access.api import SelfAccessApi
 
+import meter_store
+from backfill_planner import plan_backfill, log_plan, request_windows
+
+logging.basicConfig(level=logging.INFO, format="%(message)s")
 auth_file = "/mnt/c/Users/Sumedh/Documents/GitHub/PG-E-Data-Visualizer/auth/auth.json"
 
+# Request only the date ranges missing from data/pge_meter_data.sqlite
+conn = meter_store.connect(readonly=True)
+try:
+    plan = plan_backfill(conn)
+finally:
+    meter_store.close(conn)
+log_plan(plan)
+
+if not plan["requests"]:
+    print("No gaps in meter_data - nothing to request.")
+    sys.exit(0)
+
 api = SelfAccessApi.auth(auth_file)
 api.get_token()
 
-print("Requesting historical data (7 days)...")
-result = api.request_historical_data(days=7)
-print(f"Request accepted: {result}")
+accepted = request_windows(api, plan["requests"])
+print(f"Requests accepted: {accepted} of {len(plan['requests'])}")
 
-if result:
+if accepted:
     print("\nWatch Supabase logs and pge_data table for incoming data.")
 EOF
\ No newline at end of file
@@ -7,22 +7,35 @@ This script:
 2. Extracts resource URIs from BatchList
 3. Fetches actual ESPI XML data from PGE API
 4. Parses ESPI XML to extract usage readings
-5. Saves to CSV for R processing
+5. Upserts native-resolution and hourly readings into
+   data/pge_meter_data.sqlite, one batch per payload, while later
+   payloads are still being fetched and parsed (see ingest_pipeline.py)
+6. Refreshes changed months of the data/parquet snapshot
 
 Works both locally and in GitHub Actions.
 """
 
+import io
 import os
 import sys
+import re
 import json
 import logging
 import tempfile
 import xml.etree.ElementTree as ET
-from datetime import datetime
-from pathlib import Path
+from array import array
+from bisect import bisect_right
 
 import requests
-import pandas as pd
+
+import meter_store
+import ingest_pipeline
+import backfill_planner
+import pipeline_metrics
+from espi_cache import get_cache
+from pge_fetch import EspiFetcher
+from supabase_rest import PROCESSED_IDS_FILE, supabase_headers
+from token_cache import get_token_cache
 
 # Set up logging
 logging.basicConfig(
@@ -37,6 +50,23 @@ NAMESPACES = {
     'espi': 'http://naesb.org/espi'
 }
 
+# Fully-qualified tags used by the streaming parser
+ESPI_INTERVAL_READING = '{http://naesb.org/espi}IntervalReading'
+ESPI_START = '{http://naesb.org/espi}start'
+ESPI_DURATION = '{http://naesb.org/espi}duration'
+ESPI_VALUE = '{http://naesb.org/espi}value'
+ESPI_TIME_PERIOD = '{http://naesb.org/espi}timePeriod'
+ATOM_ENTRY = '{http://www.w3.org/2005/Atom}entry'
+ATOM_LINK = '{http://www.w3.org/2005/Atom}link'
+
+# Usage point id in ESPI resource links, e.g. .../UsagePoint/12345/MeterReading/...
+USAGE_POINT_PATTERN = re.compile(r'/UsagePoint/([^/?#]+)')
+
+# Supabase backlog paging (override via environment)
+SUPABASE_PAGE_SIZE = int(os.getenv('SUPABASE_PAGE_SIZE', '50'))
+SUPABASE_MAX_ROWS_PER_RUN = int(os.getenv('SUPABASE_MAX_ROWS_PER_RUN', '1000'))
+SUPABASE_ROW_COLUMNS = 'id,received_at,raw_xml'
+
 
 def get_supabase_config():
     """Get Supabase configuration from environment or local file"""
@@ -141,44 +171,72 @@ def get_pge_api():
     return None
 
 
-def fetch_batch_lists_from_supabase(url, key):
-    """Fetch unprocessed BatchList notifications from Supabase"""
-    headers = {
-        "apikey": key,
-        "Authorization": f"Bearer {key}",
-        "Content-Type": "application/json"
-    }
+def release_pge_api(pge_api):
+    """Delete the certificate/key/auth temp files get_pge_api() wrote"""
+    for path in getattr(pge_api, '_temp_files', []):
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
 
-    # Fetch unprocessed rows
-    response = requests.get(
-        f"{url}/rest/v1/pge_data",
-        headers=headers,
-        params={
-            "select": "*",
-            "processed": "eq.false",
-            "order": "received_at.desc",
-            "limit": 10
-        }
-    )
-    response.raise_for_status()
-    return response.json()
 
+def iter_batch_lists_from_supabase(url, key, page_size=SUPABASE_PAGE_SIZE, max_rows=SUPABASE_MAX_ROWS_PER_RUN):
+    """
+    Iterate over unprocessed BatchList notifications from Supabase
 
-def mark_row_processed(url, key, row_id):
-    """Mark a Supabase row as processed"""
-    headers = {
-        "apikey": key,
-        "Authorization": f"Bearer {key}",
-        "Content-Type": "application/json"
-    }
+    Drains the backlog oldest-first using keyset pagination on
+    (received_at, id), so only one page of raw_xml is held at a time and
+    rows are never skipped or repeated between pages. The last page asks
+    for one row more than max_rows allows, so a backlog of exactly
+    max_rows rows is not reported as cut short.
+
+    Args:
+        page_size: Rows requested per page
+        max_rows: Stop after this many rows (0 for no limit)
+
+    Yields:
+        Dicts with the SUPABASE_ROW_COLUMNS keys
+    """
+    headers = supabase_headers(key)
+
+    last_received_at = None
+    last_id = None
+    yielded = 0
+    more_rows = False
+
+    with requests.Session() as session:
+        while True:
+            limit = page_size if not max_rows else min(page_size, max_rows - yielded + 1)
+            params = {
+                "select": SUPABASE_ROW_COLUMNS,
+                "processed": "eq.false",
+                "order": "received_at.asc,id.asc",
+                "limit": limit
+            }
+            if last_received_at is not None:
+                params["or"] = (
+                    f'(received_at.gt."{last_received_at}",'
+                    f'and(received_at.eq."{last_received_at}",id.gt.{last_id}))'
+                )
+
+            response = session.get(f"{url}/rest/v1/pge_data", headers=headers, params=params)
+            response.raise_for_status()
+            page = response.json()
+            if max_rows and yielded + len(page) > max_rows:
+                more_rows = True
+                page = page[:max_rows - yielded]
+
+            for row in page:
+                yield row
+            yielded += len(page)
 
-    response = requests.patch(
-        f"{url}/rest/v1/pge_data",
-        headers=headers,
-        params={"id": f"eq.{row_id}"},
-        json={"processed": True}
-    )
-    response.raise_for_status()
+            if more_rows or len(page) < limit:
+                break
+            last_received_at = page[-1]['received_at']
+            last_id = page[-1]['id']
+
+    if more_rows:
+        logger.warning(f"Reached SUPABASE_MAX_ROWS_PER_RUN ({max_rows}); any remaining rows will be picked up next run")
 
 
 def extract_uris_from_batch_list(xml_string):
@@ -199,67 +257,214 @@ def extract_uris_from_batch_list(xml_string):
         return []
 
 
-def parse_espi_xml(xml_string):
+def new_interval_columns():
+    """Create an empty set of columnar interval arrays"""
+    return {
+        'start': array('q'),      # Unix epoch seconds
+        'duration': array('l'),   # Interval length in seconds
+        'value_wh': array('q'),   # Raw ESPI value in Wh
+        'meter': array('H'),      # Index into 'meter_ids'
+        'meter_ids': []           # Usage point ids, in order first seen
+    }
+
+
+def meter_index(columns, meter_id):
+    """Return the index of a meter id in columns['meter_ids'], adding it if new"""
+    meter_ids = columns['meter_ids']
+    try:
+        return meter_ids.index(meter_id)
+    except ValueError:
+        meter_ids.append(meter_id)
+        return len(meter_ids) - 1
+
+
+def in_gap(gaps, start_ts):
+    """Whether start_ts falls in one of the sorted [start, end) ranges"""
+    i = bisect_right(gaps, (start_ts, float('inf'))) - 1
+    return i >= 0 and start_ts < gaps[i][1]
+
+
+def parse_espi_xml_columnar(source, columns=None, min_start=None, stats=None, gaps=None):
     """
-    Parse ESPI XML and extract interval readings
+    Stream-parse ESPI XML into compact columnar arrays
+
+    Uses iterparse and drops each IntervalReading (and its Atom entry) from
+    the tree once it has been read, so peak memory does not grow with the
+    size of the payload. Each reading is tagged with the UsagePoint id from
+    its entry's links (meter_store.DEFAULT_METER_ID if there is none).
+
+    Args:
+        source: XML as str/bytes, or a binary file-like object
+        columns: Optional columns from new_interval_columns() to append to
+        min_start: Optional epoch, or dict of meter_id -> epoch; readings
+            starting earlier are skipped without being stored (see
+            meter_store.skip_before). Meters missing from the dict are
+            never skipped.
+        stats: Optional dict whose 'skipped' count is incremented
+        gaps: Optional dict of meter_id -> sorted [start, end) ranges
+            missing from the store (see watermark_gaps()); readings in them
+            are kept even when older than min_start, so backfills fill gaps
 
     Returns:
-        List of dicts with 'timestamp' and 'value' keys
+        Dict of array.array columns 'start', 'duration', 'value_wh' and
+        'meter', plus the 'meter_ids' list
+
+    Raises:
+        ET.ParseError: The document is malformed or truncated; readings
+            already appended from it are removed first, so a partial
+            payload is never stored
     """
-    readings = []
+    if columns is None:
+        columns = new_interval_columns()
+    skipped = 0
+    stored = len(columns['start'])
+
+    if isinstance(source, str):
+        source = source.encode('utf-8')
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+
+    starts = columns['start']
+    durations = columns['duration']
+    values = columns['value_wh']
+    meters = columns['meter']
+    parents = []
+
+    def entry_meter(meter_id):
+        """Resolve the column index, skip threshold and missing ranges for a meter"""
+        threshold = min_start.get(meter_id) if isinstance(min_start, dict) else min_start
+        return meter_index(columns, meter_id), threshold, (gaps or {}).get(meter_id, ())
+
+    current_meter, current_min_start, current_gaps = entry_meter(meter_store.DEFAULT_METER_ID)
 
     try:
-        root = ET.fromstring(xml_string)
-    except ET.ParseError as e:
-        logger.error(f"Failed to parse ESPI XML: {e}")
-        return readings
+        for event, elem in ET.iterparse(source, events=('start', 'end')):
+            if event == 'start':
+                parents.append(elem)
+                continue
 
-    # Find all IntervalReading elements
-    for reading in root.findall('.//espi:IntervalReading', NAMESPACES):
-        try:
-            # Get time period
-            time_period = reading.find('espi:timePeriod', NAMESPACES)
-            if time_period is None:
+            parents.pop()
+            if elem.tag == ATOM_LINK:
+                match = USAGE_POINT_PATTERN.search(elem.get('href', ''))
+                if match:
+                    current_meter, current_min_start, current_gaps = entry_meter(match.group(1))
+                continue
+            if elem.tag == ESPI_INTERVAL_READING:
+                try:
+                    time_period = elem.find(ESPI_TIME_PERIOD)
+                    start_elem = time_period.find(ESPI_START) if time_period is not None else None
+                    value_elem = elem.find(ESPI_VALUE)
+
+                    if start_elem is not None and value_elem is not None:
+                        duration_elem = time_period.find(ESPI_DURATION)
+                        start_ts = int(start_elem.text)
+                        if (current_min_start is not None and start_ts < current_min_start
+                                and not (current_gaps and in_gap(current_gaps, start_ts))):
+                            skipped += 1
+                        else:
+                            duration = int(duration_elem.text) if duration_elem is not None else 3600
+                            value_wh = int(value_elem.text)
+
+                            starts.append(start_ts)
+                            durations.append(duration)
+                            values.append(value_wh)
+                            meters.append(current_meter)
+                except (ValueError, TypeError) as e:
+                    logger.warning(f"Error parsing reading: {e}")
+            elif elem.tag == ATOM_ENTRY:
+                # The next entry names its own usage point
+                current_meter, current_min_start, current_gaps = entry_meter(meter_store.DEFAULT_METER_ID)
+            else:
                 continue
 
-            start_elem = time_period.find('espi:start', NAMESPACES)
-            duration_elem = time_period.find('espi:duration', NAMESPACES)
+            # Release the subtree so the document is never held in full
+            elem.clear()
+            if parents:
+                parents[-1].remove(elem)
 
-            if start_elem is None:
-                continue
+    except ET.ParseError:
+        for name in ('start', 'duration', 'value_wh', 'meter'):
+            del columns[name][stored:]
+        raise
 
-            # Start time is Unix timestamp
-            start_ts = int(start_elem.text)
-            duration = int(duration_elem.text) if duration_elem is not None else 3600
+    if stats is not None:
+        stats['skipped'] = stats.get('skipped', 0) + skipped
+    return columns
 
-            # CRITICAL: Convert Wh to kWh
-            # PG&E ESPI XML provides energy values in Wh (Watt-hours)
-            # We divide by 1000 to convert to kWh for consistency with cost calculations
-            value_elem = reading.find('espi:value', NAMESPACES)
-            if value_elem is None:
-                continue
 
-            value_wh = int(value_elem.text)
-            value_kwh = value_wh / 1000.0  # Convert Wh to kWh
+def watermark_gaps(conn, min_start):
+    """
+    Find the hours each meter is missing below its skip threshold
 
-            # Convert timestamp to datetime
-            dt = datetime.fromtimestamp(start_ts)
+    Everything before a meter's first reading counts as missing, so older
+    history can still be loaded.
 
-            readings.append({
-                'dttm_start': dt.strftime('%Y-%m-%d %H:%M:%S'),
-                'value': value_kwh,
-                'duration_seconds': duration
-            })
+    Args:
+        min_start: Dict of meter_id -> epoch from meter_store.skip_before()
 
-        except (ValueError, AttributeError) as e:
-            logger.warning(f"Error parsing reading: {e}")
-            continue
+    Returns:
+        Dict of meter_id -> sorted [(gap_start, gap_end)] ts ranges
+    """
+    if not min_start:
+        return {}
+    gaps = {}
+    for meter_id, gap_start, gap_end in backfill_planner.find_gaps(conn, 0, max(min_start.values())):
+        threshold = min_start.get(meter_id)
+        if threshold is not None and gap_start < threshold:
+            gaps.setdefault(meter_id, []).append((gap_start, min(gap_end, threshold)))
+    return gaps
 
-    return readings
 
+def format_local_timestamps(starts):
+    """
+    Format epoch seconds as '%Y-%m-%d %H:%M:%S' strings in meter_store.LOCAL_TZ
 
-def main():
-    """Main execution function"""
+    The UTC offset is looked up once per hour instead of once per reading.
+    """
+    return [dttm_start for dttm_start, _ in meter_store.epoch_to_local(starts)]
+
+
+def parse_espi_xml(xml_string):
+    """
+    Parse ESPI XML and extract interval readings
+
+    Returns:
+        List of dicts with 'dttm_start', 'value' and 'duration_seconds' keys
+        (empty if the XML cannot be parsed)
+    """
+    try:
+        columns = parse_espi_xml_columnar(xml_string)
+    except ET.ParseError as e:
+        logger.error(f"Failed to parse ESPI XML: {e}")
+        return []
+
+    # CRITICAL: Convert Wh to kWh
+    # PG&E ESPI XML provides energy values in Wh (Watt-hours)
+    # We divide by 1000 to convert to kWh for consistency with cost calculations
+    return [
+        {
+            'dttm_start': dttm_start,
+            'value': value_wh / 1000.0,
+            'duration_seconds': duration
+        }
+        for dttm_start, value_wh, duration in zip(
+            format_local_timestamps(columns['start']),
+            columns['value_wh'],
+            columns['duration']
+        )
+    ]
+
+
+def run(metrics):
+    """
+    Fetch, parse and store everything in the notification backlog
+
+    Args:
+        metrics: pipeline_metrics.RunMetrics collecting stage timings
+
+    Returns:
+        Process exit code
+    """
     logger.info("=" * 60)
     logger.info("PGE Data Fetch and Parse")
     logger.info("=" * 60)
@@ -270,87 +475,213 @@ def main():
         logger.error("Supabase configuration missing")
         return 1
 
-    pge_api = get_pge_api()
-    if not pge_api:
-        logger.error("PGE API configuration missing")
-        return 1
+    processed_row_ids = []
 
-    # Get token
-    logger.info("Getting PGE API token...")
-    pge_api.get_token()
+    # URIs requested by each row (a URI shared by rows is fetched once)
+    uris_by_row = {}
 
-    # Fetch BatchList notifications from Supabase
+    # Drain BatchList notifications from Supabase page by page; only the
+    # extracted URIs are kept, not the raw XML
     logger.info("Fetching unprocessed notifications from Supabase...")
-    rows = fetch_batch_lists_from_supabase(supabase_url, supabase_key)
-    logger.info(f"Found {len(rows)} unprocessed rows")
+    row_count = 0
+    with metrics.stage('supabase') as stage:
+        for row in iter_batch_lists_from_supabase(supabase_url, supabase_key):
+            row_count += 1
+            row_id = row['id']
+            raw_xml = row.get('raw_xml', '')
+            metrics.incr('supabase_bytes', len(raw_xml or ''))
+
+            # Extract URIs from BatchList
+            uris = extract_uris_from_batch_list(raw_xml)
+
+            if not uris:
+                logger.info(f"Row {row_id}: No valid URIs found, marking as processed")
+                processed_row_ids.append(row_id)
+                continue
 
-    if not rows:
+            logger.info(f"Row {row_id}: Found {len(uris)} URIs to fetch")
+            uris_by_row[row_id] = set(uris)
+        stage['items'] = row_count
+    metrics.incr('notification_rows', row_count)
+
+    logger.info(f"Found {row_count} unprocessed rows")
+
+    if not row_count:
         logger.info("No new data to process")
         return 0
 
-    all_readings = []
-    processed_row_ids = []
-
-    for row in rows:
-        row_id = row['id']
-        raw_xml = row.get('raw_xml', '')
+    pending_uris = list(dict.fromkeys(uri for uris in uris_by_row.values() for uri in uris))
 
-        # Extract URIs from BatchList
-        uris = extract_uris_from_batch_list(raw_xml)
+    # PG&E credentials (and the temp files holding them) are only set up
+    # once there is something to fetch; the token is reused across runs
+    pge_api = None
+    token_cache = get_token_cache()
+    if pending_uris:
+        pge_api = get_pge_api()
+        if not pge_api:
+            logger.error("PGE API configuration missing")
+            return 1
 
-        if not uris:
-            logger.info(f"Row {row_id}: No valid URIs found, marking as processed")
-            processed_row_ids.append(row_id)
+        logger.info("Getting PGE API token...")
+        try:
+            with metrics.stage('token'):
+                if pge_api.need_token():
+                    if token_cache is not None:
+                        token_cache.refresh(pge_api)
+                    else:
+                        pge_api.get_token()
+        except Exception:
+            release_pge_api(pge_api)
+            raise
+
+    # Skip intervals the store already holds (minus a revision lookback),
+    # tracked separately for each meter; hours missing below the watermark
+    # are still read, so backfilled payloads fill the gaps they were
+    # requested for
+    conn = meter_store.connect(migrate=True)
+    min_start = {}
+    for meter_id, watermark in meter_store.get_watermarks(conn).items():
+        if watermark is None:
             continue
-
-        logger.info(f"Row {row_id}: Found {len(uris)} URIs to fetch")
-
-        for uri in uris:
-            logger.info(f"  Fetching: {uri[:80]}...")
+        min_start[meter_id] = meter_store.skip_before(watermark)
+        logger.info(f"Ingest watermark for meter {meter_id}: {format_local_timestamps([watermark])[0]} "
+                    f"(re-reading from {format_local_timestamps([min_start[meter_id]])[0]})")
+    gaps = watermark_gaps(conn, min_start)
+    for meter_id, ranges in gaps.items():
+        missing_hours = sum((gap_end - gap_start) // 3600 for gap_start, gap_end in ranges if gap_start > 0)
+        if missing_hours:
+            logger.info(f"Meter {meter_id}: {missing_hours} missing hour(s) below the watermark are kept")
+    parse_stats = {'skipped': 0}
+
+    # Fetch, parse and write as a bounded pipeline: payloads are parsed while
+    # later URIs are still downloading, and each payload's hourly rows are
+    # committed as one batch, so memory stays flat and a failure late in the
+    # run keeps everything written before it
+    failed_uris = set()
+    cache = get_cache()
+    counts = {'new': 0, 'revised': 0, 'unchanged': 0, 'anomalies': 0}
+    meter_totals = {}
+
+    def parse_payload(result):
+        """Parse stage: one fetched payload -> native and hourly rows by meter"""
+        uri = result['uri']
+        metrics.add_time('fetch', result['latency'], 1)
+        metrics.incr('fetch_retries', max(0, result['attempts'] - 1))
+        if not (result['ok'] and result['data']):
+            failed_uris.add(uri)
+            metrics.incr('uris_failed')
+            logger.error(f"  FAILED {uri[:80]} ({result['latency']:.2f}s, "
+                         f"{result['attempts']} attempt(s)): {result['error'] or 'No data returned'}")
+            return None
+        metrics.incr('uris_cached' if result['cached'] else 'uris_fetched')
+        metrics.incr('bytes_fetched', len(result['data']))
+
+        with metrics.stage('parse') as stage:
             try:
-                espi_data = pge_api.get_espi_data(uri)
-                if espi_data:
-                    readings = parse_espi_xml(espi_data)
-                    logger.info(f"    Parsed {len(readings)} readings")
-                    all_readings.extend(readings)
-                else:
-                    logger.warning(f"    No data returned")
-            except Exception as e:
-                logger.error(f"    Error fetching URI: {e}")
-
-        processed_row_ids.append(row_id)
-
-    # Save readings to CSV
-    if all_readings:
-        df = pd.DataFrame(all_readings)
-
-        # Remove duplicates based on timestamp
-        df = df.drop_duplicates(subset=['dttm_start'])
-
-        # Sort by timestamp
-        df = df.sort_values('dttm_start')
-
-        # Save to CSV
-        output_dir = Path(__file__).parent.parent.parent / 'data'
-        output_dir.mkdir(exist_ok=True)
-        output_file = output_dir / 'pge_latest.csv'
+                columns = parse_espi_xml_columnar(result['data'], min_start=min_start, stats=parse_stats,
+                                                  gaps=gaps)
+            except ET.ParseError as e:
+                # A truncated payload must not be stored or cached, or its
+                # newest reading would move the watermark past its own tail
+                failed_uris.add(uri)
+                metrics.incr('uris_failed')
+                if cache is not None:
+                    cache.discard(uri)
+                logger.error(f"  FAILED {uri[:80]}: unparseable ESPI XML ({e})")
+                return None
+            stage['items'] = len(columns['start'])
+            by_meter = meter_store.aggregate_hourly_by_meter(columns)
+        metrics.incr('readings_parsed', stage['items'])
+        source = 'cache' if result['cached'] else f"{result['attempts']} attempt(s)"
+        logger.info(f"  OK {uri[:80]} ({result['latency']:.2f}s, {source}, "
+                    f"{stage['items']} readings)")
+        return by_meter or None
+
+    def write_batch(by_meter):
+        """Write stage: upsert one batch, one transaction per meter"""
+        with metrics.stage('write') as stage:
+            stage['items'] = sum(len(rows) for rows, _, _ in by_meter.values())
+            store_batch(by_meter)
+
+    def store_batch(by_meter):
+        if not meter_totals and len(by_meter) == 1:
+            meter_store.adopt_default_meter(conn, next(iter(by_meter)))
+
+        # SQLite has a single writer, so meters are written one after another
+        for meter_id, (hourly_rows, newest_start, intervals) in by_meter.items():
+            meter_counts = meter_store.upsert_hourly_readings(
+                conn, hourly_rows, watermark=newest_start, meter_id=meter_id, intervals=intervals
+            )
+            for key in counts:
+                counts[key] += meter_counts[key]
+
+            totals = meter_totals.setdefault(meter_id, {
+                'first': hourly_rows[0][:2], 'last': hourly_rows[-1][:2],
+                'new': 0, 'revised': 0, 'anomalies': 0
+            })
+            totals['first'] = min(totals['first'], hourly_rows[0][:2])
+            totals['last'] = max(totals['last'], hourly_rows[-1][:2])
+            for key in ('new', 'revised', 'anomalies'):
+                totals[key] += meter_counts[key]
 
-        df.to_csv(output_file, index=False)
-        logger.info(f"Saved {len(df)} readings to {output_file}")
+    try:
+        if pending_uris:
+            fetcher = EspiFetcher(pge_api, cache=cache, token_cache=token_cache)
+            logger.info(f"Fetching {len(pending_uris)} URIs with concurrency {fetcher.concurrency}, "
+                        f"queue size {ingest_pipeline.PIPELINE_QUEUE_SIZE}")
+            try:
+                with metrics.stage('pipeline') as stage:
+                    batches = ingest_pipeline.run_pipeline(fetcher.fetch_all(pending_uris),
+                                                           parse_payload, write_batch)
+                    stage['items'] = batches
+            finally:
+                fetcher.close()
+                release_pge_api(pge_api)
+            logger.info(f"Committed {batches} batch(es) to {meter_store.DB_FILE}")
 
         # Summary
-        logger.info(f"Date range: {df['dttm_start'].min()} to {df['dttm_start'].max()}")
-        logger.info(f"Total consumption: {df['value'].sum():.2f} kWh")
-    else:
-        logger.warning("No readings parsed from any URI")
+        for meter_id, totals in meter_totals.items():
+            logger.info(f"Meter {meter_id}: {totals['first'][1]} to {totals['last'][1]}, "
+                        f"{totals['new']} new / {totals['revised']} revised hours")
+            if totals['anomalies']:
+                logger.warning(f"Meter {meter_id}: {totals['anomalies']} anomalous reading(s) "
+                               f"recorded in the anomalies table")
+        if not meter_totals and not parse_stats['skipped']:
+            logger.warning("No readings parsed from any URI")
+
+        # Refresh the Parquet snapshot for any months whose rollups changed
+        # (imported here: pyarrow is only loaded when a run gets this far)
+        import parquet_snapshot
+        try:
+            with metrics.stage('snapshot') as stage:
+                stage['items'] = len(parquet_snapshot.update_snapshot(conn) or [])
+        except OSError as e:
+            logger.warning(f"Could not update Parquet snapshot: {e}")
+    finally:
+        meter_store.close(conn)
+
+    # Only rows whose URIs all succeeded are marked processed; the rest are
+    # left unprocessed in Supabase so the next run retries them
+    for row_id, uris in uris_by_row.items():
+        if uris & failed_uris:
+            logger.warning(f"Row {row_id}: {len(uris & failed_uris)} URI(s) failed, leaving unprocessed")
+        else:
+            processed_row_ids.append(row_id)
+
+    logger.info(f"Readings: {counts['new']} new hours, {counts['revised']} revised hours, "
+                f"{counts['unchanged']} unchanged hours, "
+                f"{parse_stats['skipped']} intervals skipped below the watermark")
+    for key, value in counts.items():
+        metrics.incr(f"hours_{key}" if key != 'anomalies' else key, value)
+    metrics.incr('readings_skipped', parse_stats['skipped'])
 
     # Save processed row IDs to file for later marking
-    # (Marking happens in a separate step after R processing succeeds)
+    # (Marking happens in a separate step after the pipeline succeeds)
     if processed_row_ids:
-        processed_ids_file = output_dir / 'processed_row_ids.json'
-        with open(processed_ids_file, 'w') as f:
+        PROCESSED_IDS_FILE.parent.mkdir(parents=True, exist_ok=True)
+        with open(PROCESSED_IDS_FILE, 'w') as f:
             json.dump(processed_row_ids, f)
-        logger.info(f"Saved {len(processed_row_ids)} row IDs to {processed_ids_file}")
+        logger.info(f"Saved {len(processed_row_ids)} row IDs to {PROCESSED_IDS_FILE}")
 
     logger.info("=" * 60)
     logger.info("Complete!")
@@ -359,5 +690,12 @@ def main():
     return 0
 
 
+def main():
+    """Main execution function"""
+    with pipeline_metrics.instrument('fetch_and_parse_pge') as metrics:
+        metrics.exit_code = run(metrics)
+    return metrics.exit_code
+
+
 if __name__ == "__main__":
     sys.exit(main())
@@ -14,11 +14,13 @@ import sys
 import logging
 import json
 import tempfile
-from datetime import datetime, timedelta
 from pathlib import Path
 
 import pandas as pd
 
+import meter_store
+from backfill_planner import plan_backfill, log_plan, request_windows
+
 # Set up logging
 logging.basicConfig(
     level=logging.INFO,
@@ -55,7 +57,7 @@ def create_auth_file():
         "third_party_id": access_token,  # Use access token as third party ID
         "client_id": client_id,
         "client_secret": client_secret,
-        "cert_crt_path": cert_path,
+        "cert_crt_path": cert_crt_path,
         "cert_key_path": cert_key_path  # Same path if using combined cert
     }
 
@@ -116,17 +118,22 @@ def fetch_pge_data():
         except Exception as e:
             logger.warning(f"Could not check service status: {e}")
 
-        # Try to request historical data
+        # Request only the date ranges missing from the database
         # Note: This triggers an async request - data will be sent to callback server
-        logger.info("Requesting historical data from PGE...")
+        logger.info("Planning historical data requests from gaps in meter_data...")
         try:
-            # Request last 7 days of data
-            result = api.request_historical_data(days=7)
-            if result:
-                logger.info("Historical data request submitted successfully")
+            conn = meter_store.connect(readonly=True)
+            try:
+                plan = plan_backfill(conn)
+            finally:
+                meter_store.close(conn)
+            log_plan(plan)
+            if plan['requests']:
+                accepted = request_windows(api, plan['requests'])
+                logger.info(f"{accepted} of {len(plan['requests'])} historical data request(s) accepted")
                 logger.info("Note: Data will be delivered asynchronously to callback server")
             else:
-                logger.warning("Historical data request returned False")
+                logger.info("No gaps in meter_data - no historical data requested")
         except Exception as e:
             logger.error(f"Failed to request historical data: {e}")
 
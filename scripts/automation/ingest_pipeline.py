@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Bounded-Queue Ingest Pipeline
+
+Runs the nightly ingest as three stages connected by bounded queues:
+1. Fetch (a producer thread draining EspiFetcher.fetch_all)
+2. Parse (a thread turning each payload into a batch of hourly rows)
+3. Write (the calling thread, committing each batch as it arrives)
+
+A stage blocks when the queue ahead of it is full, so a slow writer
+throttles parsing and fetching instead of letting payloads pile up. Peak
+memory is bounded by PGE_PIPELINE_QUEUE_SIZE items per queue plus the
+requests in flight, not by the size of the run. Parsing overlaps network
+I/O, and batches already written survive a crash later in the run.
+
+An exception in any stage stops the others and is re-raised to the caller.
+
+Used by fetch_and_parse_pge.py.
+"""
+
+import os
+import queue
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+PIPELINE_QUEUE_SIZE = int(os.getenv('PGE_PIPELINE_QUEUE_SIZE', '4'))
+POLL_SECONDS = 0.5  # How often a blocked stage checks whether the run was stopped
+
+# Marks the end of a stage's output
+_DONE = object()
+
+
+class PipelineStopped(Exception):
+    """Raised inside a stage when another stage has failed"""
+
+
+def put(outbox, item, stop):
+    """Put an item on a bounded queue, giving up once the pipeline is stopped"""
+    while True:
+        if stop.is_set():
+            raise PipelineStopped()
+        try:
+            outbox.put(item, timeout=POLL_SECONDS)
+            return
+        except queue.Full:
+            continue
+
+
+def get(inbox, stop):
+    """Take the next item from a queue, giving up once the pipeline is stopped"""
+    while True:
+        if stop.is_set():
+            raise PipelineStopped()
+        try:
+            return inbox.get(timeout=POLL_SECONDS)
+        except queue.Empty:
+            continue
+
+
+def run_pipeline(produce, transform, consume, queue_size=PIPELINE_QUEUE_SIZE):
+    """
+    Run produce -> transform -> consume with bounded queues between them
+
+    Args:
+        produce: Iterable (e.g. a generator) of work items, drained in a
+            thread of its own
+        transform: Function applied to each item in a second thread; its
+            result is passed on unless it is None
+        consume: Function called with each transformed item in the calling
+            thread (SQLite connections stay on the thread that opened them)
+        queue_size: Capacity of each queue
+
+    Returns:
+        Number of items consumed
+    """
+    queue_size = max(1, queue_size)
+    fetched = queue.Queue(maxsize=queue_size)
+    parsed = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+    errors = []
+
+    def stage(name, body, outbox):
+        try:
+            body()
+        except PipelineStopped:
+            pass
+        except BaseException as e:
+            logger.error(f"Pipeline {name} stage failed: {e}")
+            errors.append(e)
+            stop.set()
+        finally:
+            try:
+                put(outbox, _DONE, stop)
+            except PipelineStopped:
+                pass
+
+    def run_produce():
+        items = iter(produce)
+        try:
+            for item in items:
+                put(fetched, item, stop)
+        finally:
+            # Lets a generator release its resources (e.g. a thread pool)
+            if hasattr(items, 'close'):
+                items.close()
+
+    def run_transform():
+        while True:
+            item = get(fetched, stop)
+            if item is _DONE:
+                return
+            result = transform(item)
+            if result is not None:
+                put(parsed, result, stop)
+
+    threads = [
+        threading.Thread(target=stage, args=('fetch', run_produce, fetched), name='pipeline-fetch', daemon=True),
+        threading.Thread(target=stage, args=('parse', run_transform, parsed), name='pipeline-parse', daemon=True),
+    ]
+    for thread in threads:
+        thread.start()
+
+    consumed = 0
+    try:
+        while True:
+            item = get(parsed, stop)
+            if item is _DONE:
+                break
+            consume(item)
+            consumed += 1
+    except PipelineStopped:
+        pass
+    except BaseException:
+        stop.set()
+        raise
+    finally:
+        for thread in threads:
+            thread.join()
+
+    if errors:
+        raise errors[0]
+    return consumed
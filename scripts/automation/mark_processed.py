@@ -11,9 +11,9 @@ import os
 import sys
 import json
 import logging
-from pathlib import Path
 
-import requests
+import pipeline_metrics
+from supabase_rest import mark_rows_processed, PROCESSED_IDS_FILE
 
 # Set up logging
 logging.basicConfig(
@@ -40,25 +40,24 @@ def get_supabase_config():
         return None, None
 
 
-def mark_row_processed(url, key, row_id):
-    """Mark a Supabase row as processed"""
-    headers = {
-        "apikey": key,
-        "Authorization": f"Bearer {key}",
-        "Content-Type": "application/json"
-    }
+def save_remaining_ids(path, row_ids):
+    """Persist the row ids that still need marking"""
+    tmp_file = path.with_suffix('.json.tmp')
+    with open(tmp_file, 'w') as f:
+        json.dump(row_ids, f)
+    os.replace(tmp_file, path)
 
-    response = requests.patch(
-        f"{url}/rest/v1/pge_data",
-        headers=headers,
-        params={"id": f"eq.{row_id}"},
-        json={"processed": True}
-    )
-    response.raise_for_status()
 
+def run(metrics):
+    """
+    Mark the rows listed in data/processed_row_ids.json
 
-def main():
-    """Main execution function"""
+    Args:
+        metrics: pipeline_metrics.RunMetrics collecting stage timings
+
+    Returns:
+        Process exit code
+    """
     logger.info("Marking Supabase rows as processed...")
 
     # Get Supabase config
@@ -68,8 +67,7 @@ def main():
         return 1
 
     # Read processed row IDs from file
-    data_dir = Path(__file__).parent.parent.parent / 'data'
-    processed_ids_file = data_dir / 'processed_row_ids.json'
+    processed_ids_file = PROCESSED_IDS_FILE
 
     if not processed_ids_file.exists():
         logger.info("No processed_row_ids.json file found - nothing to mark")
@@ -84,22 +82,42 @@ def main():
 
     logger.info(f"Marking {len(row_ids)} rows as processed...")
 
-    success_count = 0
-    for row_id in row_ids:
-        try:
-            mark_row_processed(supabase_url, supabase_key, row_id)
-            logger.info(f"Marked row {row_id} as processed")
-            success_count += 1
-        except Exception as e:
-            logger.error(f"Failed to mark row {row_id}: {e}")
+    remaining = list(row_ids)
+
+    def record_progress(chunk):
+        # Keep partial progress so a rerun only resends unmarked ids
+        done = set(chunk)
+        remaining[:] = [row_id for row_id in remaining if row_id not in done]
+        if remaining:
+            save_remaining_ids(processed_ids_file, remaining)
+
+    stats = {}
+    with metrics.stage('mark') as stage:
+        failed_ids = mark_rows_processed(supabase_url, supabase_key, row_ids,
+                                         on_chunk_done=record_progress, stats=stats)
+        success_count = len(row_ids) - len(failed_ids)
+        stage['items'] = success_count
+    metrics.incr('rows_marked', success_count)
+    metrics.incr('rows_failed', len(failed_ids))
+    metrics.incr('requests', stats.get('requests', 0))
+    metrics.incr('retries', stats.get('retries', 0))
 
     # Clean up the file after successful marking
-    if success_count == len(row_ids):
+    if not failed_ids:
         processed_ids_file.unlink()
         logger.info("Cleaned up processed_row_ids.json")
+    else:
+        logger.error(f"{len(failed_ids)} rows left in processed_row_ids.json for the next run")
 
     logger.info(f"Successfully marked {success_count}/{len(row_ids)} rows")
-    return 0 if success_count == len(row_ids) else 1
+    return 0 if not failed_ids else 1
+
+
+def main():
+    """Main execution function"""
+    with pipeline_metrics.instrument('mark_processed') as metrics:
+        metrics.exit_code = run(metrics)
+    return metrics.exit_code
 
 
 if __name__ == "__main__":
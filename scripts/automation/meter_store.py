@@ -0,0 +1,1052 @@
+#!/usr/bin/env python3
+"""
+Meter Data Store
+
+Writes parsed interval readings straight into the `meter_data` table of
+data/pge_meter_data.sqlite:
+1. Aggregates readings to hourly kWh (sub-hourly intervals are summed)
+2. Upserts them with INSERT ... ON CONFLICT DO UPDATE in one transaction
+3. Uses WAL mode and a busy timeout so the Shiny app can keep reading
+   while an ingest is writing
+4. Keeps a per-meter ingest watermark in `ingest_state` so already stored
+   intervals can be skipped at parse time
+5. Maintains rollup tables (`daily_usage`, `monthly_usage` and the
+   weekday x hour `hourly_profile`), updated only for the days an ingest
+   touched
+6. Holds the `data_repairs` audit log written by repair_meter_data.py
+   and a `data_version` counter bumped in every transaction that changes
+   readings or rollups (query_service.py builds its ETags from it)
+7. Scores newly inserted hours for anomalies as part of the same
+   transaction (see anomaly_detector.py)
+8. Keeps every reading at the meter's native resolution (15-minute,
+   hourly, ...) in `interval_data`; hours are totalled from it, so an hour
+   split across payloads is never stored half-summed
+
+The tables form a resolution pyramid: interval_data (native) ->
+meter_data (hourly) -> daily_usage -> monthly_usage, all kept up to date
+at ingest. query_usage() answers a range at a requested granularity from
+the coarsest level that covers it, so 15-minute meters cost no more than
+hourly ones for hourly, daily or monthly views.
+
+Every reading, rollup and watermark is keyed by meter (the ESPI UsagePoint
+id), so several service agreements can share one database. Databases from
+before meters were tracked are migrated in place, with their rows stored
+under DEFAULT_METER_ID until the first ingest adopts them.
+
+Readings are keyed by `ts`, the UTC epoch second the hour starts at.
+`dttm_start` and `hour` hold the same instant as LOCAL_TZ wall clock time
+for display and for grouping by local day; they are derived in bulk, with
+the UTC offset looked up once per hour, and never parsed back. Both
+occurrences of the repeated hour when DST ends are therefore kept.
+
+Only the ingest path migrates: connect(migrate=True) upgrades older
+databases, and every other caller opens the database without writing to
+it. To migrate without ingesting:
+    python scripts/automation/meter_store.py
+
+Used by fetch_and_parse_pge.py.
+"""
+
+import os
+import re
+import sys
+import time
+import calendar
+import sqlite3
+import logging
+import argparse
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from pathlib import Path
+from zoneinfo import ZoneInfo
+
+import anomaly_detector
+
+logger = logging.getLogger(__name__)
+
+DB_FILE = Path(__file__).parent.parent.parent / 'data' / 'pge_meter_data.sqlite'
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '30000'))
+
+# Intervals this far behind the watermark are still re-read so late PG&E
+# revisions are picked up; anything older is skipped by the parser
+REVISION_LOOKBACK_HOURS = int(os.getenv('PGE_REVISION_LOOKBACK_HOURS', '48'))
+
+# Single-meter deployments store their watermark under this id
+DEFAULT_METER_ID = 'default'
+
+# Timestamp format stored in meter_data.dttm_start
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Timezone of dttm_start/hour and of local days (PG&E bills Pacific time)
+LOCAL_TZ = ZoneInfo(os.getenv('PGE_TIMEZONE', 'America/Los_Angeles'))
+
+# ts bounds covering every reading
+ALL_TIME = (-(2 ** 62), 2 ** 62)
+
+SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS meter_data (
+    meter_id TEXT NOT NULL DEFAULT 'default',
+    ts INTEGER NOT NULL,       -- UTC epoch seconds of the hour start
+    dttm_start TEXT NOT NULL,  -- The same instant as LOCAL_TZ wall clock
+    hour INTEGER NOT NULL,
+    value REAL NOT NULL,
+    day INTEGER,
+    day2 INTEGER,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (meter_id, ts)
+);
+CREATE INDEX IF NOT EXISTS idx_ts ON meter_data(ts);
+CREATE INDEX IF NOT EXISTS idx_dttm_start ON meter_data(dttm_start);
+CREATE INDEX IF NOT EXISTS idx_hour ON meter_data(hour);
+CREATE TABLE IF NOT EXISTS interval_data (
+    meter_id TEXT NOT NULL,
+    ts INTEGER NOT NULL,        -- UTC epoch seconds of the interval start
+    duration INTEGER NOT NULL,  -- Interval length in seconds, as sent by PG&E
+    value REAL NOT NULL,        -- kWh
+    PRIMARY KEY (meter_id, ts)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS ingest_state (
+    meter_id TEXT PRIMARY KEY,
+    last_start INTEGER NOT NULL,
+    updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS daily_usage (
+    meter_id TEXT NOT NULL,
+    reading_date TEXT NOT NULL,
+    records INTEGER NOT NULL,
+    total_kwh REAL NOT NULL,
+    sum_sq REAL NOT NULL,
+    min_kwh REAL,
+    max_kwh REAL,
+    zero_records INTEGER NOT NULL,
+    PRIMARY KEY (meter_id, reading_date)
+);
+CREATE TABLE IF NOT EXISTS monthly_usage (
+    meter_id TEXT NOT NULL,
+    month TEXT NOT NULL,
+    records INTEGER NOT NULL,
+    days INTEGER NOT NULL,
+    total_kwh REAL NOT NULL,
+    sum_sq REAL NOT NULL,
+    min_kwh REAL,
+    max_kwh REAL,
+    zero_records INTEGER NOT NULL,
+    PRIMARY KEY (meter_id, month)
+);
+CREATE TABLE IF NOT EXISTS data_repairs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    applied_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    rule TEXT NOT NULL,
+    params TEXT NOT NULL,
+    range_start TEXT NOT NULL,
+    range_end TEXT NOT NULL,
+    rows_affected INTEGER NOT NULL,
+    total_before REAL,
+    total_after REAL,
+    note TEXT
+);
+CREATE TABLE IF NOT EXISTS hourly_profile (
+    meter_id TEXT NOT NULL,
+    weekday INTEGER NOT NULL,  -- 0 = Sunday, as strftime('%w')
+    hour INTEGER NOT NULL,
+    readings INTEGER NOT NULL,
+    total_kwh REAL NOT NULL,
+    sum_sq REAL NOT NULL,
+    PRIMARY KEY (meter_id, weekday, hour)
+);
+CREATE TABLE IF NOT EXISTS data_version (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    version INTEGER NOT NULL  -- Bumped by every write to the readings or rollups
+);
+INSERT OR IGNORE INTO data_version (id, version) VALUES (1, 0);
+"""
+
+# Rebuilds an older meter_data table keyed by meter and epoch; the rows
+# (with ts computed in Python) are inserted by migrate_schema()
+MIGRATED_METER_DATA_SQL = """
+CREATE TABLE meter_data_migrated (
+    meter_id TEXT NOT NULL DEFAULT 'default',
+    ts INTEGER NOT NULL,       -- UTC epoch seconds of the hour start
+    dttm_start TEXT NOT NULL,  -- The same instant as LOCAL_TZ wall clock
+    hour INTEGER NOT NULL,
+    value REAL NOT NULL,
+    day INTEGER,
+    day2 INTEGER,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (meter_id, ts)
+)
+"""
+
+# Legacy readings the migration could not place, kept as stored for review
+QUARANTINE_SQL = """
+CREATE TABLE IF NOT EXISTS meter_data_quarantine (
+    meter_id TEXT NOT NULL,
+    dttm_start TEXT NOT NULL,  -- As stored before the migration
+    hour INTEGER,
+    value REAL NOT NULL,
+    day INTEGER,
+    day2 INTEGER,
+    created_at TEXT,
+    reason TEXT NOT NULL,
+    quarantined_at TEXT DEFAULT CURRENT_TIMESTAMP
+)
+"""
+
+ROLLUP_TABLES = ('daily_usage', 'monthly_usage', 'hourly_profile')
+
+# Tables a current database has (created by connect(migrate=True))
+REQUIRED_TABLES = tuple(re.findall(r'CREATE TABLE IF NOT EXISTS (\w+)',
+                                   SCHEMA_SQL + anomaly_detector.SCHEMA_SQL))
+
+UPSERT_SQL = """
+INSERT INTO meter_data (meter_id, ts, dttm_start, hour, value, day, day2)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (meter_id, ts) DO UPDATE SET value = excluded.value
+"""
+
+INTERVAL_UPSERT_SQL = """
+INSERT INTO interval_data (meter_id, ts, duration, value)
+VALUES (?, ?, ?, ?)
+ON CONFLICT (meter_id, ts) DO UPDATE SET duration = excluded.duration, value = excluded.value
+"""
+
+# Pyramid levels, finest first: interval_data, meter_data, daily_usage
+# and monthly_usage (see query_usage())
+LEVELS = ('interval', 'hour', 'day', 'month')
+
+DAILY_ROLLUP_SQL = """
+INSERT INTO daily_usage (meter_id, reading_date, records, total_kwh, sum_sq, min_kwh, max_kwh, zero_records)
+SELECT meter_id, substr(dttm_start, 1, 10), COUNT(*), SUM(value), SUM(value * value),
+       MIN(value), MAX(value), SUM(value = 0)
+FROM meter_data
+WHERE meter_id = ? AND ts >= ? AND ts < ?
+GROUP BY meter_id, substr(dttm_start, 1, 10)
+ON CONFLICT (meter_id, reading_date) DO UPDATE SET
+    records = excluded.records,
+    total_kwh = excluded.total_kwh,
+    sum_sq = excluded.sum_sq,
+    min_kwh = excluded.min_kwh,
+    max_kwh = excluded.max_kwh,
+    zero_records = excluded.zero_records
+"""
+
+MONTHLY_ROLLUP_SQL = """
+INSERT INTO monthly_usage (meter_id, month, records, days, total_kwh, sum_sq, min_kwh, max_kwh, zero_records)
+SELECT meter_id, substr(reading_date, 1, 7), SUM(records), COUNT(*), SUM(total_kwh), SUM(sum_sq),
+       MIN(min_kwh), MAX(max_kwh), SUM(zero_records)
+FROM daily_usage
+WHERE meter_id = ? AND reading_date >= ? AND reading_date < ?
+GROUP BY meter_id, substr(reading_date, 1, 7)
+ON CONFLICT (meter_id, month) DO UPDATE SET
+    records = excluded.records,
+    days = excluded.days,
+    total_kwh = excluded.total_kwh,
+    sum_sq = excluded.sum_sq,
+    min_kwh = excluded.min_kwh,
+    max_kwh = excluded.max_kwh,
+    zero_records = excluded.zero_records
+"""
+
+PROFILE_CONTRIBUTION_SQL = """
+SELECT meter_id, CAST(strftime('%w', dttm_start) AS INTEGER), hour,
+       COUNT(*), SUM(value), SUM(value * value)
+FROM meter_data
+WHERE meter_id = ? AND ts >= ? AND ts < ?
+GROUP BY 1, 2, 3
+"""
+
+PROFILE_DELTA_SQL = """
+INSERT INTO hourly_profile (meter_id, weekday, hour, readings, total_kwh, sum_sq)
+VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT (meter_id, weekday, hour) DO UPDATE SET
+    readings = readings + excluded.readings,
+    total_kwh = total_kwh + excluded.total_kwh,
+    sum_sq = sum_sq + excluded.sum_sq
+"""
+
+WATERMARK_SQL = """
+INSERT INTO ingest_state (meter_id, last_start, updated_at)
+VALUES (?, ?, CURRENT_TIMESTAMP)
+ON CONFLICT (meter_id) DO UPDATE SET
+    last_start = MAX(last_start, excluded.last_start),
+    updated_at = excluded.updated_at
+"""
+
+
+class SchemaError(RuntimeError):
+    """The database must be migrated (connect(migrate=True)) before use"""
+
+
+def connect(db_path=None, migrate=False, readonly=False):
+    """
+    Open the meter database with a busy timeout
+
+    Only the ingest path passes migrate=True: the database is created if
+    missing, switched to WAL mode, upgraded from older schemas (see
+    migrate_schema()) and gets any missing tables and rollups. Every other
+    caller opens the database as it is, without writing to it, and gets a
+    SchemaError if it still needs migrating; readonly=True opens it with
+    mode=ro so nothing can be written at all.
+
+    Transactions are managed explicitly (autocommit mode), see
+    upsert_hourly_readings().
+    """
+    db_path = Path(db_path or DB_FILE)
+    if not migrate and not db_path.exists():
+        raise FileNotFoundError(f"No meter database at {db_path}")
+
+    timeout = SQLITE_BUSY_TIMEOUT_MS / 1000.0
+    if readonly:
+        conn = sqlite3.connect(f"{db_path.resolve().as_uri()}?mode=ro", uri=True,
+                               timeout=timeout, isolation_level=None)
+        conn.execute("PRAGMA query_only = ON")
+    else:
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(db_path), timeout=timeout, isolation_level=None)
+        conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute(f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}")
+
+    if not migrate:
+        if needs_migration(conn):
+            conn.close()
+            raise SchemaError(f"{db_path} uses an older schema; migrate it with "
+                              f"python scripts/automation/meter_store.py --db {db_path}")
+        return conn
+
+    conn.execute("PRAGMA journal_mode = WAL")
+    migrate_schema(conn)
+    conn.executescript(SCHEMA_SQL)
+    conn.executescript(anomaly_detector.SCHEMA_SQL)
+
+    # Databases written before the rollup tables existed get a one-off build
+    if rollups_missing(conn):
+        rebuild_rollups(conn)
+    return conn
+
+
+def migrate(db_path=None):
+    """Bring a meter database up to the current schema"""
+    close(connect(db_path, migrate=True))
+
+
+def rollups_missing(conn):
+    """True if meter_data has readings but the rollup tables are empty"""
+    has_rollups = conn.execute("SELECT 1 FROM daily_usage LIMIT 1").fetchone()
+    has_data = conn.execute("SELECT 1 FROM meter_data LIMIT 1").fetchone()
+    return bool(has_data and not has_rollups)
+
+
+def needs_migration(conn):
+    """True if connect(migrate=True) would change the schema or rebuild rollups"""
+    if 'ts' not in table_columns(conn, 'meter_data'):
+        return True
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    if not set(REQUIRED_TABLES) <= tables:
+        return True
+    return any('meter_id' not in table_columns(conn, table) for table in ROLLUP_TABLES) or rollups_missing(conn)
+
+
+def table_columns(conn, table):
+    """Return the column names of a table (empty if it does not exist)"""
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+
+def legacy_text_to_epoch(text):
+    """Read a legacy dttm_start string as UTC wall clock time"""
+    return calendar.timegm(datetime.fromisoformat(text).timetuple())
+
+
+def written_in_utc(first, last):
+    """
+    True if a legacy ingest batch covering first..last was written in UTC
+
+    PG&E delivers whole LOCAL_TZ days. The R loaders stored them as local
+    time, so their batches start at 00:00. The Python pipeline converted
+    timestamps with the runner's clock (UTC in GitHub Actions), so its
+    batches start and end at LOCAL_TZ midnight expressed in UTC, e.g.
+    08:00 -> 07:00 in winter and 07:00 -> 06:00 in summer.
+    """
+    if first[11:13] == '00':
+        return False
+    (local_first, _), (local_last, _) = epoch_to_local([legacy_text_to_epoch(first), legacy_text_to_epoch(last)])
+    return local_first[11:] == '00:00:00' and local_last[11:] == '23:00:00'
+
+
+def migrate_schema(conn):
+    """
+    Upgrade tables created before readings were keyed by meter and epoch
+
+    meter_data is rebuilt with (meter_id, ts) as its primary key. Rows
+    without a meter go to DEFAULT_METER_ID. Where each row came from is
+    worked out per ingest batch (rows sharing a created_at): batches the
+    Python pipeline wrote in UTC (see written_in_utc()) are read as UTC, all
+    others as LOCAL_TZ wall clock time. Nothing is dropped: a row whose local time
+    does not exist, or that lands on an instant already taken by a newer
+    batch, is moved to meter_data_quarantine with the reason. The rollup
+    tables are derived data, so they are dropped and rebuilt by connect().
+    """
+    columns = table_columns(conn, 'meter_data')
+    if columns and 'ts' not in columns:
+        logger.info("Migrating meter_data to per-meter epoch keys")
+        meter_sql = 'meter_id' if 'meter_id' in columns else f"'{DEFAULT_METER_ID}'"
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Newest batch first, so it keeps an instant claimed twice
+            rows = conn.execute(f"""
+                SELECT {meter_sql}, dttm_start, hour, value, day, day2, created_at FROM meter_data
+                ORDER BY created_at DESC, 1, dttm_start
+            """).fetchall()
+            as_local = local_to_epoch([row[1] for row in rows])
+            exists_locally = [
+                dttm_start == row[1]
+                for row, (dttm_start, _) in zip(rows, epoch_to_local(as_local))
+            ]
+
+            batches = {}
+            for row in rows:
+                first, last = batches.get(row[6], (row[1], row[1]))
+                batches[row[6]] = (min(first, row[1]), max(last, row[1]))
+            utc_batches = {
+                created_at for created_at, (first, last) in batches.items() if written_in_utc(first, last)
+            }
+
+            kept, quarantined, seen = [], [], set()
+            for row, local_ts, exists in zip(rows, as_local, exists_locally):
+                if row[6] in utc_batches:
+                    ts = legacy_text_to_epoch(row[1])
+                elif exists:
+                    ts = local_ts
+                else:
+                    quarantined.append(row + (f"time does not exist in {LOCAL_TZ.key}",))
+                    continue
+                if (row[0], ts) in seen:
+                    quarantined.append(row + ("instant already stored by a newer batch",))
+                    continue
+                seen.add((row[0], ts))
+                kept.append((row[0], ts) + row[3:])
+
+            conn.execute(MIGRATED_METER_DATA_SQL)
+            conn.executemany("""
+                INSERT INTO meter_data_migrated
+                    (meter_id, ts, dttm_start, hour, value, day, day2, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """, (
+                row[:2] + local + row[2:]
+                for row, local in zip(kept, epoch_to_local([row[1] for row in kept]))
+            ))
+            if quarantined:
+                conn.execute(QUARANTINE_SQL)
+                conn.executemany("""
+                    INSERT INTO meter_data_quarantine
+                        (meter_id, dttm_start, hour, value, day, day2, created_at, reason)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """, quarantined)
+            conn.execute("DROP TABLE meter_data")
+            conn.execute("ALTER TABLE meter_data_migrated RENAME TO meter_data")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        utc_rows = sum(1 for row in rows if row[6] in utc_batches)
+        logger.info(f"Migrated {len(kept)} readings ({utc_rows} from {len(utc_batches)} batch(es) "
+                    f"written in UTC, the rest as {LOCAL_TZ.key} time)")
+        if quarantined:
+            logger.warning(f"Moved {len(quarantined)} reading(s) that could not be placed to "
+                           f"meter_data_quarantine; review them there")
+        for table in ROLLUP_TABLES:
+            conn.execute(f"DROP TABLE IF EXISTS {table}")
+
+    for table in ROLLUP_TABLES:
+        columns = table_columns(conn, table)
+        if columns and 'meter_id' not in columns:
+            conn.execute(f"DROP TABLE {table}")
+
+
+def list_meters(conn):
+    """Return the ids of every meter with stored readings"""
+    return [row[0] for row in conn.execute("SELECT DISTINCT meter_id FROM meter_data ORDER BY meter_id")]
+
+
+def adopt_default_meter(conn, meter_id):
+    """
+    Move rows stored under DEFAULT_METER_ID to a real meter id
+
+    Single-meter databases migrated from the old schema hold their history
+    under DEFAULT_METER_ID. The first ingest that sees exactly one usage
+    point calls this so new readings line up with that history. Nothing
+    happens if any other meter already has readings.
+
+    Returns:
+        True if rows were adopted
+    """
+    if meter_id == DEFAULT_METER_ID:
+        return False
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        others = conn.execute(
+            "SELECT 1 FROM meter_data WHERE meter_id NOT IN (?, ?) LIMIT 1",
+            (DEFAULT_METER_ID, meter_id)
+        ).fetchone()
+        legacy = conn.execute("SELECT 1 FROM meter_data WHERE meter_id = ? LIMIT 1",
+                              (DEFAULT_METER_ID,)).fetchone()
+        if others or not legacy:
+            conn.execute("ROLLBACK")
+            return False
+
+        # Readings already stored under the real id win over legacy copies
+        conn.execute("UPDATE OR IGNORE meter_data SET meter_id = ? WHERE meter_id = ?",
+                      (meter_id, DEFAULT_METER_ID))
+        conn.execute("DELETE FROM meter_data WHERE meter_id = ?", (DEFAULT_METER_ID,))
+        conn.execute("UPDATE OR IGNORE ingest_state SET meter_id = ? WHERE meter_id = ?",
+                     (meter_id, DEFAULT_METER_ID))
+        conn.execute("DELETE FROM ingest_state WHERE meter_id = ?", (DEFAULT_METER_ID,))
+        conn.execute("UPDATE OR IGNORE anomalies SET meter_id = ? WHERE meter_id = ?",
+                     (meter_id, DEFAULT_METER_ID))
+        conn.execute("UPDATE OR IGNORE interval_data SET meter_id = ? WHERE meter_id = ?",
+                     (meter_id, DEFAULT_METER_ID))
+        conn.execute("DELETE FROM interval_data WHERE meter_id = ?", (DEFAULT_METER_ID,))
+        # Detector state is rebuilt from the merged history on the next ingest
+        for stale in (DEFAULT_METER_ID, meter_id):
+            anomaly_detector.reset(conn, stale)
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+    logger.info(f"Adopted readings stored under '{DEFAULT_METER_ID}' as meter {meter_id}")
+    rebuild_rollups(conn)
+    return True
+
+
+def close(conn):
+    """Checkpoint the WAL back into the main database file (unless read-only) and close"""
+    try:
+        if not conn.execute("PRAGMA query_only").fetchone()[0]:
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    finally:
+        conn.close()
+
+
+@lru_cache(maxsize=None)
+def utc_offset(bucket):
+    """Return the LOCAL_TZ UTC offset in seconds for a UTC hour bucket (ts // 3600)"""
+    return int(datetime.fromtimestamp(bucket * 3600, LOCAL_TZ).utcoffset().total_seconds())
+
+
+def local_hour_offsets(starts):
+    """Map each UTC hour bucket in `starts` to its LOCAL_TZ offset"""
+    return {bucket: utc_offset(bucket) for bucket in {ts // 3600 for ts in starts}}
+
+
+def epoch_to_local(starts):
+    """
+    Convert epoch seconds to LOCAL_TZ wall clock in bulk
+
+    Returns:
+        List of (dttm_start, hour) tuples, one per start
+    """
+    offsets = local_hour_offsets(starts)
+    converted = []
+    for ts in starts:
+        parts = time.gmtime(ts + offsets[ts // 3600])
+        converted.append((time.strftime(TIMESTAMP_FORMAT, parts), parts.tm_hour))
+    return converted
+
+
+def local_to_epoch(timestamps):
+    """
+    Convert LOCAL_TZ wall clock strings ('YYYY-MM-DD' or TIMESTAMP_FORMAT)
+    to epoch seconds in bulk
+
+    The offset is resolved once per distinct local hour. An hour repeated
+    when DST ends resolves to its first occurrence.
+    """
+    offsets = {}
+    starts = []
+    for text in timestamps:
+        wall = datetime.fromisoformat(text)
+        hour_key = text[:13]
+        if hour_key not in offsets:
+            offsets[hour_key] = int(wall.replace(tzinfo=LOCAL_TZ).utcoffset().total_seconds())
+        starts.append(calendar.timegm(wall.timetuple()) - offsets[hour_key])
+    return starts
+
+
+def aggregate_hourly(columns, meter_index=None):
+    """
+    Aggregate columnar interval readings to hourly kWh
+
+    Duplicate intervals (overlapping responses) keep the last value seen.
+    Hours are LOCAL_TZ hours keyed by the epoch they start at, so the hour
+    repeated when DST ends stays two separate rows.
+
+    Args:
+        columns: Dict of 'start', 'duration' and 'value_wh' arrays
+            (see fetch_and_parse_pge.new_interval_columns)
+        meter_index: Optional index into columns['meter_ids']; only that
+            meter's readings are aggregated
+
+    Returns:
+        List of (ts, dttm_start, hour, value_kwh) tuples sorted by time
+    """
+    if meter_index is None:
+        latest = dict(zip(columns['start'], columns['value_wh']))
+    else:
+        latest = {
+            start: value_wh
+            for start, value_wh, meter in zip(columns['start'], columns['value_wh'], columns['meter'])
+            if meter == meter_index
+        }
+    offsets = local_hour_offsets(latest)
+
+    hourly_wh = {}
+    for ts, value_wh in latest.items():
+        offset = offsets[ts // 3600]
+        # Start of the local hour, back in UTC (offsets need not be whole hours)
+        hour_start = ts - (ts + offset) % 3600
+        hourly_wh[hour_start] = hourly_wh.get(hour_start, 0) + value_wh
+
+    hour_starts = sorted(hourly_wh)
+    # CRITICAL: Convert Wh to kWh (PG&E ESPI values are in Wh)
+    return [
+        (ts, dttm_start, hour, hourly_wh[ts] / 1000.0)
+        for ts, (dttm_start, hour) in zip(hour_starts, epoch_to_local(hour_starts))
+    ]
+
+
+def native_intervals(columns, meter_index=None):
+    """
+    Deduplicate columnar readings at their native resolution
+
+    Args:
+        columns: Dict of 'start', 'duration' and 'value_wh' arrays
+        meter_index: Optional index into columns['meter_ids']
+
+    Returns:
+        List of (ts, duration, value_kwh) tuples sorted by time; duplicate
+        intervals keep the last value seen
+    """
+    readings = zip(columns['start'], columns['duration'], columns['value_wh'])
+    if meter_index is None:
+        latest = {start: (duration, value_wh) for start, duration, value_wh in readings}
+    else:
+        latest = {
+            start: (duration, value_wh)
+            for (start, duration, value_wh), meter in zip(readings, columns['meter'])
+            if meter == meter_index
+        }
+    return [(ts, duration, value_wh / 1000.0) for ts, (duration, value_wh) in sorted(latest.items())]
+
+
+def aggregate_hourly_by_meter(columns):
+    """
+    Aggregate columnar readings to hourly kWh separately for each meter
+
+    Returns:
+        Dict of meter_id -> (rows from aggregate_hourly(), newest interval
+        start, intervals from native_intervals()) for every meter with
+        readings
+    """
+    newest = {}
+    for start, meter in zip(columns['start'], columns['meter']):
+        if start > newest.get(meter, -1):
+            newest[meter] = start
+    return {
+        columns['meter_ids'][index]: (aggregate_hourly(columns, index), newest[index],
+                                      native_intervals(columns, index))
+        for index in sorted(newest)
+    }
+
+
+def merge_intervals(conn, meter_id, rows, intervals):
+    """
+    Compare native intervals with interval_data and re-total their hours
+
+    A payload may hold only part of an hour (e.g. the first two 15-minute
+    intervals); each hour is totalled from everything stored for it plus
+    the payload, which keeps the hourly level consistent with the native
+    one.
+
+    Args:
+        rows: (ts, dttm_start, hour, value_kwh) tuples sorted by time
+        intervals: (ts, duration, value_kwh) tuples making up those hours
+
+    Returns:
+        (rows with value_kwh replaced by the hour's full total,
+        intervals that are new or differ from the stored ones)
+    """
+    stored = {
+        ts: (duration, value) for ts, duration, value in conn.execute(
+            "SELECT ts, duration, value FROM interval_data WHERE meter_id = ? AND ts >= ? AND ts < ?",
+            (meter_id, rows[0][0], rows[-1][0] + 3600))
+    }
+    changed = [interval for interval in intervals if stored.get(interval[0]) != interval[1:]]
+    stored.update((ts, (duration, value)) for ts, duration, value in changed)
+
+    totals = dict.fromkeys((row[0] for row in rows), 0.0)
+    for ts, (_, value) in stored.items():
+        hour_start = ts - (ts + utc_offset(ts // 3600)) % 3600
+        if hour_start in totals:
+            totals[hour_start] += value
+    return [(ts, dttm_start, hour, totals[ts]) for ts, dttm_start, hour, _ in rows], changed
+
+
+def drop_intervals(conn, meter_days):
+    """
+    Delete the native intervals of the given meter days
+
+    Used when the hourly level is corrected in place (repair_meter_data.py),
+    so no stale native readings are served for those days; queries fall
+    back to the corrected hourly rows.
+    """
+    for meter_id, day in set(meter_days):
+        conn.execute("DELETE FROM interval_data WHERE meter_id = ? AND ts >= ? AND ts < ?",
+                     (meter_id,) + day_bounds(day))
+
+
+def first_data_date(conn):
+    """Return the earliest date in meter_data, or None if it is empty"""
+    first = conn.execute("SELECT MIN(dttm_start) FROM meter_data").fetchone()[0]
+    return date.fromisoformat(first[:10]) if first else None
+
+
+def day_bounds(day):
+    """Return the [start, end) ts bounds of a 'YYYY-MM-DD' LOCAL_TZ day"""
+    next_day = date.fromisoformat(day) + timedelta(days=1)
+    return tuple(local_to_epoch([day, next_day.isoformat()]))
+
+
+def profile_contributions(conn, meter_days):
+    """
+    Sum the hourly_profile contributions of the given meter days
+
+    Args:
+        meter_days: (meter_id, 'YYYY-MM-DD') pairs
+
+    Returns:
+        Dict of (meter_id, weekday, hour) -> [readings, total_kwh, sum_sq]
+    """
+    totals = {}
+    for meter_id, day in meter_days:
+        for meter, weekday, hour, count, total, total_sq in conn.execute(
+                PROFILE_CONTRIBUTION_SQL, (meter_id,) + day_bounds(day)):
+            entry = totals.setdefault((meter, weekday, hour), [0, 0.0, 0.0])
+            entry[0] += count
+            entry[1] += total
+            entry[2] += total_sq
+    return totals
+
+
+def refresh_rollups(conn, meter_days, profile_before):
+    """
+    Bring the rollup tables up to date for meter days whose readings changed
+
+    Must run inside the transaction that changed meter_data.
+
+    Args:
+        meter_days: (meter_id, 'YYYY-MM-DD') pairs whose readings were written
+        profile_before: profile_contributions() of those days taken before
+            the write, so hourly_profile can be adjusted by the difference
+    """
+    meter_days = sorted(set(meter_days))
+    if not meter_days:
+        return
+
+    for meter_id, day in meter_days:
+        conn.execute("DELETE FROM daily_usage WHERE meter_id = ? AND reading_date = ?", (meter_id, day))
+        conn.execute(DAILY_ROLLUP_SQL, (meter_id,) + day_bounds(day))
+
+    for meter_id, month in sorted({(meter_id, day[:7]) for meter_id, day in meter_days}):
+        month_start = date.fromisoformat(f"{month}-01")
+        month_end = (month_start + timedelta(days=32)).replace(day=1)
+        conn.execute("DELETE FROM monthly_usage WHERE meter_id = ? AND month = ?", (meter_id, month))
+        conn.execute(MONTHLY_ROLLUP_SQL, (meter_id, month_start.isoformat(), month_end.isoformat()))
+
+    profile_after = profile_contributions(conn, meter_days)
+    deltas = []
+    for key in set(profile_before) | set(profile_after):
+        before = profile_before.get(key, (0, 0.0, 0.0))
+        after = profile_after.get(key, (0, 0.0, 0.0))
+        deltas.append(key + tuple(a - b for a, b in zip(after, before)))
+    conn.executemany(PROFILE_DELTA_SQL, deltas)
+    bump_data_version(conn)
+
+
+def rebuild_rollups(conn):
+    """Recompute every rollup table from meter_data in one transaction"""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for table in ROLLUP_TABLES:
+            conn.execute(f"DELETE FROM {table}")
+        for meter_id in list_meters(conn):
+            conn.execute(DAILY_ROLLUP_SQL, (meter_id,) + ALL_TIME)
+            conn.execute(MONTHLY_ROLLUP_SQL, (meter_id, '0000-01-01', '9999-12-31'))
+            conn.execute("""
+                INSERT INTO hourly_profile (meter_id, weekday, hour, readings, total_kwh, sum_sq)
+                """ + PROFILE_CONTRIBUTION_SQL, (meter_id,) + ALL_TIME)
+        bump_data_version(conn)
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    logger.info("Rebuilt rollup tables from meter_data")
+
+
+def bump_data_version(conn):
+    """Mark the stored data as changed; call inside the writing transaction"""
+    conn.execute("UPDATE data_version SET version = version + 1")
+
+
+def get_data_version(conn):
+    """Return the counter bump_data_version() advances"""
+    return conn.execute("SELECT version FROM data_version").fetchone()[0]
+
+
+def get_watermark(conn, meter_id=DEFAULT_METER_ID):
+    """
+    Return the epoch start of the newest interval ingested for a meter
+
+    Databases created before ingest_state existed fall back to the meter's
+    newest meter_data row. Returns None for a meter with no readings.
+    """
+    row = conn.execute("SELECT last_start FROM ingest_state WHERE meter_id = ?",
+                       (meter_id,)).fetchone()
+    if row:
+        return row[0]
+
+    return conn.execute("SELECT MAX(ts) FROM meter_data WHERE meter_id = ?",
+                        (meter_id,)).fetchone()[0]
+
+
+def get_watermarks(conn):
+    """Return {meter_id: watermark} for every meter with readings or state"""
+    meters = set(list_meters(conn))
+    meters.update(row[0] for row in conn.execute("SELECT meter_id FROM ingest_state"))
+    return {meter_id: get_watermark(conn, meter_id) for meter_id in sorted(meters)}
+
+
+def skip_before(watermark):
+    """
+    Return the earliest interval start worth parsing given a watermark
+
+    Aligned to the hour so an hour is never half-skipped and re-summed.
+    """
+    if watermark is None:
+        return None
+    threshold = watermark - REVISION_LOOKBACK_HOURS * 3600
+    return threshold - threshold % 3600
+
+
+def upsert_hourly_readings(conn, rows, watermark=None, meter_id=DEFAULT_METER_ID, intervals=None):
+    """
+    Upsert hourly readings into meter_data in a single transaction
+
+    Rows are compared with what is already stored so unchanged hours are
+    not rewritten, and the rollup tables are refreshed for the days that
+    changed. `day`/`day2` are numbered from the first date in the table,
+    as the R processing scripts do. New hours (not revisions) are scored by
+    anomaly_detector before they are written.
+
+    Args:
+        rows: (ts, dttm_start, hour, value_kwh) tuples from aggregate_hourly()
+        watermark: Epoch start of the newest interval in this batch; the
+            stored watermark only ever moves forward
+        meter_id: Meter the readings and watermark belong to
+        intervals: Native (ts, duration, value_kwh) readings behind `rows`
+            (see native_intervals()); stored in interval_data, and the
+            hours are then totalled from everything stored for them
+
+    Returns:
+        Dict with 'new', 'revised' and 'unchanged' hour counts and the
+        number of 'anomalies' flagged among the new hours
+    """
+    counts = {'new': 0, 'revised': 0, 'unchanged': 0, 'anomalies': 0}
+    if not rows:
+        return counts
+
+    changed = []
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        if intervals:
+            rows, changed = merge_intervals(conn, meter_id, rows, intervals)
+            conn.executemany(INTERVAL_UPSERT_SQL, ((meter_id,) + interval for interval in changed))
+
+        existing = dict(conn.execute(
+            "SELECT ts, value FROM meter_data WHERE meter_id = ? AND ts BETWEEN ? AND ?",
+            (meter_id, rows[0][0], rows[-1][0])
+        ))
+        first_date = first_data_date(conn) or date.fromisoformat(rows[0][1][:10])
+
+        params = []
+        new_rows = []
+        for ts, dttm_start, hour, value in rows:
+            stored = existing.get(ts)
+            if stored is None:
+                counts['new'] += 1
+                new_rows.append((ts, dttm_start, hour, value))
+            elif abs(stored - value) > 1e-9:
+                counts['revised'] += 1
+            else:
+                counts['unchanged'] += 1
+                continue
+            day = (date.fromisoformat(dttm_start[:10]) - first_date).days + 1
+            params.append((meter_id, ts, dttm_start, hour, value, day, day))
+
+        touched_days = {(meter_id, row[2][:10]) for row in params}
+        profile_before = profile_contributions(conn, touched_days)
+        if new_rows:
+            counts['anomalies'] = anomaly_detector.score_new_readings(conn, meter_id, new_rows)
+        conn.executemany(UPSERT_SQL, params)
+        refresh_rollups(conn, touched_days, profile_before)
+        if changed and not touched_days:
+            bump_data_version(conn)  # interval_data is served too
+
+        if watermark is not None:
+            conn.execute(WATERMARK_SQL, (meter_id, watermark))
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+    return counts
+
+
+def level_aligned(level, start, end):
+    """True if [start, end) starts and ends on bucket boundaries of a pyramid level"""
+    if level == 'interval':
+        return True
+    if level == 'hour':
+        return all((ts + utc_offset(ts // 3600)) % 3600 == 0 for ts in (start, end))
+    boundary = ' 00:00:00' if level == 'day' else '-01 00:00:00'
+    return all(text.endswith(boundary) for text, _ in epoch_to_local([start, end]))
+
+
+def select_level(start, end, granularity='hour'):
+    """
+    Pick the coarsest pyramid level able to answer a query
+
+    A level qualifies if it is no coarser than `granularity` and the range
+    falls on its bucket boundaries (a range ending mid-day cannot be read
+    from daily_usage, so its days are summed from meter_data instead).
+    interval_data is only read when `granularity` is 'interval': older
+    readings exist from the hourly level up only, so any other range that
+    does not fall on hour boundaries is read from meter_data, clipped to
+    whole hours.
+
+    Args:
+        start, end: [start, end) range in UTC epoch seconds
+        granularity: One of LEVELS
+
+    Returns:
+        Name of the level to read
+    """
+    if granularity not in LEVELS:
+        raise ValueError(f"Unknown granularity {granularity!r}; expected one of {', '.join(LEVELS)}")
+    if granularity == 'interval':
+        return 'interval'
+    for level in reversed(LEVELS[LEVELS.index('hour') + 1:LEVELS.index(granularity) + 1]):
+        if level_aligned(level, start, end):
+            return level
+    return 'hour'
+
+
+def clip_to_hours(start, end):
+    """Narrow [start, end) to the LOCAL_TZ hours that lie entirely inside it"""
+    start += -(start + utc_offset(start // 3600)) % 3600
+    end -= (end + utc_offset(end // 3600)) % 3600
+    return start, max(start, end)
+
+
+def query_usage(conn, start, end, granularity='hour', meter_id=None):
+    """
+    Total usage per `granularity` bucket over [start, end)
+
+    Reads the coarsest level select_level() allows. A range that does not
+    fall on hour boundaries is clipped to the whole hours inside it, unless
+    `granularity` is 'interval'. Readings stored before interval_data
+    existed have no native rows, so 'interval' queries only see what was
+    ingested since.
+
+    Args:
+        start, end: Range in UTC epoch seconds
+        granularity: 'interval', 'hour', 'day' or 'month'
+        meter_id: Meter to read; every meter summed if None
+
+    Returns:
+        Dict with the 'level' read, the 'start' and 'end' actually covered
+        and 'rows' of (label, kWh) sorted by time. Labels are LOCAL_TZ wall
+        clock: TIMESTAMP_FORMAT for interval and hour buckets, 'YYYY-MM-DD'
+        for days, 'YYYY-MM' for months.
+    """
+    level = select_level(start, end, granularity)
+    if level == 'hour':
+        start, end = clip_to_hours(start, end)
+    meter_sql, meter_args = ("AND meter_id = ?", [meter_id]) if meter_id is not None else ("", [])
+    label_length = {'day': 10, 'month': 7}.get(granularity)
+
+    if level == 'interval':
+        readings = conn.execute(f"""
+            SELECT ts, SUM(value) FROM interval_data WHERE ts >= ? AND ts < ? {meter_sql}
+            GROUP BY ts ORDER BY ts
+        """, [start, end] + meter_args).fetchall()
+        if granularity == 'hour':
+            # Bucket by the epoch the local hour starts at, so the hour
+            # repeated when DST ends stays two buckets
+            buckets = {}
+            for ts, value in readings:
+                hour_start = ts - (ts + utc_offset(ts // 3600)) % 3600
+                buckets[hour_start] = buckets.get(hour_start, 0.0) + value
+            readings = sorted(buckets.items())
+        labels = [text for text, _ in epoch_to_local([ts for ts, _ in readings])]
+        if label_length is None:
+            return {'level': level, 'start': start, 'end': end, 'rows': list(zip(labels, (value for _, value in readings)))}
+        totals = {}
+        for label, (_, value) in zip(labels, readings):
+            totals[label[:label_length]] = totals.get(label[:label_length], 0.0) + value
+        return {'level': level, 'start': start, 'end': end, 'rows': list(totals.items())}
+
+    if level == 'hour':
+        if granularity == 'hour':
+            sql = f"""
+                SELECT MIN(dttm_start), SUM(value) FROM meter_data WHERE ts >= ? AND ts < ? {meter_sql}
+                GROUP BY ts ORDER BY ts
+            """
+        else:
+            sql = f"""
+                SELECT substr(dttm_start, 1, {label_length}) AS label, SUM(value) FROM meter_data
+                WHERE ts >= ? AND ts < ? {meter_sql}
+                GROUP BY label ORDER BY label
+            """
+        return {'level': level, 'start': start, 'end': end, 'rows': conn.execute(sql, [start, end] + meter_args).fetchall()}
+
+    first, last = (text[:10] for text, _ in epoch_to_local([start, end]))
+    if level == 'day':
+        sql = f"""
+            SELECT substr(reading_date, 1, {label_length}) AS label, SUM(total_kwh) FROM daily_usage
+            WHERE reading_date >= ? AND reading_date < ? {meter_sql}
+            GROUP BY label ORDER BY label
+        """
+        return {'level': level, 'start': start, 'end': end, 'rows': conn.execute(sql, [first, last] + meter_args).fetchall()}
+
+    sql = f"""
+        SELECT month, SUM(total_kwh) FROM monthly_usage
+        WHERE month >= ? AND month < ? {meter_sql}
+        GROUP BY month ORDER BY month
+    """
+    return {'level': level, 'start': start, 'end': end, 'rows': conn.execute(sql, [first[:7], last[:7]] + meter_args).fetchall()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Migrate the meter database to the current schema")
+    parser.add_argument('--db', help="Meter database (default: data/pge_meter_data.sqlite)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    migrate(args.db)
+    logger.info("Meter database schema is current")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
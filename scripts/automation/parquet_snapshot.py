@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Parquet Snapshot of Meter Data
+
+Keeps a month-partitioned Parquet copy of meter_data for fast loading:
+1. One file per month at data/parquet/month=YYYY-MM/part-0.parquet
+   (hive-style, so arrow::open_dataset() sees `month` as a partition key)
+2. Typed columns: meter_id (dictionary-encoded string), dttm_start as
+   timestamp[ms] in meter_store.LOCAL_TZ built straight from the epoch key
+   (so both readings of the repeated DST hour survive), hour/day/day2 as
+   int32 and value as float64
+3. A month is rewritten only when its monthly_usage rollups (records,
+   total, sum of squares across meters) no longer match the signature
+   recorded in _manifest.json, so a normal ingest rewrites one or two files
+
+pyarrow is optional; without it the snapshot is skipped with a warning.
+"""
+
+import os
+import json
+import shutil
+import logging
+from datetime import date, timedelta
+from pathlib import Path
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+import meter_store
+
+logger = logging.getLogger(__name__)
+
+# Snapshot location (override via environment)
+PARQUET_DIR = Path(os.getenv(
+    'PGE_PARQUET_DIR',
+    Path(__file__).parent.parent.parent / 'data' / 'parquet'
+))
+MANIFEST_FILE = '_manifest.json'
+MANIFEST_VERSION_KEY = '_version'
+SNAPSHOT_VERSION = 3  # Bump when the file layout changes to force a full rewrite
+PARTITION_FILE = 'part-0.parquet'
+
+SCHEMA = pa.schema([
+    ('meter_id', pa.dictionary(pa.int16(), pa.string())),
+    ('dttm_start', pa.timestamp('ms', tz=meter_store.LOCAL_TZ.key)),
+    ('hour', pa.int32()),
+    ('value', pa.float64()),
+    ('day', pa.int32()),
+    ('day2', pa.int32()),
+]) if pa is not None else None
+
+
+def month_signature(records, total_kwh, sum_sq):
+    """Summarize a month's rollup so changed partitions can be detected"""
+    return [records, round(total_kwh or 0.0, 6), round(sum_sq or 0.0, 6)]
+
+
+def load_manifest(out_dir):
+    """Return the recorded month -> signature map, or {} if missing/corrupt"""
+    try:
+        with open(out_dir / MANIFEST_FILE) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(out_dir, manifest):
+    """Write the manifest atomically"""
+    tmp_path = out_dir / f"{MANIFEST_FILE}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, out_dir / MANIFEST_FILE)
+
+
+def read_month(conn, month):
+    """Read one month of meter_data as an Arrow table"""
+    month_start = date.fromisoformat(f"{month}-01")
+    month_end = (month_start + timedelta(days=32)).replace(day=1)
+    rows = conn.execute("""
+        SELECT meter_id, ts, hour, value, day, day2
+        FROM meter_data
+        WHERE ts >= ? AND ts < ?
+        ORDER BY meter_id, ts
+    """, meter_store.local_to_epoch([month_start.isoformat(), month_end.isoformat()])).fetchall()
+
+    # Epoch seconds cast in bulk; readers convert to local time themselves
+    starts = pa.array([row[1] for row in rows], pa.int64()).cast(pa.timestamp('s')).cast(
+        SCHEMA.field('dttm_start').type)
+    return pa.table([
+        pa.array([row[0] for row in rows]).dictionary_encode(),
+        starts,
+        [row[2] for row in rows],
+        [row[3] for row in rows],
+        [row[4] for row in rows],
+        [row[5] for row in rows],
+    ], schema=SCHEMA)
+
+
+def write_month(out_dir, month, table):
+    """Replace one month's partition atomically"""
+    partition_dir = out_dir / f"month={month}"
+    partition_dir.mkdir(parents=True, exist_ok=True)
+    tmp_path = partition_dir / f"{PARTITION_FILE}.tmp"
+    pq.write_table(table, tmp_path, compression='zstd')
+    os.replace(tmp_path, partition_dir / PARTITION_FILE)
+
+
+def update_snapshot(conn, out_dir=None):
+    """
+    Rewrite the Parquet partitions of months that changed since the last run
+
+    Args:
+        conn: Connection from meter_store.connect() (rollups must be current)
+        out_dir: Snapshot directory (defaults to PARQUET_DIR)
+
+    Returns:
+        List of months rewritten, or None if pyarrow is not installed
+    """
+    if pa is None:
+        logger.warning("pyarrow not installed; skipping Parquet snapshot")
+        return None
+
+    out_dir = Path(out_dir or PARQUET_DIR)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    manifest = load_manifest(out_dir)
+    if manifest.pop(MANIFEST_VERSION_KEY, None) != SNAPSHOT_VERSION:
+        manifest = {month: None for month in manifest}
+
+    current = {
+        month: month_signature(records, total, total_sq)
+        for month, records, total, total_sq in conn.execute("""
+            SELECT month, SUM(records), SUM(total_kwh), SUM(sum_sq)
+            FROM monthly_usage
+            GROUP BY month
+            ORDER BY month
+        """)
+    }
+
+    written = []
+    for month, signature in current.items():
+        partition = out_dir / f"month={month}" / PARTITION_FILE
+        if manifest.get(month) == signature and partition.exists():
+            continue
+        write_month(out_dir, month, read_month(conn, month))
+        written.append(month)
+
+    # Months that no longer have readings (e.g. after a repair)
+    for month in set(manifest) - set(current):
+        shutil.rmtree(out_dir / f"month={month}", ignore_errors=True)
+
+    save_manifest(out_dir, {**current, MANIFEST_VERSION_KEY: SNAPSHOT_VERSION})
+    if written:
+        logger.info(f"Parquet snapshot: rewrote {len(written)} month(s): {', '.join(written)}")
+    else:
+        logger.info("Parquet snapshot: up to date")
+    return written
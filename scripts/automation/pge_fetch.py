@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Concurrent ESPI Fetching
+
+Fetches PGE resource URIs with:
+1. Bounded parallelism (PGE_FETCH_CONCURRENCY worker threads)
+2. A pooled HTTPS session shared by all workers (mutual TLS + bearer token)
+3. Retries with jittered exponential backoff, honoring Retry-After
+4. Per-URI latency, attempt count and success reporting
+5. An optional on-disk payload cache (see espi_cache.py) checked before
+   each request
+6. An optional access token cache (see token_cache.py) shared with other
+   runs
+
+Used by fetch_and_parse_pge.py.
+"""
+
+import os
+import time
+import random
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from itertools import islice
+from email.utils import parsedate_to_datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# Fetch tuning (override via environment)
+FETCH_CONCURRENCY = int(os.getenv('PGE_FETCH_CONCURRENCY', '4'))
+FETCH_MAX_RETRIES = int(os.getenv('PGE_FETCH_MAX_RETRIES', '4'))
+FETCH_BACKOFF_SECONDS = float(os.getenv('PGE_FETCH_BACKOFF_SECONDS', '1.0'))
+FETCH_BACKOFF_MAX_SECONDS = float(os.getenv('PGE_FETCH_BACKOFF_MAX_SECONDS', '60'))
+FETCH_TIMEOUT_SECONDS = float(os.getenv('PGE_FETCH_TIMEOUT_SECONDS', '120'))
+
+# Status codes worth retrying (rate limiting and transient server errors)
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+def create_session(pool_size=FETCH_CONCURRENCY):
+    """Create a requests session with a connection pool sized for the workers"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def parse_retry_after(value):
+    """
+    Parse a Retry-After header value
+
+    Returns:
+        Delay in seconds, or None if the header is missing or malformed
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+        return max(0.0, retry_at.timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt, retry_after=None):
+    """Full-jitter exponential backoff, never shorter than Retry-After"""
+    delay = random.uniform(0, min(FETCH_BACKOFF_MAX_SECONDS, FETCH_BACKOFF_SECONDS * (2 ** attempt)))
+    if retry_after is not None:
+        delay = max(delay, min(retry_after, FETCH_BACKOFF_MAX_SECONDS))
+    return delay
+
+
+class EspiFetcher:
+    """
+    Fetch ESPI resources over a shared session using an authenticated
+    pgesmd_self_access SelfAccessApi for the certificate and access token
+    """
+
+    def __init__(self, pge_api, concurrency=FETCH_CONCURRENCY, max_retries=FETCH_MAX_RETRIES, cache=None,
+                 token_cache=None):
+        self.pge_api = pge_api
+        self.cache = cache
+        self.token_cache = token_cache
+        self.concurrency = max(1, concurrency)
+        self.max_retries = max(0, max_retries)
+        self.session = create_session(self.concurrency)
+        self.session.cert = pge_api.cert
+        self._token_lock = threading.Lock()
+
+    def _access_token(self, force_refresh=False):
+        """Return a valid access token, refreshing it once for all workers"""
+        with self._token_lock:
+            if force_refresh or self.pge_api.need_token():
+                if self.token_cache is not None:
+                    self.token_cache.refresh(self.pge_api, force=force_refresh)
+                else:
+                    self.pge_api.get_token()
+            return self.pge_api.access_token
+
+    def fetch(self, uri):
+        """
+        Fetch a single URI with retries
+
+        Returns:
+            Dict with 'uri', 'ok', 'data', 'status', 'attempts',
+            'latency' (seconds), 'cached' and 'error' keys
+        """
+        started = time.monotonic()
+        result = {'uri': uri, 'ok': False, 'data': None, 'status': None,
+                  'attempts': 0, 'latency': 0.0, 'cached': False, 'error': None}
+
+        if self.cache is not None:
+            payload = self.cache.get(uri)
+            if payload is not None:
+                result.update(ok=True, data=payload, cached=True,
+                              latency=time.monotonic() - started)
+                return result
+
+        token_refreshed = False
+
+        for attempt in range(self.max_retries + 1):
+            result['attempts'] = attempt + 1
+            retry_after = None
+            try:
+                response = self.session.get(
+                    uri,
+                    headers={"Authorization": f"Bearer {self._access_token()}"},
+                    timeout=FETCH_TIMEOUT_SECONDS
+                )
+                result['status'] = response.status_code
+
+                if response.status_code == 200:
+                    result['ok'] = True
+                    result['data'] = response.text
+                    result['error'] = None
+                    break
+
+                result['error'] = f"HTTP {response.status_code}"
+                if response.status_code == 403 and not token_refreshed:
+                    # Expired or revoked token - refresh once and retry immediately
+                    token_refreshed = True
+                    self._access_token(force_refresh=True)
+                    continue
+                if response.status_code not in RETRYABLE_STATUS_CODES:
+                    break
+                retry_after = parse_retry_after(response.headers.get('Retry-After'))
+
+            except requests.RequestException as e:
+                result['error'] = str(e)
+
+            if attempt < self.max_retries:
+                delay = backoff_delay(attempt, retry_after)
+                logger.warning(f"    Retry {attempt + 1}/{self.max_retries} for {uri[:80]} "
+                               f"in {delay:.1f}s ({result['error']})")
+                time.sleep(delay)
+
+        if result['ok'] and self.cache is not None:
+            try:
+                self.cache.put(uri, result['data'])
+            except OSError as e:
+                logger.warning(f"    Could not cache {uri[:80]}: {e}")
+
+        result['latency'] = time.monotonic() - started
+        return result
+
+    def fetch_all(self, uris):
+        """
+        Fetch URIs concurrently, yielding results as they complete
+
+        At most `concurrency` requests are in flight at once, and a new one
+        is only started once a result has been taken, so payloads never
+        pile up faster than the caller consumes them.
+        """
+        uris = iter(uris)
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='espi-fetch') as pool:
+            pending = {pool.submit(self.fetch, uri) for uri in islice(uris, self.concurrency)}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+                    pending.update(pool.submit(self.fetch, uri) for uri in islice(uris, 1))
+
+    def close(self):
+        """Close the pooled session"""
+        self.session.close()
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+Pipeline Run Metrics
+
+Structured instrumentation for the nightly scripts:
+1. Per-stage wall time, call count and items processed (with items/s),
+   plus free-form counters (bytes fetched, retries, readings, ...)
+2. One JSON run record per run, appended to <PGE_METRICS_DIR>/<script>.jsonl
+3. A Prometheus textfile at <PGE_METRICS_DIR>/<script>.prom, replaced
+   atomically, for node_exporter's textfile collector
+4. An opt-in profiler (PGE_PROFILE=cpu,memory): cProfile across every
+   thread started during the run and a tracemalloc snapshot, dumped to
+   <PGE_METRICS_DIR>/profiles/
+
+Stages that run concurrently (fetch workers, parse and write threads)
+accumulate their busy time, so their seconds can add up to more than the
+run's wall time.
+
+Usage:
+    with pipeline_metrics.instrument('fetch_and_parse_pge') as metrics:
+        with metrics.stage('parse') as stage:
+            stage['items'] += parse(...)
+        metrics.incr('bytes_fetched', len(payload))
+        metrics.exit_code = 0
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import logging
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# Output location and profiler switch (override via environment)
+METRICS_DIR = Path(os.getenv(
+    'PGE_METRICS_DIR',
+    Path(__file__).parent.parent.parent / 'data' / 'metrics'
+))
+PROFILE_MODES = {mode.strip() for mode in os.getenv('PGE_PROFILE', '').lower().split(',') if mode.strip()}
+PROFILE_TOP_N = 40         # Functions / allocation sites listed in the text summaries
+TRACEMALLOC_FRAMES = 10    # Stack depth kept for each allocation
+
+PROMETHEUS_PREFIX = 'pge_pipeline'
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far, in MB"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KB on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+class RunMetrics:
+    """Stage timings and counters of one script run (thread-safe)"""
+
+    def __init__(self, script):
+        self.script = script
+        self.started_at = datetime.now(timezone.utc)
+        self._started = time.perf_counter()
+        self.duration = None
+        self.stages = {}
+        self.counters = {}
+        self.exit_code = None
+        self.error = None
+        self._lock = threading.Lock()
+
+    def _stage(self, name):
+        return self.stages.setdefault(name, {'seconds': 0.0, 'calls': 0, 'items': 0})
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Time a block as one call of a stage
+
+        Yields a dict whose 'items' the block may increment; it is added to
+        the stage's total when the block exits.
+        """
+        call = {'items': 0}
+        started = time.perf_counter()
+        try:
+            yield call
+        finally:
+            self.add_time(name, time.perf_counter() - started, call['items'])
+
+    def add_time(self, name, seconds, items=0):
+        """Record time spent in a stage that was measured elsewhere"""
+        with self._lock:
+            stage = self._stage(name)
+            stage['seconds'] += seconds
+            stage['calls'] += 1
+            stage['items'] += items
+
+    def incr(self, name, value=1):
+        """Add to a counter"""
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def finish(self):
+        self.duration = time.perf_counter() - self._started
+
+    def record(self):
+        """
+        Build the JSON run record
+
+        Returns:
+            Dict with run metadata, 'stages' (seconds, calls, items,
+            items_per_sec) and 'counters'
+        """
+        with self._lock:
+            stages = {
+                name: dict(stage, seconds=round(stage['seconds'], 4),
+                           items_per_sec=round(stage['items'] / stage['seconds'], 1)
+                           if stage['items'] and stage['seconds'] else None)
+                for name, stage in self.stages.items()
+            }
+            counters = dict(self.counters)
+        rss = peak_rss_mb()
+        return {
+            'script': self.script,
+            'started_at': self.started_at.isoformat(timespec='seconds'),
+            'duration_seconds': round(self.duration, 4) if self.duration is not None else None,
+            'exit_code': self.exit_code,
+            'status': 'error' if self.error or self.exit_code else 'ok',
+            'error': self.error,
+            'peak_rss_mb': round(rss, 1) if rss is not None else None,
+            'stages': stages,
+            'counters': counters,
+        }
+
+
+def prometheus_text(record):
+    """Render a run record in the Prometheus text exposition format"""
+    script = record['script']
+    lines = []
+
+    def gauge(name, help_text, samples):
+        lines.append(f"# HELP {PROMETHEUS_PREFIX}_{name} {help_text}")
+        lines.append(f"# TYPE {PROMETHEUS_PREFIX}_{name} gauge")
+        for labels, value in samples:
+            label_text = ','.join(f'{key}="{val}"' for key, val in {'script': script, **labels}.items())
+            lines.append(f"{PROMETHEUS_PREFIX}_{name}{{{label_text}}} {value}")
+
+    started = datetime.fromisoformat(record['started_at']).timestamp()
+    gauge('last_run_timestamp_seconds', "Start time of the last run", [({}, int(started))])
+    gauge('last_run_success', "1 if the last run exited cleanly", [({}, int(record['status'] == 'ok'))])
+    gauge('duration_seconds', "Wall time of the last run", [({}, record['duration_seconds'] or 0)])
+    if record['peak_rss_mb'] is not None:
+        gauge('peak_rss_bytes', "Peak resident set size of the last run",
+              [({}, int(record['peak_rss_mb'] * 1024 * 1024))])
+
+    stages = record['stages'].items()
+    gauge('stage_seconds', "Time spent in each stage of the last run",
+          [({'stage': name}, stage['seconds']) for name, stage in stages])
+    gauge('stage_items', "Items processed by each stage of the last run",
+          [({'stage': name}, stage['items']) for name, stage in stages])
+    for name, value in sorted(record['counters'].items()):
+        gauge(name, f"{name.replace('_', ' ')} in the last run", [({}, value)])
+    return '\n'.join(lines) + '\n'
+
+
+def write_metrics(record, out_dir=None):
+    """Append the JSON run record and replace the Prometheus textfile"""
+    out_dir = Path(out_dir or METRICS_DIR)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    with open(out_dir / f"{record['script']}.jsonl", 'a') as f:
+        f.write(json.dumps(record) + '\n')
+
+    prom_path = out_dir / f"{record['script']}.prom"
+    tmp_path = prom_path.with_suffix('.prom.tmp')
+    with open(tmp_path, 'w') as f:
+        f.write(prometheus_text(record))
+    os.replace(tmp_path, prom_path)
+
+
+class Profiler:
+    """
+    Opt-in cProfile / tracemalloc capture for one run
+
+    cProfile only sees the thread that enabled it (before Python 3.12), so
+    every thread started during the run enables a profile of its own and
+    the results are merged when the run ends.
+    """
+
+    def __init__(self, script, modes=None):
+        self.script = script
+        self.modes = PROFILE_MODES if modes is None else set(modes)
+        self.profiles = []
+        self._lock = threading.Lock()
+
+    def _profile_thread(self, frame, event, arg):
+        import cProfile
+        sys.setprofile(None)
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Python 3.12+ profiles every thread from the first profile
+            return
+        with self._lock:
+            self.profiles.append(profile)
+
+    def start(self):
+        if 'cpu' in self.modes:
+            # Imported on demand so runs without PGE_PROFILE start faster
+            import cProfile
+            profile = cProfile.Profile()
+            self.profiles.append(profile)
+            threading.setprofile(self._profile_thread)
+            profile.enable()
+        if 'memory' in self.modes:
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+
+    def stop(self, out_dir=None):
+        """Stop profiling and dump the results; returns the files written"""
+        if not self.modes:
+            return []
+        out_dir = Path(out_dir or METRICS_DIR) / 'profiles'
+        out_dir.mkdir(parents=True, exist_ok=True)
+        stem = f"{self.script}-{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')}"
+        written = []
+
+        if self.profiles:
+            import pstats
+            threading.setprofile(None)
+            self.profiles[0].disable()
+            with self._lock:
+                stats = pstats.Stats(*self.profiles)
+            stats.dump_stats(out_dir / f"{stem}.pstats")
+            summary = io.StringIO()
+            stats.stream = summary
+            stats.sort_stats('cumulative').print_stats(PROFILE_TOP_N)
+            (out_dir / f"{stem}-cpu.txt").write_text(summary.getvalue())
+            written += [out_dir / f"{stem}.pstats", out_dir / f"{stem}-cpu.txt"]
+
+        if tracemalloc.is_tracing():
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            lines = [f"Traced memory: current {current / 1e6:.1f} MB, peak {peak / 1e6:.1f} MB", '']
+            lines += [str(stat) for stat in snapshot.statistics('lineno')[:PROFILE_TOP_N]]
+            (out_dir / f"{stem}-memory.txt").write_text('\n'.join(lines) + '\n')
+            written.append(out_dir / f"{stem}-memory.txt")
+
+        logger.info(f"Profiles written to {', '.join(str(path) for path in written)}")
+        return written
+
+
+@contextmanager
+def instrument(script, out_dir=None):
+    """
+    Collect metrics (and profiles, if PGE_PROFILE is set) for a script run
+
+    The record is written when the block exits, also when it raises.
+    Writing metrics never fails the run.
+    """
+    metrics = RunMetrics(script)
+    profiler = Profiler(script)
+    profiler.start()
+    try:
+        yield metrics
+    except BaseException as e:
+        metrics.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        metrics.finish()
+        try:
+            profiler.stop(out_dir)
+            write_metrics(metrics.record(), out_dir)
+        except OSError as e:
+            logger.warning(f"Could not write run metrics: {e}")
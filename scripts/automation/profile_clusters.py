@@ -0,0 +1,386 @@
+#!/usr/bin/env python3
+"""
+Daily Load Profile Clustering
+
+Clusters days by their 24-hour load curve offline, so the app's Load Curve
+Clustering view looks results up instead of running kmeans on demand:
+1. Builds the day x 24 profile matrix once per meter from `meter_data`
+   (mean kWh per local hour, 0 for an hour without readings), plus '*'
+   for every meter summed per hour, the series the app shows when
+   PGE_METER_ID is unset
+2. Runs mini-batch k-means for every k from PGE_CLUSTER_MIN_K to
+   PGE_CLUSTER_MAX_K in parallel worker processes, keeping the best of
+   PGE_CLUSTER_N_INIT seeded starts per k
+3. Stores centroids, day assignments, inertia and silhouette per k in
+   `profile_clusters`, `profile_centroids` and `profile_assignments`,
+   keyed by the data version from the `profile_data_version` view
+4. Skips meters whose stored results match the current data version
+
+Clusters are numbered by daily total, smallest first, so labels stay
+stable from one run to the next. The app only uses results whose data
+version matches the database it reads; otherwise it clusters itself.
+
+Usage:
+    python scripts/automation/profile_clusters.py
+    python scripts/automation/profile_clusters.py --meter <usage point> --force
+"""
+
+import os
+import sys
+import logging
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import meter_store
+import pipeline_metrics
+
+logger = logging.getLogger(__name__)
+
+# Clustering parameters (override via environment)
+CLUSTER_MIN_K = int(os.getenv('PGE_CLUSTER_MIN_K', '2'))
+CLUSTER_MAX_K = int(os.getenv('PGE_CLUSTER_MAX_K', '7'))
+CLUSTER_N_INIT = int(os.getenv('PGE_CLUSTER_N_INIT', '10'))
+CLUSTER_BATCH_SIZE = int(os.getenv('PGE_CLUSTER_BATCH_SIZE', '256'))
+CLUSTER_MAX_ITER = int(os.getenv('PGE_CLUSTER_MAX_ITER', '100'))
+CLUSTER_JOBS = int(os.getenv('PGE_CLUSTER_JOBS', str(os.cpu_count() or 1)))
+SILHOUETTE_SAMPLE_DAYS = 2000  # Silhouette is O(days^2); larger histories are sampled
+CLUSTER_SEED = 123
+CONVERGENCE_TOL = 1e-4         # Center shift, relative to the profile variance
+ALL_METERS = '*'
+
+SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS profile_clusters (
+    meter_id TEXT NOT NULL,     -- '*' = every meter summed per hour
+    k INTEGER NOT NULL,
+    data_version TEXT NOT NULL,
+    days INTEGER NOT NULL,
+    inertia REAL NOT NULL,      -- Sum of squared distances to the centroids
+    silhouette REAL,
+    computed_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (meter_id, k)
+);
+CREATE TABLE IF NOT EXISTS profile_centroids (
+    meter_id TEXT NOT NULL,
+    k INTEGER NOT NULL,
+    cluster INTEGER NOT NULL,   -- 1..k, by daily total
+    hour INTEGER NOT NULL,
+    kwh REAL NOT NULL,
+    PRIMARY KEY (meter_id, k, cluster, hour)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS profile_assignments (
+    meter_id TEXT NOT NULL,
+    k INTEGER NOT NULL,
+    reading_date TEXT NOT NULL,
+    cluster INTEGER NOT NULL,
+    PRIMARY KEY (meter_id, k, reading_date)
+) WITHOUT ROWID;
+CREATE VIEW IF NOT EXISTS profile_data_version AS
+SELECT meter_id,
+       printf('%d:%d:%.6f:%.6f', COUNT(*), MAX(ts), TOTAL(value), TOTAL(value * hour)) AS data_version
+FROM meter_data GROUP BY meter_id
+UNION ALL
+SELECT '*', printf('%d:%d:%.6f:%.6f', COUNT(*), MAX(ts), TOTAL(value), TOTAL(value * hour))
+FROM meter_data;
+"""
+
+# Mean kWh per local day and hour of the hourly series (meters summed per ts)
+PROFILE_SQL = """
+SELECT day, hour, AVG(value) FROM (
+    SELECT substr(MIN(dttm_start), 1, 10) AS day, MIN(hour) AS hour, SUM(value) AS value
+    FROM meter_data {where}
+    GROUP BY ts
+)
+GROUP BY day, hour
+ORDER BY day, hour
+"""
+
+PROFILE_TABLES = ('profile_clusters', 'profile_centroids', 'profile_assignments')
+
+
+def load_profiles(conn, meter_id=ALL_METERS):
+    """
+    Build the day x 24 profile matrix of a meter
+
+    Returns:
+        (days, matrix): local dates ('YYYY-MM-DD') and a float array with
+        one row of 24 hourly kWh per day
+    """
+    if meter_id == ALL_METERS:
+        rows = conn.execute(PROFILE_SQL.format(where='')).fetchall()
+    else:
+        rows = conn.execute(PROFILE_SQL.format(where='WHERE meter_id = ?'), (meter_id,)).fetchall()
+    days = sorted({day for day, _, _ in rows})
+    index = {day: i for i, day in enumerate(days)}
+    matrix = np.zeros((len(days), 24))
+    for day, hour, value in rows:
+        matrix[index[day], hour] = value
+    return days, matrix
+
+
+def squared_distances(points, centers):
+    """Squared Euclidean distance of every point to every center"""
+    distances = (
+        (points ** 2).sum(axis=1)[:, None]
+        - 2 * points @ centers.T
+        + (centers ** 2).sum(axis=1)[None, :]
+    )
+    return np.maximum(distances, 0)
+
+
+def kmeans_plus_plus(points, k, rng):
+    """Pick k initial centers, each far from those already chosen"""
+    centers = np.empty((k, points.shape[1]))
+    centers[0] = points[rng.integers(len(points))]
+    closest = ((points - centers[0]) ** 2).sum(axis=1)
+    for i in range(1, k):
+        total = closest.sum()
+        chosen = rng.choice(len(points), p=closest / total) if total > 0 else rng.integers(len(points))
+        centers[i] = points[chosen]
+        closest = np.minimum(closest, ((points - centers[i]) ** 2).sum(axis=1))
+    return centers
+
+
+def mini_batch_kmeans(points, k, rng, batch_size=None, max_iter=None):
+    """
+    Mini-batch k-means (Sculley, 2010)
+
+    Each step moves the centers toward a random batch of days with a
+    per-center learning rate of 1 / days seen, and stops once the centers
+    barely move. Days are then assigned to their nearest center.
+
+    Returns:
+        (centers, labels, inertia)
+    """
+    batch_size = min(CLUSTER_BATCH_SIZE if batch_size is None else batch_size, len(points))
+    max_iter = CLUSTER_MAX_ITER if max_iter is None else max_iter
+    tolerance = CONVERGENCE_TOL * points.var(axis=0).sum()
+
+    centers = kmeans_plus_plus(points, k, rng)
+    seen = np.zeros(k)
+    for _ in range(max_iter):
+        batch = points[rng.choice(len(points), batch_size, replace=False)]
+        nearest = squared_distances(batch, centers).argmin(axis=1)
+        previous = centers.copy()
+        for cluster in np.unique(nearest):
+            members = batch[nearest == cluster]
+            seen[cluster] += len(members)
+            centers[cluster] += (members.sum(axis=0) - len(members) * centers[cluster]) / seen[cluster]
+        if ((centers - previous) ** 2).sum() <= tolerance:
+            break
+
+    distances = squared_distances(points, centers)
+    labels = distances.argmin(axis=1)
+    return centers, labels, float(distances[np.arange(len(points)), labels].sum())
+
+
+def silhouette_score(points, labels, k, rng, sample_size=SILHOUETTE_SAMPLE_DAYS):
+    """
+    Mean silhouette of the days (of a random sample of them, if many)
+
+    Returns:
+        Score in [-1, 1], or None if fewer than two clusters are populated
+    """
+    if len(points) > sample_size:
+        sample = rng.choice(len(points), sample_size, replace=False)
+        points, labels = points[sample], labels[sample]
+    sizes = np.bincount(labels, minlength=k)
+    if (sizes > 0).sum() < 2:
+        return None
+
+    distances = np.sqrt(squared_distances(points, points))
+    np.fill_diagonal(distances, 0)
+    totals = np.stack([distances[:, labels == cluster].sum(axis=1) for cluster in range(k)], axis=1)
+    rows = np.arange(len(points))
+    own_size = sizes[labels]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean_other = totals / sizes
+        mean_other[:, sizes == 0] = np.inf
+        mean_other[rows, labels] = np.inf
+        within = totals[rows, labels] / (own_size - 1)
+        nearest = mean_other.min(axis=1)
+        scores = (nearest - within) / np.maximum(within, nearest)
+    scores[own_size == 1] = 0.0
+    return float(np.nan_to_num(scores).mean())
+
+
+def fit_k(points, k, n_init=None, seed=CLUSTER_SEED):
+    """
+    Cluster the profiles into k groups, keeping the best of n_init starts
+
+    Runs in a worker process; seeded by k, so results are reproducible.
+
+    Returns:
+        Dict with 'k', 'centers' (k x 24), 'labels' (1..k per day, by
+        daily total), 'inertia' and 'silhouette'
+    """
+    n_init = CLUSTER_N_INIT if n_init is None else n_init
+    rng = np.random.default_rng([seed, k])
+    best = None
+    for _ in range(max(1, n_init)):
+        fit = mini_batch_kmeans(points, k, rng)
+        if best is None or fit[2] < best[2]:
+            best = fit
+    centers, labels, inertia = best
+
+    order = np.argsort(centers.sum(axis=1), kind='stable')
+    rank = np.empty(k, dtype=int)
+    rank[order] = np.arange(k)
+    return {
+        'k': k,
+        'centers': centers[order],
+        'labels': rank[labels] + 1,
+        'inertia': inertia,
+        'silhouette': silhouette_score(points, labels, k, rng),
+    }
+
+
+def ensure_schema(conn):
+    conn.executescript(SCHEMA_SQL)
+
+
+def data_versions(conn):
+    """Return {meter_id: data version} for every meter and '*'"""
+    return dict(conn.execute("SELECT meter_id, data_version FROM profile_data_version"))
+
+
+def stored_version(conn, meter_id, ks):
+    """Return the data version every k in ks was computed from, or None"""
+    rows = conn.execute(
+        "SELECT data_version, COUNT(*) FROM profile_clusters WHERE meter_id = ? "
+        f"AND k IN ({','.join('?' * len(ks))}) GROUP BY data_version",
+        (meter_id, *ks),
+    ).fetchall()
+    if len(rows) == 1 and rows[0][1] == len(ks):
+        return rows[0][0]
+    return None
+
+
+def cluster_profiles(points, ks, pool=None):
+    """Fit every k, in the worker pool if one is given"""
+    if pool is None:
+        return [fit_k(points, k) for k in ks]
+    return list(pool.map(fit_k, [points] * len(ks), ks))
+
+
+def save_results(conn, meter_id, version, days, results):
+    """Replace the stored clustering of a meter in one transaction"""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for table in PROFILE_TABLES:
+            conn.execute(f"DELETE FROM {table} WHERE meter_id = ?", (meter_id,))
+        for result in results:
+            k = result['k']
+            conn.execute(
+                "INSERT INTO profile_clusters (meter_id, k, data_version, days, inertia, silhouette) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (meter_id, k, version, len(days), result['inertia'], result['silhouette']),
+            )
+            conn.executemany(
+                "INSERT INTO profile_centroids (meter_id, k, cluster, hour, kwh) VALUES (?, ?, ?, ?, ?)",
+                ((meter_id, k, cluster + 1, hour, float(kwh))
+                 for cluster, center in enumerate(result['centers'])
+                 for hour, kwh in enumerate(center)),
+            )
+            conn.executemany(
+                "INSERT INTO profile_assignments (meter_id, k, reading_date, cluster) VALUES (?, ?, ?, ?)",
+                ((meter_id, k, day, int(cluster)) for day, cluster in zip(days, result['labels'])),
+            )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def update_clusters(conn, meters=None, min_k=None, max_k=None, jobs=None, force=False, metrics=None):
+    """
+    Recompute the clustering of every meter whose data changed
+
+    Args:
+        conn: Meter database connection (see meter_store.connect())
+        meters: Meter ids to cluster (default: every meter and '*')
+        min_k, max_k: Range of cluster counts (default: PGE_CLUSTER_MIN_K..MAX_K)
+        jobs: Worker processes (default: PGE_CLUSTER_JOBS)
+        force: Recompute even if the stored data version matches
+        metrics: Optional pipeline_metrics.RunMetrics
+
+    Returns:
+        Dict of meter_id -> 'clustered', 'current' or 'too few days'
+    """
+    min_k = CLUSTER_MIN_K if min_k is None else min_k
+    max_k = CLUSTER_MAX_K if max_k is None else max_k
+    jobs = CLUSTER_JOBS if jobs is None else jobs
+    metrics = metrics or pipeline_metrics.RunMetrics('profile_clusters')
+
+    ensure_schema(conn)
+    versions = data_versions(conn)
+    if meters is None:
+        meters = [ALL_METERS] + meter_store.list_meters(conn)
+
+    outcome = {}
+    pool = ProcessPoolExecutor(max_workers=jobs) if jobs > 1 else None
+    try:
+        for meter_id in meters:
+            version = versions.get(meter_id)
+            if version is None:
+                logger.warning(f"No readings for meter {meter_id} - skipped")
+                continue
+            if not force and stored_version(conn, meter_id, range(min_k, max_k + 1)) == version:
+                logger.info(f"Meter {meter_id}: clusters are current ({version})")
+                outcome[meter_id] = 'current'
+                continue
+
+            with metrics.stage('profiles') as stage:
+                days, points = load_profiles(conn, meter_id)
+                stage['items'] += len(days)
+            ks = [k for k in range(min_k, max_k + 1) if k <= len(days)]
+            if not ks:
+                logger.warning(f"Meter {meter_id}: {len(days)} day(s) is too few to cluster")
+                outcome[meter_id] = 'too few days'
+                continue
+
+            with metrics.stage('cluster') as stage:
+                results = cluster_profiles(points, ks, pool)
+                stage['items'] += len(ks)
+            with metrics.stage('write'):
+                save_results(conn, meter_id, version, days, results)
+
+            for result in results:
+                silhouette = 'n/a' if result['silhouette'] is None else f"{result['silhouette']:.3f}"
+                logger.info(f"Meter {meter_id}: k={result['k']} inertia={result['inertia']:.1f} "
+                            f"silhouette={silhouette}")
+            metrics.incr('meters_clustered')
+            outcome[meter_id] = 'clustered'
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    return outcome
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cluster daily load profiles for the pattern tab")
+    parser.add_argument('--db', help="Meter database (default: data/pge_meter_data.sqlite)")
+    parser.add_argument('--meter', action='append',
+                        help="Meter to cluster ('*' = all meters summed); repeatable (default: all)")
+    parser.add_argument('--min-k', type=int, default=CLUSTER_MIN_K)
+    parser.add_argument('--max-k', type=int, default=CLUSTER_MAX_K)
+    parser.add_argument('--jobs', type=int, default=CLUSTER_JOBS,
+                        help=f"Worker processes (default: {CLUSTER_JOBS})")
+    parser.add_argument('--force', action='store_true', help="Recompute even if the data is unchanged")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    with pipeline_metrics.instrument('profile_clusters') as metrics:
+        conn = meter_store.connect(args.db)
+        try:
+            update_clusters(conn, args.meter, args.min_k, args.max_k, args.jobs, args.force, metrics)
+        finally:
+            meter_store.close(conn)
+        metrics.exit_code = 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
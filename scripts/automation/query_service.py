@@ -0,0 +1,439 @@
+#!/usr/bin/env python3
+"""
+Meter Data Query Service
+
+A small read-only HTTP/JSON API over data/pge_meter_data.sqlite, so
+clients fetch only what they render instead of the whole meter_data table:
+1. GET /readings - the hourly series over a range (summed across meters
+   unless ?meter= is given), with ?columns= selection
+2. GET /usage - aggregates per ?granularity= bucket (interval, hour, day or
+   month) for ?stats= (sum, mean, min, max, count and quantiles such as
+   p50 or p95), computed in SQLite; sums, and for a single meter the other
+   rollup stats, are read from the coarsest level of the resolution
+   pyramid that covers the range (see meter_store.query_usage())
+3. GET /meters and GET /health
+4. Every response carries an ETag built from the database's data version
+   (the counter meter_store bumps with each write) and the request; a
+   matching If-None-Match is answered 304 Not Modified without running the
+   query
+
+Ranges are ?start= and ?end= (end exclusive) as 'YYYY-MM-DD' or
+'YYYY-MM-DD HH:MM:SS' in PGE_TIMEZONE, or as epoch seconds; they default to
+the whole months the data covers. Responses are
+{"version": ..., "columns": [...], "rows": [[...], ...]}.
+
+Usage:
+    python scripts/automation/query_service.py --port 8765
+    curl 'http://127.0.0.1:8765/usage?start=2026-01-01&end=2026-02-01&granularity=day&stats=sum,p95'
+    curl 'http://127.0.0.1:8765/readings?start=2026-01-01&columns=ts,value'
+"""
+
+import os
+import re
+import sys
+import gzip
+import json
+import sqlite3
+import hashlib
+import logging
+import argparse
+import itertools
+import threading
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs, urlencode
+
+import meter_store
+
+logger = logging.getLogger(__name__)
+
+# Where the service listens (override via environment)
+QUERY_HOST = os.getenv('PGE_QUERY_HOST', '127.0.0.1')
+QUERY_PORT = int(os.getenv('PGE_QUERY_PORT', '8765'))
+GZIP_MIN_BYTES = 1024  # Smaller responses are sent uncompressed
+
+# /readings columns: the hourly series, one row per hour
+READING_COLUMNS = {
+    'ts': 'ts',
+    'dttm_start': 'MIN(dttm_start)',
+    'hour': 'MIN(hour)',
+    'value': 'SUM(value)',
+    'day': 'MIN(day)',
+    'day2': 'MIN(day2)',
+}
+
+# /usage stats SQLite computes directly; quantiles are named p<percent>
+SQL_STATS = {
+    'sum': 'SUM(value)',
+    'mean': 'AVG(value)',
+    'min': 'MIN(value)',
+    'max': 'MAX(value)',
+    'count': 'COUNT(*)',
+}
+QUANTILE_PATTERN = re.compile(r'p(\d{1,2}(?:\.\d+)?|100)')
+
+# The same stats read from daily_usage / monthly_usage rows
+ROLLUP_STATS = {
+    'sum': 'SUM(total_kwh)',
+    'mean': 'SUM(total_kwh) / SUM(records)',
+    'min': 'MIN(min_kwh)',
+    'max': 'MAX(max_kwh)',
+    'count': 'SUM(records)',
+}
+
+
+class QueryError(ValueError):
+    """A request the service cannot answer (reported as HTTP 400)"""
+
+
+def open_database(db_path):
+    """Open the database read-only"""
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True,
+                           timeout=meter_store.SQLITE_BUSY_TIMEOUT_MS / 1000.0)
+    conn.execute(f"PRAGMA busy_timeout = {meter_store.SQLITE_BUSY_TIMEOUT_MS}")
+    return conn
+
+
+def single(params, name, default=None):
+    values = params.get(name)
+    return values[-1] if values else default
+
+
+def parse_time(text):
+    """Epoch seconds from a query parameter (epoch or PGE_TIMEZONE wall clock)"""
+    if re.fullmatch(r'-?\d+', text):
+        return int(text)
+    try:
+        return meter_store.local_to_epoch([text])[0]
+    except ValueError:
+        raise QueryError(f"Invalid time {text!r}; use YYYY-MM-DD, 'YYYY-MM-DD HH:MM:SS' or epoch seconds")
+
+
+def month_start(text):
+    return date.fromisoformat(f"{text[:7]}-01")
+
+
+def parse_range(conn, params):
+    """
+    Resolve ?start= and ?end= to a [start, end) epoch range
+
+    Missing bounds default to the start of the first month with data and
+    the start of the month after the last one, so default ranges line up
+    with every pyramid level.
+    """
+    start, end = single(params, 'start'), single(params, 'end')
+    if start is None or end is None:
+        first, last = conn.execute("SELECT MIN(ts), MAX(ts) FROM meter_data").fetchone()
+        if first is None:
+            first = last = 0
+        (first_local, _), (last_local, _) = meter_store.epoch_to_local([first, last])
+        month_after = (month_start(last_local) + timedelta(days=32)).replace(day=1)
+        defaults = meter_store.local_to_epoch([month_start(first_local).isoformat(), month_after.isoformat()])
+    start = parse_time(start) if start is not None else defaults[0]
+    end = parse_time(end) if end is not None else defaults[1]
+    if end <= start:
+        raise QueryError("end must be after start")
+    return start, end
+
+
+def parse_list(params, name, default, allowed=None):
+    """Comma-separated parameter values, checked against `allowed`"""
+    values = [value.strip() for value in ','.join(params.get(name, [])).split(',') if value.strip()]
+    values = values or list(default)
+    if allowed is not None:
+        unknown = [value for value in values if value not in allowed]
+        if unknown:
+            raise QueryError(f"Unknown {name}: {', '.join(unknown)}; expected {', '.join(allowed)}")
+    return values
+
+
+def meter_filter(params):
+    meter_id = single(params, 'meter')
+    return (meter_id, "AND meter_id = ?", [meter_id]) if meter_id else (None, "", [])
+
+
+def quantile(sorted_values, percent):
+    """Linearly interpolated quantile of sorted values (R's default, type 7)"""
+    position = (len(sorted_values) - 1) * percent / 100
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def query_readings(conn, params):
+    """GET /readings: the hourly series, one row per hour"""
+    start, end = parse_range(conn, params)
+    columns = parse_list(params, 'columns', READING_COLUMNS, READING_COLUMNS)
+    _, meter_sql, meter_args = meter_filter(params)
+    rows = conn.execute(f"""
+        SELECT {', '.join(READING_COLUMNS[column] for column in columns)}
+        FROM meter_data WHERE ts >= ? AND ts < ? {meter_sql}
+        GROUP BY ts ORDER BY ts
+    """, [start, end] + meter_args).fetchall()
+    return {'columns': columns, 'rows': rows}
+
+
+def query_stats(params):
+    """Validate ?stats=; returns the list of stat names"""
+    stats = parse_list(params, 'stats', ['sum'])
+    for stat in stats:
+        if stat not in SQL_STATS and not QUANTILE_PATTERN.fullmatch(stat):
+            raise QueryError(f"Unknown stat {stat!r}; expected {', '.join(SQL_STATS)} or p0-p100")
+    return stats
+
+
+def usage_from_rollups(conn, level, granularity, stats, meter_id, start, end):
+    """Per-bucket stats of one meter from daily_usage / monthly_usage"""
+    first, last = (text[:10] for text, _ in meter_store.epoch_to_local([start, end]))
+    aggregates = ', '.join(ROLLUP_STATS[stat] for stat in stats)
+    if level == 'month':
+        sql = f"""
+            SELECT month, {aggregates} FROM monthly_usage
+            WHERE meter_id = ? AND month >= ? AND month < ?
+            GROUP BY month ORDER BY month
+        """
+        return conn.execute(sql, (meter_id, first[:7], last[:7])).fetchall()
+    label_length = 10 if granularity == 'day' else 7
+    sql = f"""
+        SELECT substr(reading_date, 1, {label_length}) AS bucket, {aggregates} FROM daily_usage
+        WHERE meter_id = ? AND reading_date >= ? AND reading_date < ?
+        GROUP BY bucket ORDER BY bucket
+    """
+    return conn.execute(sql, (meter_id, first, last)).fetchall()
+
+
+def usage_from_readings(conn, granularity, stats, meter_sql, meter_args, start, end):
+    """Per-bucket stats of the hourly series (summed across meters) from meter_data"""
+    series = f"""
+        SELECT ts, MIN(dttm_start) AS dttm_start, SUM(value) AS value FROM meter_data
+        WHERE ts >= ? AND ts < ? {meter_sql} GROUP BY ts
+    """
+    # Hours are keyed by ts so the hour repeated when DST ends stays two buckets
+    key = 'ts' if granularity == 'hour' else f"substr(dttm_start, 1, {10 if granularity == 'day' else 7})"
+    args = [start, end] + meter_args
+
+    if all(stat in SQL_STATS for stat in stats):
+        aggregates = ', '.join(SQL_STATS[stat] for stat in stats)
+        return conn.execute(f"""
+            SELECT MIN({key if granularity != 'hour' else 'dttm_start'}), {aggregates}
+            FROM ({series}) GROUP BY {key} ORDER BY MIN(ts)
+        """, args).fetchall()
+
+    # Quantiles need every value of a bucket; buckets are contiguous in time
+    readings = conn.execute(f"SELECT {key}, dttm_start, value FROM ({series}) ORDER BY ts", args)
+    rows = []
+    for _, bucket in itertools.groupby(readings, key=lambda reading: reading[0]):
+        bucket = list(bucket)
+        values = sorted(reading[2] for reading in bucket)
+        label = bucket[0][1] if granularity == 'hour' else bucket[0][0]
+        row = [label]
+        for stat in stats:
+            if stat == 'sum':
+                row.append(sum(values))
+            elif stat == 'mean':
+                row.append(sum(values) / len(values))
+            elif stat == 'min':
+                row.append(values[0])
+            elif stat == 'max':
+                row.append(values[-1])
+            elif stat == 'count':
+                row.append(len(values))
+            else:
+                row.append(quantile(values, float(stat[1:])))
+        rows.append(row)
+    return rows
+
+
+def query_usage(conn, params):
+    """
+    GET /usage: stats per bucket over the hourly series
+
+    Sums come from meter_store.query_usage() (any granularity, every
+    level). Other rollup stats for a single meter over whole days or
+    months come from daily_usage / monthly_usage; everything else,
+    including quantiles, is aggregated from meter_data.
+    """
+    start, end = parse_range(conn, params)
+    granularity = single(params, 'granularity', 'day')
+    if granularity not in meter_store.LEVELS:
+        raise QueryError(f"Unknown granularity {granularity!r}; expected {', '.join(meter_store.LEVELS)}")
+    stats = query_stats(params)
+    columns = ['bucket'] + stats
+    selected = parse_list(params, 'columns', columns, columns)
+    meter_id, meter_sql, meter_args = meter_filter(params)
+
+    if stats == ['sum']:
+        result = meter_store.query_usage(conn, start, end, granularity, meter_id)
+        level, rows = result['level'], result['rows']
+    elif granularity == 'interval':
+        raise QueryError("granularity=interval supports stats=sum only")
+    else:
+        level = meter_store.select_level(start, end, granularity)
+        # Rollups hold one row per meter and day; several meters cannot be
+        # combined into min/max/mean of their summed series
+        meters = [row[0] for row in conn.execute("SELECT meter_id FROM daily_usage GROUP BY meter_id")]
+        if meter_id is None:
+            rollup_meter = meters[0] if len(meters) == 1 else None
+        else:
+            rollup_meter = meter_id if meter_id in meters else None
+        if level in ('day', 'month') and rollup_meter is not None and all(stat in ROLLUP_STATS for stat in stats):
+            rows = usage_from_rollups(conn, level, granularity, stats, rollup_meter, start, end)
+        else:
+            level = 'hour'
+            rows = usage_from_readings(conn, granularity, stats, meter_sql, meter_args, start, end)
+
+    indexes = [columns.index(column) for column in selected]
+    return {'level': level, 'granularity': granularity, 'columns': selected,
+            'rows': [[row[index] for index in indexes] for row in rows]}
+
+
+def query_meters(conn, params):
+    """GET /meters: every meter with its first and last day and reading count"""
+    rows = conn.execute("""
+        SELECT meter_id, MIN(reading_date), MAX(reading_date), SUM(records)
+        FROM daily_usage GROUP BY meter_id ORDER BY meter_id
+    """).fetchall()
+    if not rows:
+        # A database whose rollups were never built (e.g. restored from a copy)
+        rows = conn.execute("""
+            SELECT meter_id, substr(MIN(dttm_start), 1, 10), substr(MAX(dttm_start), 1, 10), COUNT(*)
+            FROM meter_data GROUP BY meter_id ORDER BY meter_id
+        """).fetchall()
+    return {'columns': ['meter_id', 'first_day', 'last_day', 'readings'], 'rows': rows}
+
+
+def query_health(conn, params):
+    """GET /health"""
+    return {'status': 'ok'}
+
+
+ROUTES = {
+    '/readings': query_readings,
+    '/usage': query_usage,
+    '/meters': query_meters,
+    '/health': query_health,
+}
+
+
+def etag_for(version, path, params):
+    """Strong ETag of one representation: data version plus the canonical request"""
+    canonical = urlencode(sorted((name, value) for name, values in params.items() for value in values))
+    return '"' + hashlib.sha1(f"{version}|{path}|{canonical}".encode('utf-8')).hexdigest()[:20] + '"'
+
+
+def etag_matches(header, etag):
+    """True if an If-None-Match header lists `etag` (weak comparison, as for GET)"""
+    if not header:
+        return False
+    candidates = [candidate.strip() for candidate in header.split(',')]
+    return '*' in candidates or etag in (candidate.removeprefix('W/') for candidate in candidates)
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    """Routes GET requests to the query functions"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        logger.debug(f"{self.address_string()} {format % args}")
+
+    def reply(self, status, payload=None, headers=None):
+        body = json.dumps(payload, separators=(',', ':')).encode('utf-8') if payload is not None else b''
+        headers = dict(headers or {})
+        if len(body) >= GZIP_MIN_BYTES and 'gzip' in self.headers.get('Accept-Encoding', ''):
+            body = gzip.compress(body, compresslevel=5)
+            headers['Content-Encoding'] = 'gzip'
+        self.send_response(status)
+        if payload is not None:
+            self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Vary', 'Accept-Encoding')
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        route = ROUTES.get(url.path.rstrip('/') or '/health')
+        if route is None:
+            self.reply(404, {'error': f"Unknown path {url.path}; try {', '.join(ROUTES)}"})
+            return
+
+        db_path = self.server.db_path
+        if not os.path.exists(db_path):
+            self.reply(503, {'error': f"Database not found: {db_path}"})
+            return
+
+        params = parse_qs(url.query)
+        try:
+            conn = open_database(db_path)
+            try:
+                # The counter and the query read one snapshot of the data
+                conn.execute("BEGIN")
+                try:
+                    version = meter_store.get_data_version(conn)
+                except sqlite3.OperationalError:
+                    self.reply(503, {'error': f"{db_path} needs migrating: "
+                                              "python scripts/automation/meter_store.py"})
+                    return
+                etag = etag_for(version, url.path, params)
+                cache_headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+                if etag_matches(self.headers.get('If-None-Match'), etag):
+                    self.reply(304, headers=cache_headers)
+                    return
+                result = route(conn, params)
+            finally:
+                conn.close()
+        except QueryError as e:
+            self.reply(400, {'error': str(e)})
+            return
+        except sqlite3.Error as e:
+            logger.error(f"Query {self.path} failed: {e}")
+            self.reply(500, {'error': f"Database error: {e}"})
+            return
+
+        self.reply(200, {'version': version, **result}, headers=cache_headers)
+
+
+def make_server(db_path=None, host=QUERY_HOST, port=QUERY_PORT):
+    server = ThreadingHTTPServer((host, port), QueryHandler)
+    server.daemon_threads = True
+    server.db_path = str(db_path or meter_store.DB_FILE)
+    return server
+
+
+def start_server(db_path=None, host=QUERY_HOST, port=QUERY_PORT):
+    """
+    Start the service in a background thread
+
+    Returns:
+        (server, base_url); stop it with server.shutdown()
+    """
+    server = make_server(db_path, host, port)
+    threading.Thread(target=server.serve_forever, name='query-service', daemon=True).start()
+    return server, f"http://{host}:{server.server_port}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve read-only JSON queries over the meter database")
+    parser.add_argument('--db', default=str(meter_store.DB_FILE), help="SQLite database to serve")
+    parser.add_argument('--host', default=QUERY_HOST, help=f"Interface to listen on (default: {QUERY_HOST})")
+    parser.add_argument('--port', type=int, default=QUERY_PORT, help=f"Port (default: {QUERY_PORT})")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    server = make_server(args.db, args.host, args.port)
+    logger.info(f"Serving {args.db} read-only on http://{args.host}:{server.server_port} "
+                f"({', '.join(ROUTES)})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
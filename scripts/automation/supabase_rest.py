@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Supabase REST Helpers
+
+Shared helpers for the pge_data table behind Supabase's PostgREST API.
+Used by fetch_and_parse_pge.py and mark_processed.py.
+"""
+
+import os
+import time
+import logging
+from pathlib import Path
+
+import requests
+
+from pge_fetch import create_session, backoff_delay, parse_retry_after, RETRYABLE_STATUS_CODES
+
+logger = logging.getLogger(__name__)
+
+# Bulk acknowledgement tuning (override via environment)
+SUPABASE_MARK_CHUNK_SIZE = int(os.getenv('SUPABASE_MARK_CHUNK_SIZE', '200'))
+SUPABASE_MARK_MAX_RETRIES = int(os.getenv('SUPABASE_MARK_MAX_RETRIES', '3'))
+
+# Row ids handed from fetch_and_parse_pge.py to mark_processed.py
+PROCESSED_IDS_FILE = Path(os.getenv(
+    'PGE_PROCESSED_IDS_FILE',
+    Path(__file__).parent.parent.parent / 'data' / 'processed_row_ids.json'
+))
+
+
+def supabase_headers(key):
+    """Build PostgREST headers for the service role key"""
+    return {
+        "apikey": key,
+        "Authorization": f"Bearer {key}",
+        "Content-Type": "application/json"
+    }
+
+
+def chunked(items, size):
+    """Split a list into consecutive chunks of at most `size` items"""
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def mark_rows_processed(url, key, row_ids, chunk_size=SUPABASE_MARK_CHUNK_SIZE,
+                        max_retries=SUPABASE_MARK_MAX_RETRIES, on_chunk_done=None, stats=None):
+    """
+    Mark Supabase rows as processed in bulk
+
+    Sends one PATCH per chunk with an `id=in.(...)` filter over a pooled
+    session. A chunk that fails is retried with backoff on its own; chunks
+    that already succeeded are never resent.
+
+    Args:
+        row_ids: Row ids to mark
+        chunk_size: Ids per PATCH request
+        max_retries: Retries per chunk
+        on_chunk_done: Optional callback receiving each chunk's ids after it
+            succeeds (used to persist partial progress)
+        stats: Optional dict whose 'requests' and 'retries' counts are
+            incremented
+
+    Returns:
+        List of row ids that could not be marked
+    """
+    failed_ids = []
+    requests_sent = 0
+    retries = 0
+    headers = supabase_headers(key)
+    headers["Prefer"] = "return=minimal"
+
+    with create_session() as session:
+        for chunk in chunked(list(row_ids), max(1, chunk_size)):
+            id_filter = ",".join(str(row_id) for row_id in chunk)
+
+            for attempt in range(max_retries + 1):
+                retry_after = None
+                retryable = True
+                requests_sent += 1
+                try:
+                    response = session.patch(
+                        f"{url}/rest/v1/pge_data",
+                        headers=headers,
+                        params={"id": f"in.({id_filter})"},
+                        json={"processed": True}
+                    )
+                    if response.ok:
+                        logger.info(f"Marked {len(chunk)} rows as processed "
+                                    f"({chunk[0]}..{chunk[-1]})")
+                        if on_chunk_done:
+                            on_chunk_done(chunk)
+                        break
+                    error = f"HTTP {response.status_code}: {response.text[:200]}"
+                    retryable = response.status_code in RETRYABLE_STATUS_CODES
+                    retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                except requests.RequestException as e:
+                    error = str(e)
+
+                if not retryable or attempt >= max_retries:
+                    logger.error(f"Failed to mark {len(chunk)} rows ({chunk[0]}..{chunk[-1]}): {error}")
+                    failed_ids.extend(chunk)
+                    break
+
+                retries += 1
+                delay = backoff_delay(attempt, retry_after)
+                logger.warning(f"Retrying chunk {chunk[0]}..{chunk[-1]} in {delay:.1f}s ({error})")
+                time.sleep(delay)
+
+    if stats is not None:
+        stats['requests'] = stats.get('requests', 0) + requests_sent
+        stats['retries'] = stats.get('retries', 0) + retries
+    return failed_ids
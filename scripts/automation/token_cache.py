@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+PG&E Access Token Cache
+
+Reuses the PG&E SMD OAuth access token across runs until it expires:
+1. The token and its expiry are kept in PGE_TOKEN_CACHE_FILE, written
+   atomically with owner-only (0600) permissions; a cache file readable
+   by anyone else is ignored
+2. Entries are keyed by a hash of the client id and token URI, so
+   switching credentials never reuses another client's token
+3. Reads and refreshes hold an exclusive lock on a sidecar .lock file
+   (fcntl, where available), so concurrent runs refresh the token once
+
+Used by fetch_and_parse_pge.py and pge_fetch.EspiFetcher.
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Cache location and switch (override via environment)
+TOKEN_CACHE_FILE = Path(os.getenv(
+    'PGE_TOKEN_CACHE_FILE',
+    Path(__file__).parent.parent.parent / 'data' / 'cache' / 'pge_token.json'
+))
+TOKEN_CACHE_ENABLED = os.getenv('PGE_TOKEN_CACHE_DISABLED', '').lower() not in ('true', '1', 'yes')
+TOKEN_EXPIRY_MARGIN_SECONDS = 60  # Treat tokens this close to expiry as expired
+
+
+def credentials_key(pge_api):
+    """Identify the client a token belongs to without storing its id"""
+    identity = f"{getattr(pge_api, 'client_id', '')}|{getattr(pge_api, 'token_uri', '')}"
+    return hashlib.sha256(identity.encode('utf-8')).hexdigest()[:32]
+
+
+class TokenCache:
+    """Owner-only JSON file holding one access token and its expiry"""
+
+    def __init__(self, path=None):
+        self.path = Path(path or TOKEN_CACHE_FILE)
+
+    @contextmanager
+    def locked(self):
+        """Hold an exclusive lock on the cache for the duration of the block"""
+        self.path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+        fd = os.open(f"{self.path}.lock", os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+    def load(self, key):
+        """
+        Read the cached token for `key`
+
+        Returns:
+            (access_token, expires_at epoch) or None if missing, unsafe,
+            for other credentials or about to expire
+        """
+        try:
+            if os.name == 'posix' and self.path.stat().st_mode & 0o077:
+                logger.warning(f"Ignoring token cache {self.path}: readable by other users")
+                return None
+            with open(self.path) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry.get('key') != key or entry.get('expires_at', 0) - TOKEN_EXPIRY_MARGIN_SECONDS <= time.time():
+            return None
+        return entry['access_token'], entry['expires_at']
+
+    def save(self, key, access_token, expires_at):
+        """Write the token atomically with 0600 permissions"""
+        tmp_path = self.path.with_suffix('.tmp')
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            json.dump({'key': key, 'access_token': access_token, 'expires_at': expires_at}, f)
+        os.replace(tmp_path, self.path)
+
+    def refresh(self, pge_api, force=False):
+        """
+        Give pge_api a valid access token, from the cache if possible
+
+        Args:
+            pge_api: SelfAccessApi (access_token, access_token_exp, get_token())
+            force: Request a new token even if the cached one looks valid
+                (e.g. after the API rejected it)
+        """
+        key = credentials_key(pge_api)
+        with self.locked():
+            cached = None if force else self.load(key)
+            if cached:
+                pge_api.access_token, pge_api.access_token_exp = cached
+                logger.info("Reusing cached PGE access token")
+                return
+            pge_api.get_token()
+            try:
+                self.save(key, pge_api.access_token, pge_api.access_token_exp)
+            except OSError as e:
+                logger.warning(f"Could not cache PGE access token: {e}")
+
+
+def get_token_cache():
+    """Return the token cache, or None if disabled via PGE_TOKEN_CACHE_DISABLED"""
+    return TokenCache() if TOKEN_CACHE_ENABLED else None
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Synthetic ESPI Generator
+
+Builds realistic PGE Share My Data payloads for benchmarks:
+1. ESPI Atom feeds with one UsagePoint per meter and one IntervalBlock per
+   local (America/Los_Angeles) day, so DST days carry 23 or 25 hours
+2. 15- or 60-minute IntervalReadings in Wh following a daily load shape
+   with seeded noise
+3. BatchList notifications listing resource URIs, as posted to Supabase
+
+Usage:
+    python scripts/bench/espi_generator.py --years 1 --interval 15 --meters 2 --out /tmp/espi
+"""
+
+import math
+import random
+import argparse
+from datetime import date, datetime, time, timedelta
+from pathlib import Path
+from zoneinfo import ZoneInfo
+
+LOCAL_TZ = ZoneInfo('America/Los_Angeles')
+DEFAULT_START = date(2024, 1, 1)
+DEFAULT_BASE_URI = 'https://api.pge.com/GreenButtonConnect/espi/1_1/resource/Batch/Bulk/50098'
+
+FEED_HEADER = ('<?xml version="1.0" encoding="UTF-8"?>\n'
+               '<feed xmlns="http://www.w3.org/2005/Atom" xmlns:espi="http://naesb.org/espi">\n'
+               '<id>urn:uuid:{feed_id}</id><title>Green Button Usage Feed</title>\n')
+BLOCK_ENTRY = ('<entry><id>urn:uuid:{entry_id}</id>'
+               '<link rel="self" href="{base}/Subscription/1/UsagePoint/{meter}/MeterReading/1/IntervalBlock/{block}"/>'
+               '<content><espi:IntervalBlock>'
+               '<espi:interval><espi:duration>{duration}</espi:duration><espi:start>{start}</espi:start></espi:interval>')
+READING = ('<espi:IntervalReading><espi:timePeriod><espi:duration>{duration}</espi:duration>'
+           '<espi:start>{start}</espi:start></espi:timePeriod><espi:value>{value}</espi:value></espi:IntervalReading>')
+BLOCK_FOOTER = '</espi:IntervalBlock></content></entry>\n'
+
+
+def local_days(start_date, years, days=None):
+    """
+    Yield (day, epoch at local midnight, epoch at next local midnight)
+
+    Covers `days` days if given, otherwise `years` years.
+    """
+    day = start_date
+    if days is not None:
+        end_date = start_date + timedelta(days=days)
+    else:
+        end_date = start_date.replace(year=start_date.year + years)
+    while day < end_date:
+        next_day = day + timedelta(days=1)
+        yield (day,
+               int(datetime.combine(day, time(), LOCAL_TZ).timestamp()),
+               int(datetime.combine(next_day, time(), LOCAL_TZ).timestamp()))
+        day = next_day
+
+
+def load_wh(epoch, interval_seconds, meter, rng):
+    """Household load in Wh for one interval: base + evening peak + seasonal + noise"""
+    local = datetime.fromtimestamp(epoch, LOCAL_TZ)
+    hour = local.hour + local.minute / 60
+    evening = math.exp(-((hour - 19) ** 2) / 6)
+    morning = 0.5 * math.exp(-((hour - 8) ** 2) / 3)
+    seasonal = 1 + 0.3 * math.cos(2 * math.pi * (local.timetuple().tm_yday - 200) / 365)
+    kw = (0.15 + 0.1 * meter) + seasonal * (0.9 * evening + morning) + rng.uniform(0, 0.2)
+    return int(kw * 1000 * interval_seconds / 3600)
+
+
+def generate_espi_feed(start_date=DEFAULT_START, years=1, interval_minutes=60, meters=1, seed=0, days=None):
+    """
+    Build one ESPI feed covering every meter
+
+    `days`, if given, replaces `years` as the length of the feed.
+
+    Returns:
+        (xml string, number of IntervalReadings)
+    """
+    rng = random.Random(seed)
+    step = interval_minutes * 60
+    parts = [FEED_HEADER.format(feed_id=f"feed-{seed}")]
+    readings = 0
+
+    for meter in range(1, meters + 1):
+        for block, (day, day_start, day_end) in enumerate(local_days(start_date, years, days), start=1):
+            parts.append(BLOCK_ENTRY.format(entry_id=f"{meter}-{block}", base=DEFAULT_BASE_URI,
+                                            meter=meter, block=block,
+                                            duration=day_end - day_start, start=day_start))
+            for start in range(day_start, day_end, step):
+                parts.append(READING.format(duration=step, start=start,
+                                            value=load_wh(start, step, meter, rng)))
+                readings += 1
+            parts.append(BLOCK_FOOTER)
+
+    parts.append('</feed>\n')
+    return ''.join(parts), readings
+
+
+def generate_batch_list(uri_count, base_uri=DEFAULT_BASE_URI, start_id=1):
+    """Build a BatchList notification listing `uri_count` resource URIs"""
+    resources = ''.join(
+        f'<ns0:resources>{base_uri}?correlationID={start_id + i:09d}</ns0:resources>'
+        for i in range(uri_count)
+    )
+    return ('<?xml version="1.0" encoding="UTF-8"?>'
+            f'<ns0:BatchList xmlns:ns0="http://naesb.org/espi">{resources}</ns0:BatchList>')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate synthetic ESPI feeds and BatchLists")
+    parser.add_argument('--years', type=int, default=1, help="Years of history (default: 1)")
+    parser.add_argument('--interval', type=int, choices=[15, 60], default=60, help="Interval minutes")
+    parser.add_argument('--meters', type=int, default=1, help="Number of meters (default: 1)")
+    parser.add_argument('--start', type=date.fromisoformat, default=DEFAULT_START,
+                        help=f"First local day (default: {DEFAULT_START})")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', type=Path, required=True, help="Output directory")
+    args = parser.parse_args(argv)
+
+    args.out.mkdir(parents=True, exist_ok=True)
+    feed, readings = generate_espi_feed(args.start, args.years, args.interval, args.meters, args.seed)
+    (args.out / 'espi_feed.xml').write_text(feed, encoding='utf-8')
+    (args.out / 'batch_list.xml').write_text(generate_batch_list(args.meters), encoding='utf-8')
+    print(f"Wrote {readings} readings ({len(feed) / 1e6:.1f} MB) to {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Pipeline Load Test
+
+Drives the real entry points against the local stand-in (pge_stand_in.py):
+1. Each round posts --notifications BatchList rows to the stand-in, then
+   runs fetch_and_parse_pge.main() and mark_processed.main() unchanged
+   (only the PG&E credentials object is replaced, since the stand-in needs
+   no client certificate)
+2. The database, Parquet snapshot, run metrics and processed-row handoff
+   live in a temporary directory, so the repo's data/ is never touched
+3. Reports per round and overall: wall time, readings/s and hours/s, the
+   pipeline's stage timings, HTTP outcomes per endpoint (429/503 show
+   retries and backoff at work) and the notification rows left
+   unprocessed for the next round
+
+Usage:
+    python scripts/bench/load_test.py --rounds 3 --notifications 50 --uris-per-notification 4 --payload-days 7
+    python scripts/bench/load_test.py --error-rate 0.1 --rate-limit 20 --latency-ms 100 --jitter-ms 100
+    python scripts/bench/load_test.py --interval 15 --meters 2 --concurrency 8 --json-out load.json
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import tempfile
+import importlib
+from pathlib import Path
+
+from pge_stand_in import add_config_args, config_from_args, start_server
+
+REPO_ROOT = Path(__file__).resolve().parent.parent.parent
+AUTOMATION_DIR = REPO_ROOT / 'scripts' / 'automation'
+
+
+class StandInApi:
+    """Stands in for pgesmd_self_access.SelfAccessApi: no certificate, fixed token"""
+
+    cert = None
+    access_token = 'stand-in'
+
+    def need_token(self):
+        return False
+
+    def get_token(self):
+        return self.access_token
+
+
+def load_pipeline(work_dir, args):
+    """
+    Point the pipeline at `work_dir` and import its entry points
+
+    Settings the modules read at import time go into the environment first.
+
+    Returns:
+        (fetch_and_parse_pge module, mark_processed module)
+    """
+    os.environ.update({
+        'PGE_METRICS_DIR': str(work_dir / 'metrics'),
+        'PGE_PARQUET_DIR': str(work_dir / 'parquet'),
+        'PGE_PROCESSED_IDS_FILE': str(work_dir / 'processed_row_ids.json'),
+        'PGE_CACHE_DISABLED': 'true',
+        'PGE_FETCH_CONCURRENCY': str(args.concurrency),
+        'PGE_FETCH_BACKOFF_SECONDS': str(args.backoff_seconds),
+    })
+    sys.path.insert(0, str(AUTOMATION_DIR))
+    meter_store = importlib.import_module('meter_store')
+    meter_store.DB_FILE = work_dir / 'pge_meter_data.sqlite'
+    fetch_and_parse = importlib.import_module('fetch_and_parse_pge')
+    fetch_and_parse.get_pge_api = StandInApi
+    return fetch_and_parse, importlib.import_module('mark_processed')
+
+
+def last_record(metrics_dir, script):
+    """Most recent run record a script wrote through pipeline_metrics"""
+    try:
+        with open(metrics_dir / f"{script}.jsonl") as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return {}
+    return json.loads(lines[-1]) if lines else {}
+
+
+def run_entry_point(main):
+    """Call a main(); returns (exit code or None, error text or None, seconds)"""
+    started = time.perf_counter()
+    try:
+        return main(), None, time.perf_counter() - started
+    except Exception as e:
+        return None, f"{type(e).__name__}: {e}", time.perf_counter() - started
+
+
+def stats_delta(after, before):
+    return {key: after[key] - before.get(key, 0) for key in sorted(after) if after[key] != before.get(key, 0)}
+
+
+def run(args):
+    """
+    Run every round
+
+    Returns:
+        Dict with 'params', per-round results and an overall summary
+    """
+    with tempfile.TemporaryDirectory(prefix='pge-load-') as tmp:
+        work_dir = Path(tmp)
+        fetch_and_parse, mark_processed = load_pipeline(work_dir, args)
+        if not args.verbose:
+            logging.getLogger().setLevel(logging.WARNING)
+
+        server, base_url = start_server(config_from_args(args))
+        os.environ['SUPABASE_URL'] = base_url
+        os.environ['SUPABASE_SERVICE_ROLE_KEY'] = 'stand-in'
+        state = server.state
+
+        rounds = []
+        try:
+            for number in range(1, args.rounds + 1):
+                state.add_notifications(base_url, args.notifications, args.uris_per_notification)
+                stats_before, bytes_before = dict(state.stats), state.bytes_served
+
+                fetch_code, fetch_error, fetch_seconds = run_entry_point(fetch_and_parse.main)
+                mark_code, mark_error, mark_seconds = run_entry_point(mark_processed.main)
+
+                record = last_record(work_dir / 'metrics', 'fetch_and_parse_pge')
+                counters = record.get('counters', {})
+                readings = counters.get('readings_parsed', 0)
+                hours = sum(counters.get(f"hours_{key}", 0) for key in ('new', 'revised', 'unchanged'))
+                rounds.append({
+                    'round': number,
+                    'fetch_exit_code': fetch_code, 'fetch_error': fetch_error,
+                    'mark_exit_code': mark_code, 'mark_error': mark_error,
+                    'fetch_seconds': round(fetch_seconds, 3), 'mark_seconds': round(mark_seconds, 3),
+                    'readings': readings, 'hours': hours,
+                    'readings_per_sec': round(readings / fetch_seconds, 1) if fetch_seconds else None,
+                    'hours_per_sec': round(hours / fetch_seconds, 1) if fetch_seconds else None,
+                    'uris_failed': counters.get('uris_failed', 0),
+                    'fetch_retries': counters.get('fetch_retries', 0),
+                    'bytes_served': state.bytes_served - bytes_before,
+                    'http': stats_delta(state.stats, stats_before),
+                    'stages': {name: stage['seconds'] for name, stage in record.get('stages', {}).items()},
+                    'unprocessed_rows': state.unprocessed(),
+                })
+                print_round(rounds[-1])
+        finally:
+            server.shutdown()
+
+    total_seconds = sum(r['fetch_seconds'] + r['mark_seconds'] for r in rounds)
+    total_readings = sum(r['readings'] for r in rounds)
+    summary = {
+        'seconds': round(total_seconds, 3),
+        'readings': total_readings,
+        'sustained_readings_per_sec': round(total_readings / total_seconds, 1) if total_seconds else None,
+        'failed_rounds': sum(1 for r in rounds if r['fetch_error'] or r['fetch_exit_code']),
+        'unprocessed_rows': rounds[-1]['unprocessed_rows'] if rounds else 0,
+        'http': {key: sum(r['http'].get(key, 0) for r in rounds)
+                 for key in sorted({key for r in rounds for key in r['http']})},
+    }
+    return {'params': vars(args), 'rounds': rounds, 'summary': summary}
+
+
+def print_round(result):
+    status = result['fetch_error'] or f"exit {result['fetch_exit_code']}/{result['mark_exit_code']}"
+    print(f"Round {result['round']}: {result['fetch_seconds']:.2f}s fetch+ingest, "
+          f"{result['mark_seconds']:.2f}s mark ({status})")
+    print(f"  {result['readings']} readings ({result['readings_per_sec'] or 0:,.0f}/s), "
+          f"{result['hours']} hours ({result['hours_per_sec'] or 0:,.0f}/s), "
+          f"{result['bytes_served'] / 1e6:.1f} MB served")
+    print(f"  {result['uris_failed']} URI(s) failed, {result['fetch_retries']} retries, "
+          f"{result['unprocessed_rows']} notification row(s) left unprocessed")
+    if result['stages']:
+        print("  stages: " + ', '.join(f"{name} {seconds:.2f}s" for name, seconds in result['stages'].items()))
+    print("  http:   " + ', '.join(f"{key} x{count}" for key, count in result['http'].items()))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test the PGE pipeline against a local stand-in")
+    parser.add_argument('--rounds', type=int, default=3, help="Nightly runs to simulate (default: 3)")
+    parser.add_argument('--notifications', type=int, default=20, help="BatchList rows posted per round")
+    parser.add_argument('--uris-per-notification', type=int, default=2)
+    parser.add_argument('--concurrency', type=int, default=4, help="PGE_FETCH_CONCURRENCY for the run")
+    parser.add_argument('--backoff-seconds', type=float, default=0.1,
+                        help="PGE_FETCH_BACKOFF_SECONDS for the run (default: 0.1)")
+    parser.add_argument('--json-out', type=Path, help="Also write the results to this path")
+    parser.add_argument('--verbose', action='store_true', help="Keep the pipeline's INFO logging")
+    add_config_args(parser)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = run(args)
+    summary = results['summary']
+    print(f"\nSustained: {summary['readings']} readings in {summary['seconds']:.2f}s "
+          f"({summary['sustained_readings_per_sec'] or 0:,.0f}/s), "
+          f"{summary['failed_rounds']} failed round(s), "
+          f"{summary['unprocessed_rows']} row(s) still unprocessed")
+    if args.json_out:
+        args.json_out.write_text(json.dumps(results, indent=2, default=str))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
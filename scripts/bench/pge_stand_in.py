@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+PG&E + Supabase Stand-In Server
+
+A local HTTP server that behaves like the two services the pipeline talks to:
+1. Supabase PostgREST `/rest/v1/pge_data`: GET with the select/processed/
+   order/limit filters and the keyset `or=` clause used by
+   fetch_and_parse_pge.py, and PATCH with `id=in.(...)` as sent by
+   mark_processed.py
+2. PG&E ESPI resources: every BatchList notification lists resource URIs
+   on this server, and each URI serves a synthetic ESPI feed (see
+   espi_generator.py) covering its own run of days
+3. Configurable latency (with jitter), error rate (HTTP 503), rate limiting
+   (HTTP 429 with Retry-After) and payload size, so retries, backoff and
+   partial failures can be exercised offline
+
+Usage:
+    python scripts/bench/pge_stand_in.py --notifications 20 --uris-per-notification 5 --port 8787
+    python scripts/bench/pge_stand_in.py --latency-ms 200 --error-rate 0.05 --rate-limit 20
+"""
+
+import re
+import json
+import time
+import random
+import argparse
+import threading
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+from espi_generator import DEFAULT_START, generate_espi_feed, generate_batch_list
+
+KEYSET_PATTERN = re.compile(r'\(received_at\.gt\."([^"]*)",and\(received_at\.eq\."([^"]*)",id\.gt\.(\d+)\)\)')
+ID_LIST_PATTERN = re.compile(r'in\.\(([^)]*)\)')
+ESPI_PATH = '/espi/1_1/resource/Batch/Bulk/50098'
+FIRST_RECEIVED_AT = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+class StandInConfig:
+    """Behavior of the stand-in (all knobs of the load test)"""
+
+    def __init__(self, latency_ms=0, jitter_ms=0, error_rate=0.0, supabase_error_rate=0.0,
+                 rate_limit=0.0, retry_after=1, payload_days=1, interval=60, meters=1, seed=0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.supabase_error_rate = supabase_error_rate
+        self.rate_limit = rate_limit
+        self.retry_after = retry_after
+        self.payload_days = payload_days
+        self.interval = interval
+        self.meters = meters
+        self.seed = seed
+
+
+class TokenBucket:
+    """Requests-per-second limiter shared by all handler threads"""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self):
+        """Return True if a request may proceed"""
+        if not self.rate:
+            return True
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+
+class StandInState:
+    """Notification rows, payload bookkeeping and request statistics"""
+
+    def __init__(self, config):
+        self.config = config
+        self.rows = []
+        self.next_correlation_id = 1
+        self.bucket = TokenBucket(config.rate_limit)
+        self.random = random.Random(config.seed)
+        self.stats = {}
+        self.bytes_served = 0
+        self.lock = threading.Lock()
+
+    def add_notifications(self, base_url, count, uris_per_notification):
+        """Post `count` BatchList notifications, each listing new resource URIs"""
+        with self.lock:
+            for _ in range(count):
+                row_id = len(self.rows) + 1
+                self.rows.append({
+                    'id': row_id,
+                    'received_at': (FIRST_RECEIVED_AT + timedelta(minutes=row_id)).isoformat(),
+                    'processed': False,
+                    'raw_xml': generate_batch_list(uris_per_notification, f"{base_url}{ESPI_PATH}",
+                                                   start_id=self.next_correlation_id),
+                })
+                self.next_correlation_id += uris_per_notification
+
+    def unprocessed(self):
+        with self.lock:
+            return sum(not row['processed'] for row in self.rows)
+
+    def count(self, endpoint, status, size=0):
+        with self.lock:
+            key = f"{endpoint} {status}"
+            self.stats[key] = self.stats.get(key, 0) + 1
+            self.bytes_served += size
+
+    def roll(self, rate):
+        with self.lock:
+            return self.random.random() < rate
+
+    def delay_seconds(self):
+        config = self.config
+        with self.lock:
+            jitter = self.random.uniform(0, config.jitter_ms) if config.jitter_ms else 0
+        return (config.latency_ms + jitter) / 1000
+
+    def select(self, query):
+        """Apply the PostgREST filters fetch_and_parse_pge.py sends"""
+        columns = query.get('select', ['id,received_at,raw_xml'])[0].split(',')
+        with self.lock:
+            rows = [row for row in self.rows if query.get('processed') != ['eq.false'] or not row['processed']]
+        if 'or' in query:
+            match = KEYSET_PATTERN.fullmatch(query['or'][0])
+            if match:
+                received_at, _, last_id = match.groups()
+                rows = [row for row in rows if (row['received_at'], row['id']) > (received_at, int(last_id))]
+        rows.sort(key=lambda row: (row['received_at'], row['id']))
+        if 'limit' in query:
+            rows = rows[:int(query['limit'][0])]
+        return [{column: row[column] for column in columns} for row in rows]
+
+    def patch(self, query, body):
+        """Apply an `id=in.(...)` PATCH; returns the number of rows updated"""
+        match = ID_LIST_PATTERN.fullmatch(query.get('id', [''])[0])
+        if not match:
+            return 0
+        ids = {int(row_id) for row_id in match.group(1).split(',') if row_id}
+        with self.lock:
+            updated = 0
+            for row in self.rows:
+                if row['id'] in ids:
+                    row.update(body)
+                    updated += 1
+        return updated
+
+    def payload(self, correlation_id):
+        """ESPI feed for one resource: payload_days days, distinct per correlation id"""
+        config = self.config
+        start = DEFAULT_START + timedelta(days=(correlation_id - 1) * config.payload_days)
+        feed, _ = generate_espi_feed(start, interval_minutes=config.interval, meters=config.meters,
+                                     seed=config.seed + correlation_id, days=config.payload_days)
+        return feed.encode('utf-8')
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Routes requests to the Supabase or ESPI behavior"""
+
+    protocol_version = 'HTTP/1.1'
+
+    @property
+    def state(self):
+        return self.server.state
+
+    def log_message(self, format, *args):
+        pass
+
+    def reply(self, endpoint, status, body=b'', content_type='application/json', headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+        self.state.count(endpoint, status, len(body))
+
+    def simulate(self, endpoint, error_rate):
+        """Apply latency, rate limiting and random errors; True if the request was answered"""
+        config = self.state.config
+        delay = self.state.delay_seconds()
+        if delay:
+            time.sleep(delay)
+        if not self.state.bucket.take():
+            self.reply(endpoint, 429, b'{"message": "rate limited"}',
+                       headers={'Retry-After': str(config.retry_after)})
+            return True
+        if error_rate and self.state.roll(error_rate):
+            self.reply(endpoint, 503, b'{"message": "unavailable"}')
+            return True
+        return False
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        if url.path == '/rest/v1/pge_data':
+            if self.simulate('supabase_select', self.state.config.supabase_error_rate):
+                return
+            self.reply('supabase_select', 200, json.dumps(self.state.select(query)).encode('utf-8'))
+        elif url.path.startswith(ESPI_PATH) and 'correlationID' in query:
+            if self.simulate('espi', self.state.config.error_rate):
+                return
+            payload = self.state.payload(int(query['correlationID'][0]))
+            self.reply('espi', 200, payload, content_type='application/atom+xml')
+        else:
+            self.reply('unknown', 404, b'{"message": "not found"}')
+
+    def do_PATCH(self):
+        url = urlparse(self.path)
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        if url.path != '/rest/v1/pge_data':
+            self.reply('unknown', 404, b'{"message": "not found"}')
+            return
+        if self.simulate('supabase_patch', self.state.config.supabase_error_rate):
+            return
+        self.state.patch(parse_qs(url.query), json.loads(body or b'{}'))
+        self.reply('supabase_patch', 204)
+
+
+def start_server(config, host='127.0.0.1', port=0):
+    """
+    Start the stand-in in a background thread
+
+    Returns:
+        (server, base_url); stop it with server.shutdown()
+    """
+    server = ThreadingHTTPServer((host, port), StandInHandler)
+    server.daemon_threads = True
+    server.state = StandInState(config)
+    threading.Thread(target=server.serve_forever, name='pge-stand-in', daemon=True).start()
+    return server, f"http://{host}:{server.server_port}"
+
+
+def add_config_args(parser):
+    """CLI options shared with load_test.py"""
+    parser.add_argument('--latency-ms', type=float, default=0, help="Delay added to every response")
+    parser.add_argument('--jitter-ms', type=float, default=0, help="Extra random delay, 0..jitter")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of ESPI requests answered 503")
+    parser.add_argument('--supabase-error-rate', type=float, default=0.0,
+                        help="Fraction of Supabase requests answered 503")
+    parser.add_argument('--rate-limit', type=float, default=0.0,
+                        help="Requests per second before answering 429 (0 = unlimited)")
+    parser.add_argument('--retry-after', type=int, default=1, help="Retry-After seconds sent with 429")
+    parser.add_argument('--payload-days', type=int, default=1, help="Days of readings per ESPI resource")
+    parser.add_argument('--interval', type=int, choices=[15, 60], default=60, help="Interval minutes")
+    parser.add_argument('--meters', type=int, default=1, help="Usage points per resource")
+    parser.add_argument('--seed', type=int, default=0)
+
+
+def config_from_args(args):
+    return StandInConfig(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate,
+                         supabase_error_rate=args.supabase_error_rate, rate_limit=args.rate_limit,
+                         retry_after=args.retry_after, payload_days=args.payload_days,
+                         interval=args.interval, meters=args.meters, seed=args.seed)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve a local stand-in for Supabase and the PG&E ESPI API")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8787)
+    parser.add_argument('--notifications', type=int, default=10, help="BatchList rows to post at startup")
+    parser.add_argument('--uris-per-notification', type=int, default=1)
+    add_config_args(parser)
+    args = parser.parse_args(argv)
+
+    server, base_url = start_server(config_from_args(args), args.host, args.port)
+    server.state.add_notifications(base_url, args.notifications, args.uris_per_notification)
+    print(f"Stand-in listening on {base_url} with {args.notifications} notification(s); "
+          f"Ctrl+C prints request statistics (load_test.py drives the pipeline against it)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+        print(json.dumps(server.state.stats, indent=2, sort_keys=True))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+Pipeline Benchmarks
+
+Times each stage of the nightly pipeline on synthetic data (see
+espi_generator.py):
+1. BatchList URI extraction
+2. ESPI parsing (legacy dict parser and streaming columnar parser)
+3. Dedupe/sort into native-resolution and hourly rows
+4. SQLite ingest, both into an empty database and re-ingesting unchanged
+   rows (the steady state of a nightly run)
+5. Range queries at every granularity through the resolution pyramid
+6. The data quality report over every month
+
+Reports wall time (best of --repeat), throughput and the process's peak
+RSS after each stage, and compares the timings against a stored baseline.
+
+Usage:
+    python scripts/bench/run_benchmarks.py --years 3 --interval 15
+    python scripts/bench/run_benchmarks.py --years 3 --interval 15 --save-baseline
+    python scripts/bench/run_benchmarks.py --years 3 --interval 15 --fail-on-regression
+"""
+
+import gc
+import sys
+import json
+import time
+import sqlite3
+import argparse
+import platform
+import tempfile
+from datetime import date, timedelta
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(REPO_ROOT / 'scripts' / 'automation'))
+sys.path.insert(0, str(REPO_ROOT))
+
+import meter_store  # noqa: E402
+import check_data_quality  # noqa: E402
+from pipeline_metrics import peak_rss_mb  # noqa: E402
+from fetch_and_parse_pge import (  # noqa: E402
+    extract_uris_from_batch_list, parse_espi_xml, parse_espi_xml_columnar
+)
+from espi_generator import generate_espi_feed, generate_batch_list  # noqa: E402
+
+DEFAULT_BASELINE = Path(__file__).parent / 'baseline.json'
+DEFAULT_TOLERANCE = 0.25      # Flag stages more than 25% slower than baseline
+MIN_REGRESSION_SECONDS = 0.01  # ...and at least this much slower (timer noise)
+BATCH_LIST_URIS = 1000
+
+
+def time_stage(func, repeat):
+    """Run func `repeat` times; return (best seconds, last result)"""
+    best = None
+    result = None
+    for _ in range(max(1, repeat)):
+        result = None
+        gc.collect()
+        started = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def run(args):
+    """
+    Generate the workload and time every stage
+
+    Returns:
+        Dict with 'params' and a 'stages' list of
+        {'name', 'seconds', 'items', 'items_per_sec', 'unit', 'peak_rss_mb'}
+    """
+    stages = []
+
+    def record(name, seconds, items, unit):
+        stages.append({
+            'name': name,
+            'seconds': round(seconds, 4),
+            'items': items,
+            'unit': unit,
+            'items_per_sec': round(items / seconds, 1) if seconds else None,
+            'peak_rss_mb': round(peak_rss_mb(), 1) if peak_rss_mb() is not None else None,
+        })
+        print(f"  {name:<18} {seconds:8.3f}s  {items:>10} {unit:<8} "
+              f"{items / seconds if seconds else 0:>12,.0f}/s  peak RSS {stages[-1]['peak_rss_mb']} MB")
+
+    print(f"Generating {args.years} year(s) of {args.interval}-minute data for {args.meters} meter(s)...")
+    feed, reading_count = generate_espi_feed(years=args.years, interval_minutes=args.interval,
+                                             meters=args.meters, seed=args.seed)
+    batch_list = generate_batch_list(BATCH_LIST_URIS)
+    print(f"  {reading_count} readings, {len(feed) / 1e6:.1f} MB of XML\n")
+
+    seconds, uris = time_stage(lambda: extract_uris_from_batch_list(batch_list), args.repeat)
+    record('batch_list', seconds, len(uris), 'uris')
+
+    seconds, legacy = time_stage(lambda: parse_espi_xml(feed), args.repeat)
+    record('parse_legacy', seconds, len(legacy), 'readings')
+    del legacy
+
+    seconds, columns = time_stage(lambda: parse_espi_xml_columnar(feed), args.repeat)
+    record('parse_columnar', seconds, len(columns['start']), 'readings')
+
+    seconds, by_meter = time_stage(lambda: meter_store.aggregate_hourly_by_meter(columns), args.repeat)
+    record('dedupe_sort', seconds, sum(len(rows) for rows, _, _ in by_meter.values()), 'hours')
+
+    def ingest(conn):
+        totals = {'new': 0, 'revised': 0, 'unchanged': 0}
+        for meter_id, (rows, newest_start, intervals) in by_meter.items():
+            counts = meter_store.upsert_hourly_readings(conn, rows, newest_start, meter_id, intervals)
+            for key in totals:
+                totals[key] += counts[key]
+        return totals
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = Path(tmp_dir) / 'bench.sqlite'
+
+        def ingest_new():
+            for suffix in ('', '-wal', '-shm'):
+                Path(f"{db_path}{suffix}").unlink(missing_ok=True)
+            conn = meter_store.connect(db_path, migrate=True)
+            try:
+                return ingest(conn)
+            finally:
+                meter_store.close(conn)
+
+        seconds, counts = time_stage(ingest_new, args.repeat)
+        record('ingest_new', seconds, counts['new'], 'hours')
+
+        def ingest_unchanged():
+            conn = meter_store.connect(db_path, migrate=True)
+            try:
+                return ingest(conn)
+            finally:
+                meter_store.close(conn)
+
+        seconds, counts = time_stage(ingest_unchanged, args.repeat)
+        record('ingest_unchanged', seconds, counts['unchanged'], 'hours')
+
+        def query_pyramid():
+            # Whole months at every granularity, each read from the coarsest
+            # level that covers it
+            conn = meter_store.connect(db_path, readonly=True)
+            try:
+                first, last = conn.execute("SELECT MIN(dttm_start), MAX(dttm_start) FROM meter_data").fetchone()
+                month_after = (date.fromisoformat(last[:8] + '01') + timedelta(days=32)).replace(day=1)
+                start, end = meter_store.local_to_epoch([first[:8] + '01', month_after.isoformat()])
+                return sum(len(meter_store.query_usage(conn, start, end, granularity)['rows'])
+                           for granularity in meter_store.LEVELS)
+            finally:
+                meter_store.close(conn)
+
+        seconds, buckets = time_stage(query_pyramid, args.repeat)
+        record('query_pyramid', seconds, buckets, 'buckets')
+
+        def quality_report():
+            conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+            try:
+                months = [row[0] for row in conn.execute(
+                    "SELECT DISTINCT substr(dttm_start, 1, 7) FROM meter_data ORDER BY 1"
+                )]
+                meters = check_data_quality.list_meters(conn)
+            finally:
+                conn.close()
+            periods = [check_data_quality.parse_period(month) for month in months]
+            for meter_id in meters:
+                check_data_quality.meter_report(db_path, periods, meter_id)
+            return len(months) * len(meters)
+
+        seconds, months = time_stage(quality_report, args.repeat)
+        record('quality_report', seconds, months, 'meter-months')
+
+    return {
+        'params': {'years': args.years, 'interval': args.interval, 'meters': args.meters,
+                   'seed': args.seed, 'readings': reading_count},
+        'environment': {'python': platform.python_version(), 'platform': platform.platform(),
+                        'sqlite': sqlite3.sqlite_version},
+        'stages': stages,
+    }
+
+
+def compare(results, baseline, tolerance):
+    """
+    Compare stage timings against a baseline
+
+    Returns:
+        List of regression messages (empty if none)
+    """
+    if baseline.get('params') != results['params']:
+        print(f"\n⚠ Baseline was recorded with different parameters: {baseline.get('params')}")
+
+    previous = {stage['name']: stage for stage in baseline.get('stages', [])}
+    regressions = []
+    print(f"\n{'Stage':<18} {'Baseline':>10} {'Current':>10} {'Change':>8}")
+    for stage in results['stages']:
+        before = previous.get(stage['name'])
+        if not before or not before['seconds']:
+            print(f"{stage['name']:<18} {'-':>10} {stage['seconds']:>9.3f}s")
+            continue
+        change = stage['seconds'] / before['seconds'] - 1
+        flag = ''
+        if change > tolerance and stage['seconds'] - before['seconds'] > MIN_REGRESSION_SECONDS:
+            flag = '  ✗ REGRESSION'
+            regressions.append(f"{stage['name']}: {before['seconds']:.3f}s -> {stage['seconds']:.3f}s "
+                               f"({change:+.0%})")
+        print(f"{stage['name']:<18} {before['seconds']:>9.3f}s {stage['seconds']:>9.3f}s {change:>+8.0%}{flag}")
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the PGE ingest pipeline on synthetic data")
+    parser.add_argument('--years', type=int, default=1, help="Years of history (default: 1)")
+    parser.add_argument('--interval', type=int, choices=[15, 60], default=60, help="Interval minutes")
+    parser.add_argument('--meters', type=int, default=1, help="Number of meters (default: 1)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per stage; the best is kept (default: 3)")
+    parser.add_argument('--baseline', type=Path, default=DEFAULT_BASELINE,
+                        help=f"Baseline JSON (default: {DEFAULT_BASELINE.name} next to this script)")
+    parser.add_argument('--save-baseline', action='store_true', help="Store these results as the baseline")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help=f"Slowdown ratio counted as a regression (default: {DEFAULT_TOLERANCE})")
+    parser.add_argument('--fail-on-regression', action='store_true',
+                        help="Exit with status 1 if any stage regressed")
+    parser.add_argument('--json-out', type=Path, help="Also write the results to this path")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = run(args)
+
+    if args.json_out:
+        args.json_out.write_text(json.dumps(results, indent=2))
+
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(results, indent=2))
+        print(f"\n✓ Saved baseline to {args.baseline}")
+        return 0
+
+    if not args.baseline.exists():
+        print(f"\nNo baseline at {args.baseline}; run with --save-baseline to create one")
+        return 0
+
+    regressions = compare(results, json.loads(args.baseline.read_text()), args.tolerance)
+    if regressions:
+        print(f"\n✗ {len(regressions)} stage(s) slower than baseline by more than {args.tolerance:.0%}")
+        return 1 if args.fail_on_regression else 0
+    print("\n✓ No regressions against baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,119 @@
+"""
+Shared fixtures for the Python pipeline tests
+
+The automation modules import their siblings directly, so scripts/automation,
+scripts/bench (the synthetic ESPI generator and the Supabase/PG&E stand-in)
+and the repository root (check_data_quality.py, repair_meter_data.py) are put
+on sys.path. Times are checked in the default America/Los_Angeles zone.
+
+Everything the pipeline writes outside its database (metrics, Parquet
+snapshot, processed-row handoff, payload and token caches) goes to a
+temporary directory, so tests never touch the repo's data/.
+"""
+
+import os
+import sys
+import sqlite3
+import tempfile
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[2]
+OUTPUT_DIR = Path(tempfile.mkdtemp(prefix='pge-tests-'))
+os.environ.update({
+    'PGE_TIMEZONE': 'America/Los_Angeles',
+    'PGE_METRICS_DIR': str(OUTPUT_DIR / 'metrics'),
+    'PGE_PARQUET_DIR': str(OUTPUT_DIR / 'parquet'),
+    'PGE_PROCESSED_IDS_FILE': str(OUTPUT_DIR / 'processed_row_ids.json'),
+    'PGE_CACHE_DIR': str(OUTPUT_DIR / 'cache'),
+    'PGE_CACHE_DISABLED': 'true',
+    'PGE_TOKEN_CACHE_FILE': str(OUTPUT_DIR / 'token.json'),
+    'PGE_TOKEN_CACHE_DISABLED': 'true',
+    'PGE_FETCH_BACKOFF_SECONDS': '0.01',
+})
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / 'scripts' / 'bench'))
+sys.path.insert(0, str(ROOT / 'scripts' / 'automation'))
+
+import meter_store  # noqa: E402
+
+LEGACY_SCHEMA_SQL = """
+CREATE TABLE meter_data (
+    dttm_start TEXT NOT NULL,
+    hour INTEGER NOT NULL,
+    value REAL NOT NULL,
+    day INTEGER,
+    day2 INTEGER,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (dttm_start, hour)
+)
+"""
+
+
+def hourly_rows(first_ts, values):
+    """(ts, dttm_start, hour, value) rows for consecutive hours from first_ts"""
+    starts = [first_ts + i * 3600 for i in range(len(values))]
+    return [
+        (ts, dttm_start, hour, value)
+        for ts, (dttm_start, hour), value in zip(starts, meter_store.epoch_to_local(starts), values)
+    ]
+
+
+@pytest.fixture
+def legacy_db(tmp_path):
+    """
+    Build a database in the pre-migration schema
+
+    Returns a function taking (created_at, [(dttm_start, value), ...]) batches
+    and returning the database path.
+    """
+    path = tmp_path / 'legacy.sqlite'
+
+    def build(*batches):
+        conn = sqlite3.connect(path)
+        conn.execute(LEGACY_SCHEMA_SQL)
+        for created_at, readings in batches:
+            conn.executemany(
+                "INSERT INTO meter_data (dttm_start, hour, value, day, day2, created_at) VALUES (?, ?, ?, 1, 1, ?)",
+                ((dttm_start, int(dttm_start[11:13]), value, created_at) for dttm_start, value in readings)
+            )
+        conn.commit()
+        conn.close()
+        return path
+
+    return build
+
+
+@pytest.fixture
+def store(tmp_path):
+    """An empty, current-schema meter database"""
+    conn = meter_store.connect(tmp_path / 'meter.sqlite', migrate=True)
+    yield conn
+    meter_store.close(conn)
+
+
+@pytest.fixture
+def stand_in(tmp_path, monkeypatch):
+    """
+    The local Supabase/PG&E stand-in with the ingest pipeline pointed at it
+
+    fetch_and_parse_pge.main() then drains the stand-in's notifications into
+    tmp_path / 'meter.sqlite' and writes its processed row ids next to it.
+
+    Returns:
+        (pge_stand_in.StandInState, base URL)
+    """
+    import fetch_and_parse_pge
+    from load_test import StandInApi
+    from pge_stand_in import StandInConfig, start_server
+
+    server, base_url = start_server(StandInConfig())
+    monkeypatch.setenv('SUPABASE_URL', base_url)
+    monkeypatch.setenv('SUPABASE_SERVICE_ROLE_KEY', 'stand-in')
+    monkeypatch.setattr(meter_store, 'DB_FILE', tmp_path / 'meter.sqlite')
+    monkeypatch.setattr(fetch_and_parse_pge, 'get_pge_api', StandInApi)
+    monkeypatch.setattr(fetch_and_parse_pge, 'PROCESSED_IDS_FILE', tmp_path / 'processed_row_ids.json')
+    yield server.state, base_url
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,78 @@
+"""Tests for anomaly_detector scoring during ingest"""
+
+import anomaly_detector
+import meter_store
+from conftest import hourly_rows
+
+
+def usage(hour):
+    """A steady household load with a little hour-to-hour variation"""
+    return 0.5 + 0.05 * (hour % 4)
+
+
+def days_of_readings(first_day, days):
+    start = meter_store.day_bounds(first_day)[0]
+    rows = hourly_rows(start, [0.0] * (24 * days))
+    return [(ts, dttm_start, hour, usage(hour)) for ts, dttm_start, hour, _ in rows]
+
+
+def spike(day, hour=12, value=9.0):
+    ts = meter_store.day_bounds(day)[0] + hour * 3600
+    return hourly_rows(ts, [value])
+
+
+def flags(conn):
+    return sorted(conn.execute("SELECT dttm_start, method FROM anomalies"))
+
+
+def test_ewma_scores_after_a_day_and_zscore_after_weeks(store):
+    meter_store.upsert_hourly_readings(store, days_of_readings('2026-01-05', 2), meter_id='m1')
+    counts = meter_store.upsert_hourly_readings(store, spike('2026-01-07'), meter_id='m1')
+
+    # Two days are enough for the EWMA, but no Wednesday noon is known yet
+    assert counts['anomalies'] == 1
+    assert flags(store) == [('2026-01-07 12:00:00', 'ewma')]
+
+
+def test_spike_after_weeks_of_history_is_flagged_by_both_methods(store):
+    counts = meter_store.upsert_hourly_readings(store, days_of_readings('2026-01-05', 35), meter_id='m1')
+    assert counts['anomalies'] == 0
+
+    meter_store.upsert_hourly_readings(store, spike('2026-02-09'), meter_id='m1')
+    assert flags(store) == [('2026-02-09 12:00:00', 'ewma'), ('2026-02-09 12:00:00', 'zscore')]
+
+    expected, score = store.execute("SELECT expected, score FROM anomalies WHERE method = 'zscore'").fetchone()
+    assert abs(expected - usage(12)) < 1e-9
+    assert score > anomaly_detector.ANOMALY_Z_THRESHOLD
+
+
+def test_meter_without_state_is_bootstrapped_from_stored_readings(store):
+    meter_store.upsert_hourly_readings(store, days_of_readings('2026-01-05', 35), meter_id='m1')
+    anomaly_detector.reset(store, 'm1')
+    assert store.execute("SELECT COUNT(*) FROM anomaly_baseline").fetchone()[0] == 0
+
+    meter_store.upsert_hourly_readings(store, spike('2026-02-09'), meter_id='m1')
+    assert [method for _, method in flags(store)] == ['ewma', 'zscore']
+    assert store.execute("SELECT COUNT(*) FROM anomaly_baseline WHERE meter_id = 'm1'").fetchone()[0] == 7 * 24
+    readings, last_ts = store.execute("SELECT readings, last_ts FROM anomaly_ewma WHERE meter_id = 'm1'").fetchone()
+    assert readings == 35 * 24 + 1
+    assert last_ts == spike('2026-02-09')[0][0]
+
+
+def test_late_backfill_only_feeds_the_baseline(store):
+    history = days_of_readings('2026-01-05', 35)
+    missing = meter_store.day_bounds('2026-02-04')
+    meter_store.upsert_hourly_readings(
+        store, [row for row in history if not missing[0] <= row[0] < missing[1]], meter_id='m1')
+
+    meter_store.upsert_hourly_readings(store, spike('2026-02-04'), meter_id='m1')
+    assert flags(store) == [('2026-02-04 12:00:00', 'zscore')]
+
+
+def test_reset_drops_flags_in_range(store):
+    meter_store.upsert_hourly_readings(store, days_of_readings('2026-01-05', 35), meter_id='m1')
+    meter_store.upsert_hourly_readings(store, spike('2026-02-09'), meter_id='m1')
+
+    anomaly_detector.reset(store, 'm1', *meter_store.day_bounds('2026-02-09'))
+    assert flags(store) == []
+    assert store.execute("SELECT COUNT(*) FROM anomaly_ewma").fetchone()[0] == 0
@@ -0,0 +1,68 @@
+"""Tests for backfill_planner.plan_backfill()"""
+
+import backfill_planner
+import meter_store
+from conftest import hourly_rows
+
+# Planning from 2026-02-02 00:00 local with the default 24 settle hours
+# checks the 30 days 2026-01-02 to 2026-01-31
+NOW = meter_store.day_bounds('2026-02-02')[0]
+
+
+def day_start(day):
+    return meter_store.day_bounds(day)[0]
+
+
+def store_hours(conn, start, end):
+    """Store a reading for every hour in [start, end)"""
+    rows = hourly_rows(start, [1.0] * ((end - start) // 3600))
+    meter_store.upsert_hourly_readings(conn, rows, meter_id='m1')
+
+
+def plan(conn, **kwargs):
+    return backfill_planner.plan_backfill(conn, now=NOW, lookback_days=30, settle_hours=24, **kwargs)
+
+
+def test_empty_database_plans_whole_window(store):
+    result = plan(store)
+    assert result['window'] == (day_start('2026-01-02'), day_start('2026-02-01'))
+    assert result['requests'] == [result['window']]
+
+
+def test_healthy_database_plans_nothing(store):
+    store_hours(store, day_start('2025-12-01'), NOW)
+    result = plan(store)
+    assert result['gaps'] == [] and result['requests'] == []
+
+
+def test_week_long_hole_is_one_request(store):
+    store_hours(store, day_start('2025-12-01'), day_start('2026-01-10') + 5 * 3600)
+    store_hours(store, day_start('2026-01-16') + 20 * 3600, NOW)
+    result = plan(store)
+    assert result['gaps'] == [('m1', day_start('2026-01-10') + 5 * 3600, day_start('2026-01-16') + 20 * 3600)]
+    assert result['requests'] == [(day_start('2026-01-10'), day_start('2026-01-17'))]
+
+
+def test_nearby_gaps_merge_and_distant_ones_do_not(store):
+    # 01:00-23:00 missing on three days; two of them one day apart
+    start = day_start('2025-12-01')
+    for day in ('2026-01-05', '2026-01-20', '2026-01-22'):
+        store_hours(store, start, day_start(day) + 3600)
+        start = day_start(day) + 23 * 3600
+    store_hours(store, start, NOW)
+
+    result = plan(store)
+    assert len(result['gaps']) == 3
+    assert result['requests'] == [
+        (day_start('2026-01-20'), day_start('2026-01-23')),  # newest first
+        (day_start('2026-01-05'), day_start('2026-01-06')),
+    ]
+
+    limited = plan(store, max_requests=1)
+    assert limited['requests'] == result['requests'][:1]
+    assert limited['deferred'] == result['requests'][1:]
+
+
+def test_trailing_hours_inside_settle_window_are_not_missing(store):
+    store_hours(store, day_start('2025-12-01'), day_start('2026-02-01'))
+    assert plan(store)['requests'] == []
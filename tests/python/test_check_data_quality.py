@@ -0,0 +1,38 @@
+"""Tests for check_data_quality.py day completeness"""
+
+import check_data_quality
+import meter_store
+from conftest import hourly_rows
+
+
+def store_day(conn, day, readings):
+    start = meter_store.day_bounds(day)[0]
+    meter_store.upsert_hourly_readings(conn, hourly_rows(start, [1.0] * readings), meter_id='m1')
+
+
+def stats_for(conn, day):
+    label, start, end = check_data_quality.parse_period(f'{day}:{day}')
+    return check_data_quality.period_stats(conn, label, start, end)
+
+
+def test_expected_readings_follow_dst():
+    assert check_data_quality.expected_readings('2026-01-15') == 24
+    assert check_data_quality.expected_readings('2026-03-08') == 23
+    assert check_data_quality.expected_readings('2025-11-02') == 25
+
+
+def test_spring_forward_day_with_23_readings_is_complete(store):
+    store_day(store, '2026-03-08', 23)
+    stats = stats_for(store, '2026-03-08')
+    assert stats['complete_days'] == 1
+    assert stats['incomplete_days'] == []
+
+
+def test_fall_back_day_needs_25_readings(store):
+    store_day(store, '2025-11-02', 24)
+    stats = stats_for(store, '2025-11-02')
+    assert stats['complete_days'] == 0
+    assert stats['incomplete_days'] == [{'date': '2025-11-02', 'records': 24, 'missing': 1}]
+
+    store_day(store, '2025-11-02', 25)
+    assert stats_for(store, '2025-11-02')['complete_days'] == 1
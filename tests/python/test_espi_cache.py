@@ -0,0 +1,88 @@
+"""Tests for espi_cache.EspiCache"""
+
+import os
+import time
+from types import SimpleNamespace
+
+import pge_fetch
+from espi_cache import EspiCache, cache_key
+
+URI = 'https://api.pge.com/GreenButtonConnect/espi/1_1/resource/Batch/Bulk/50098?correlationID=000000001'
+
+
+def test_put_then_get(tmp_path):
+    cache = EspiCache(tmp_path)
+    assert cache.get(URI) is None
+
+    cache.put(URI, '<feed>ok</feed>')
+    assert cache.get(URI) == '<feed>ok</feed>'
+    assert cache.get(URI.replace('001', '002')) is None
+
+    cache.discard(URI)
+    assert cache.get(URI) is None
+
+
+def test_expired_entries_miss_and_are_removed(tmp_path):
+    cache = EspiCache(tmp_path, ttl_hours=1)
+    cache.put(URI, '<feed/>')
+    [(path, _, _, _)] = cache.entries()
+    old = time.time() - 2 * 3600
+    os.utime(path, (old, old))
+
+    assert cache.get(URI) is None
+    assert not path.exists()
+
+
+def test_unreadable_entry_is_a_miss(tmp_path):
+    cache = EspiCache(tmp_path)
+    cache.put(URI, '<feed/>')
+    [(path, _, _, _)] = cache.entries()
+    path.write_bytes(b'not gzip')
+
+    assert cache.get(URI) is None
+    assert not path.exists()
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    payload = os.urandom(64 * 1024).hex()
+    uris = [URI.replace('001', f"00{i}") for i in range(1, 4)]
+    EspiCache(tmp_path / 'probe').put(URI, payload)
+    [(_, entry_size, _, _)] = EspiCache(tmp_path / 'probe').entries()
+
+    cache = EspiCache(tmp_path / 'cache', max_mb=2.5 * entry_size / (1024 * 1024))
+    now = time.time()
+    for age, uri in zip((30, 20), uris[:2]):
+        cache.put(uri, payload)
+        [path] = [path for path, _, _, _ in cache.entries() if path.name.startswith(cache_key(uri))]
+        os.utime(path, (now - age, now - age))
+    cache.get(uris[0])  # now more recently used than uris[1]
+    cache.put(uris[2], payload)
+
+    assert cache.get(uris[0]) is not None
+    assert cache.get(uris[1]) is None
+    assert cache.get(uris[2]) is not None
+
+
+class NoNetworkApi:
+    cert = None
+    access_token = 'token'
+
+    def need_token(self):
+        return False
+
+
+def test_fetcher_reads_hits_and_stores_misses(tmp_path):
+    cache = EspiCache(tmp_path)
+    cache.put(URI, '<cached/>')
+    fetcher = pge_fetch.EspiFetcher(NoNetworkApi(), cache=cache)
+
+    result = fetcher.fetch(URI)
+    assert result['ok'] and result['cached'] and result['data'] == '<cached/>'
+    assert result['attempts'] == 0
+
+    miss = URI.replace('001', '002')
+    fetcher.session.get = lambda uri, **kwargs: SimpleNamespace(status_code=200, text='<fetched/>', headers={})
+    result = fetcher.fetch(miss)
+    assert result['ok'] and not result['cached'] and result['attempts'] == 1
+    assert cache.get(miss) == '<fetched/>'
+    fetcher.close()
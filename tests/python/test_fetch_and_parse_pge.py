@@ -0,0 +1,158 @@
+"""Tests for the ESPI parser in fetch_and_parse_pge.py"""
+
+import json
+import xml.etree.ElementTree as ET
+from datetime import date
+
+import pytest
+
+import fetch_and_parse_pge as pipeline
+import meter_store
+from espi_generator import generate_espi_feed
+
+FEED, READINGS = generate_espi_feed(date(2026, 1, 27), interval_minutes=60, meters=2, days=1)
+
+
+def readings_by_meter(columns):
+    by_meter = {}
+    for start, meter in zip(columns['start'], columns['meter']):
+        by_meter.setdefault(columns['meter_ids'][meter], []).append(start)
+    return by_meter
+
+
+def test_readings_are_tagged_with_their_usage_point():
+    columns = pipeline.parse_espi_xml_columnar(FEED)
+    by_meter = readings_by_meter(columns)
+
+    assert READINGS == 48
+    assert sorted(by_meter) == ['1', '2']
+    assert len(by_meter['1']) == len(by_meter['2']) == 24
+    assert by_meter['1'] == by_meter['2'] == sorted(by_meter['1'])
+
+
+def test_min_start_skips_per_meter():
+    first = min(pipeline.parse_espi_xml_columnar(FEED)['start'])
+    stats = {}
+    columns = pipeline.parse_espi_xml_columnar(FEED, min_start={'1': first + 10 * 3600}, stats=stats)
+    by_meter = readings_by_meter(columns)
+
+    assert stats['skipped'] == 10
+    assert min(by_meter['1']) == first + 10 * 3600
+    assert len(by_meter['2']) == 24  # meters missing from the dict are never skipped
+
+
+def test_truncated_document_adds_no_readings():
+    columns = pipeline.parse_espi_xml_columnar(FEED)
+    truncated = FEED[:len(FEED) // 2]
+
+    with pytest.raises(ET.ParseError):
+        pipeline.parse_espi_xml_columnar(truncated, columns=columns)
+    assert len(columns['start']) == len(columns['duration']) == len(columns['value_wh']) == 48
+    assert len(columns['meter']) == 48
+    assert pipeline.parse_espi_xml(truncated) == []
+
+
+def test_truncated_payload_is_not_stored_or_acknowledged(stand_in, monkeypatch):
+    state, base_url = stand_in
+    state.add_notifications(base_url, 2, 1)
+    full_payload = state.payload
+    monkeypatch.setattr(state, 'payload',
+                        lambda correlation_id: full_payload(correlation_id)[:-500] if correlation_id == 2
+                        else full_payload(correlation_id))
+
+    assert pipeline.main() == 0
+    assert json.loads(pipeline.PROCESSED_IDS_FILE.read_text()) == [1]
+
+    conn = meter_store.connect(readonly=True)
+    try:
+        last_day = meter_store.day_bounds('2024-01-01')
+        assert meter_store.get_watermark(conn, '1') == last_day[1] - 3600
+        assert conn.execute("SELECT MAX(ts) FROM meter_data").fetchone()[0] == last_day[1] - 3600
+    finally:
+        meter_store.close(conn)
+
+
+def backlog(state, received_at):
+    """Replace the stand-in's notifications with rows received at the given times"""
+    state.rows = [
+        {'id': row_id, 'received_at': at, 'processed': False, 'raw_xml': ''}
+        for row_id, at in enumerate(received_at, start=1)
+    ]
+    queries = []
+    select = state.select
+    state.select = lambda query: queries.append(query) or select(query)
+    return queries
+
+
+def drain(base_url, **kwargs):
+    return [row['id'] for row in pipeline.iter_batch_lists_from_supabase(base_url, 'stand-in', **kwargs)]
+
+
+def test_keyset_pagination_handles_ties_on_received_at(stand_in):
+    state, base_url = stand_in
+    queries = backlog(state, ['2026-01-01T00:00:00+00:00'] * 3 + ['2026-01-02T00:00:00+00:00'] * 2)
+    state.rows[1]['processed'] = True
+
+    assert drain(base_url, page_size=2, max_rows=0) == [1, 3, 4, 5]
+    assert 'or' not in queries[0]
+    assert queries[1]['or'] == [
+        '(received_at.gt."2026-01-01T00:00:00+00:00",'
+        'and(received_at.eq."2026-01-01T00:00:00+00:00",id.gt.3))'
+    ]
+    assert len(queries) == 3  # the third page comes back short
+
+
+def test_max_rows_warns_only_when_rows_remain(stand_in, caplog):
+    state, base_url = stand_in
+    backlog(state, [f"2026-01-01T00:00:0{i}+00:00" for i in range(6)])
+
+    assert drain(base_url, page_size=4, max_rows=6) == [1, 2, 3, 4, 5, 6]
+    assert 'SUPABASE_MAX_ROWS_PER_RUN' not in caplog.text
+
+    assert drain(base_url, page_size=4, max_rows=5) == [1, 2, 3, 4, 5]
+    assert 'SUPABASE_MAX_ROWS_PER_RUN' in caplog.text
+
+
+def test_gaps_below_the_watermark_are_kept():
+    first = min(pipeline.parse_espi_xml_columnar(FEED)['start'])
+    stats = {}
+    columns = pipeline.parse_espi_xml_columnar(
+        FEED, min_start={'1': first + 10 * 3600}, stats=stats,
+        gaps={'1': [(first + 2 * 3600, first + 4 * 3600)]})
+
+    assert stats['skipped'] == 8
+    assert readings_by_meter(columns)['1'][:3] == [first + 2 * 3600, first + 3 * 3600, first + 10 * 3600]
+
+
+def test_backfilled_gap_below_the_watermark_is_filled(stand_in):
+    import backfill_planner
+
+    # Days 1 and 5 of January arrive first; days 2-4 only after the planner asks for them
+    state, base_url = stand_in
+    state.add_notifications(base_url, 5, 1)
+    for row in state.rows[1:4]:
+        row['processed'] = True
+    assert pipeline.main() == 0
+
+    def plan():
+        conn = meter_store.connect(readonly=True)
+        try:
+            result = backfill_planner.plan_backfill(conn, now=meter_store.day_bounds('2024-01-07')[0],
+                                                    lookback_days=5, settle_hours=24)
+            hours = conn.execute("SELECT COUNT(*) FROM meter_data").fetchone()[0]
+        finally:
+            meter_store.close(conn)
+        return result['requests'], hours
+
+    requests, hours = plan()
+    assert requests == [(meter_store.day_bounds('2024-01-02')[0], meter_store.day_bounds('2024-01-05')[0])]
+    assert hours == 2 * 24
+
+    # The gap is older than the watermark minus the revision lookback
+    for row in state.rows:
+        row['processed'] = row['id'] in (1, 5)
+    assert pipeline.main() == 0
+
+    requests, hours = plan()
+    assert requests == []
+    assert hours == 5 * 24
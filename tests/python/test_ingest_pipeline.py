@@ -0,0 +1,94 @@
+"""Tests for ingest_pipeline.run_pipeline()"""
+
+import threading
+
+import pytest
+
+import ingest_pipeline
+
+
+@pytest.fixture(autouse=True)
+def fast_polling(monkeypatch):
+    monkeypatch.setattr(ingest_pipeline, 'POLL_SECONDS', 0.01)
+
+
+class Source:
+    """A generator of work items that records how far it got and whether it was closed"""
+
+    def __init__(self, count, fail_at=None):
+        self.count = count
+        self.fail_at = fail_at
+        self.produced = 0
+        self.closed = False
+
+    def __iter__(self):
+        try:
+            for item in range(self.count):
+                if item == self.fail_at:
+                    raise RuntimeError('fetch failed')
+                self.produced += 1
+                yield item
+        finally:
+            self.closed = True
+
+
+def pipeline_threads():
+    return [thread for thread in threading.enumerate() if thread.name.startswith('pipeline-')]
+
+
+def test_items_flow_in_order_and_none_is_dropped():
+    consumed = []
+    count = ingest_pipeline.run_pipeline(
+        Source(10), lambda item: None if item % 3 == 0 else item * 10, consumed.append, queue_size=2)
+
+    assert consumed == [10, 20, 40, 50, 70, 80]
+    assert count == 6
+    assert pipeline_threads() == []
+
+
+def test_slow_consumer_bounds_the_items_in_flight():
+    source = Source(50)
+    ahead = []
+
+    def consume(item):
+        ahead.append(source.produced - len(ahead))
+        threading.Event().wait(0.002)
+
+    ingest_pipeline.run_pipeline(source, lambda item: item, consume, queue_size=2)
+    # Two full queues plus one item held by each of the producer and parser
+    assert max(ahead) <= 2 * 2 + 2
+
+
+@pytest.mark.parametrize('stage', ['fetch', 'parse'])
+def test_stage_error_is_reraised_after_shutdown(stage):
+    source = Source(100, fail_at=5 if stage == 'fetch' else None)
+    consumed = []
+
+    def transform(item):
+        if stage == 'parse' and item == 5:
+            raise ValueError('parse failed')
+        return item
+
+    with pytest.raises(RuntimeError if stage == 'fetch' else ValueError):
+        ingest_pipeline.run_pipeline(source, transform, consumed.append, queue_size=2)
+
+    assert consumed == list(range(len(consumed)))
+    assert len(consumed) <= 5
+    assert source.closed
+    assert source.produced < 100
+    assert pipeline_threads() == []
+
+
+def test_consumer_error_stops_the_other_stages():
+    source = Source(100)
+
+    def consume(item):
+        if item == 3:
+            raise OSError('disk full')
+
+    with pytest.raises(OSError, match='disk full'):
+        ingest_pipeline.run_pipeline(source, lambda item: item, consume, queue_size=2)
+
+    assert source.closed
+    assert source.produced < 100
+    assert pipeline_threads() == []
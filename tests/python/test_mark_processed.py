@@ -0,0 +1,89 @@
+"""Tests for bulk acknowledgement (supabase_rest.py and mark_processed.py)"""
+
+import json
+
+import pytest
+
+import mark_processed
+import supabase_rest
+
+
+class FakeResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+        self.ok = status_code < 400
+        self.text = ''
+        self.headers = {}
+
+
+class ScriptedSession:
+    """Answers each PATCH with the next status for its first id, 204 by default"""
+
+    def __init__(self, statuses):
+        self.statuses = statuses
+        self.patched = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def patch(self, url, headers=None, params=None, json=None):
+        ids = [int(row_id) for row_id in params['id'][len('in.('):-1].split(',')]
+        self.patched.append(ids)
+        statuses = self.statuses.get(ids[0], [])
+        return FakeResponse(statuses.pop(0) if statuses else 204)
+
+
+@pytest.fixture
+def session(monkeypatch):
+    """Route supabase_rest's PATCHes to a ScriptedSession; returns a setup function"""
+    delays = []
+    monkeypatch.setattr(supabase_rest.time, 'sleep', delays.append)
+    monkeypatch.setenv('SUPABASE_URL', 'http://supabase.invalid')
+    monkeypatch.setenv('SUPABASE_SERVICE_ROLE_KEY', 'key')
+
+    def script(statuses):
+        scripted = ScriptedSession(statuses)
+        scripted.delays = delays
+        monkeypatch.setattr(supabase_rest, 'create_session', lambda: scripted)
+        return scripted
+
+    return script
+
+
+def test_chunks_are_retried_on_their_own(session):
+    scripted = session({3: [503, 429]})
+    stats = {}
+    failed = supabase_rest.mark_rows_processed('http://supabase.invalid', 'key', list(range(1, 8)),
+                                               chunk_size=2, stats=stats)
+
+    assert failed == []
+    assert scripted.patched == [[1, 2], [3, 4], [3, 4], [3, 4], [5, 6], [7]]
+    assert stats == {'requests': 6, 'retries': 2}
+    assert len(scripted.delays) == 2
+
+
+def test_client_errors_and_exhausted_retries_fail_the_chunk(session):
+    session({1: [400], 5: [503] * 3})
+    failed = supabase_rest.mark_rows_processed('http://supabase.invalid', 'key', list(range(1, 8)),
+                                               chunk_size=2, max_retries=2)
+    assert failed == [1, 2, 5, 6]
+
+
+def test_ids_file_keeps_only_unmarked_rows(session, tmp_path, monkeypatch):
+    ids_file = tmp_path / 'processed_row_ids.json'
+    monkeypatch.setattr(mark_processed, 'PROCESSED_IDS_FILE', ids_file)
+    monkeypatch.setattr(mark_processed, 'mark_rows_processed',
+                        lambda *args, **kwargs: supabase_rest.mark_rows_processed(*args, chunk_size=2, **kwargs))
+    ids_file.write_text(json.dumps([1, 2, 3, 4, 5]))
+
+    session({3: [400]})
+    assert mark_processed.main() == 1
+    assert json.loads(ids_file.read_text()) == [3, 4]
+
+    scripted = session({})
+    assert mark_processed.main() == 0
+    assert scripted.patched == [[3, 4]]
+    assert not ids_file.exists()
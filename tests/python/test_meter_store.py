@@ -0,0 +1,241 @@
+"""Tests for scripts/automation/meter_store.py"""
+
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+
+import meter_store
+from conftest import hourly_rows
+
+
+def day_of_readings(first, hours=24, value=0.5):
+    """Consecutive hourly (dttm_start, value) pairs starting at 'YYYY-MM-DD HH:MM:SS'"""
+    start = datetime.fromisoformat(first)
+    return [((start + timedelta(hours=i)).strftime(meter_store.TIMESTAMP_FORMAT), value) for i in range(hours)]
+
+
+def migrate(path):
+    conn = meter_store.connect(path, migrate=True)
+    rows = conn.execute("SELECT ts, dttm_start, hour, value FROM meter_data ORDER BY ts").fetchall()
+    quarantined = []
+    if 'meter_data_quarantine' in {row[0] for row in conn.execute("SELECT name FROM sqlite_master")}:
+        quarantined = conn.execute("SELECT dttm_start, value, reason FROM meter_data_quarantine").fetchall()
+    meter_store.close(conn)
+    return rows, quarantined
+
+
+# migrate_schema ------------------------------------------------------------
+
+def test_migration_reads_local_batches_as_local_time(legacy_db):
+    rows, quarantined = migrate(legacy_db(('2025-12-28 10:00:00', day_of_readings('2025-12-01 00:00:00'))))
+
+    assert len(rows) == 24 and not quarantined
+    assert rows[0][1:3] == ('2025-12-01 00:00:00', 0)
+    assert rows[0][0] == meter_store.day_bounds('2025-12-01')[0]
+
+
+def test_migration_reads_pipeline_batches_as_utc(legacy_db):
+    # R-loaded local day, then a nightly batch written in the runner's UTC:
+    # 08:00 -> 07:00 UTC is the next local day
+    path = legacy_db(
+        ('2026-01-21 06:13:25', day_of_readings('2026-01-18 00:00:00', value=0.3)),
+        ('2026-01-22 04:08:48', day_of_readings('2026-01-19 08:00:00', value=0.7)),
+    )
+    rows, quarantined = migrate(path)
+
+    assert not quarantined
+    assert [row[1] for row in rows[23:25]] == ['2026-01-18 23:00:00', '2026-01-19 00:00:00']
+    assert all(b[0] - a[0] == 3600 for a, b in zip(rows, rows[1:]))
+    assert [row[3] for row in rows[24:]] == [0.7] * 24
+
+
+def test_migration_keeps_utc_batch_across_spring_forward(legacy_db):
+    # 2026-03-08 has 23 local hours: 08:00 UTC -> 06:00 UTC the next day,
+    # including 02:00 UTC, which does not exist as Pacific wall clock time
+    readings = day_of_readings('2026-03-08 08:00:00', hours=23)
+    rows, quarantined = migrate(legacy_db(('2026-03-11 04:00:00', readings)))
+
+    assert len(rows) == 23 and not quarantined
+    assert rows[0][1] == '2026-03-08 00:00:00'
+    assert rows[-1][1] == '2026-03-08 23:00:00'
+    assert '2026-03-08 02:00:00' not in [row[1] for row in rows]
+
+
+def test_migration_quarantines_instead_of_dropping(legacy_db):
+    # A local day holding 02:00 on the spring-forward date, which does not
+    # exist, and a local reading for an instant a newer UTC batch also holds
+    path = legacy_db(
+        ('2025-03-10 00:00:00', day_of_readings('2025-03-09 00:00:00', value=1.0)),
+        ('2026-01-20 00:00:00', [('2026-01-19 00:00:00', 2.0)]),
+        ('2026-01-22 04:08:48', day_of_readings('2026-01-19 08:00:00', value=0.7)),
+    )
+    rows, quarantined = migrate(path)
+
+    assert len(rows) + len(quarantined) == 24 + 1 + 24
+    assert '2025-03-09 02:00:00' not in [row[1] for row in rows]
+    assert [row[3] for row in rows if row[1] == '2026-01-19 00:00:00'] == [0.7]
+    assert sorted(quarantined) == [
+        ('2025-03-09 02:00:00', 1.0, 'time does not exist in America/Los_Angeles'),
+        ('2026-01-19 00:00:00', 2.0, 'instant already stored by a newer batch'),
+    ]
+
+
+def test_written_in_utc():
+    assert meter_store.written_in_utc('2026-01-19 08:00:00', '2026-01-20 07:00:00')
+    assert meter_store.written_in_utc('2026-03-09 07:00:00', '2026-03-10 06:00:00')
+    assert not meter_store.written_in_utc('2026-01-12 00:00:00', '2026-01-18 23:00:00')
+    assert not meter_store.written_in_utc('2026-01-19 08:00:00', '2026-01-19 20:00:00')
+
+
+# connect -------------------------------------------------------------------
+
+def test_readers_do_not_migrate(legacy_db):
+    path = legacy_db(('2026-01-22 04:08:48', day_of_readings('2026-01-19 08:00:00')))
+    before = path.read_bytes()
+
+    for readonly in (False, True):
+        with pytest.raises(meter_store.SchemaError):
+            meter_store.connect(path, readonly=readonly)
+    assert path.read_bytes() == before
+
+    meter_store.migrate(path)
+    conn = meter_store.connect(path, readonly=True)
+    with pytest.raises(sqlite3.OperationalError):
+        conn.execute("DELETE FROM meter_data")
+    meter_store.close(conn)
+
+
+def test_readers_need_an_existing_database(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        meter_store.connect(tmp_path / 'missing.sqlite', readonly=True)
+    assert not (tmp_path / 'missing.sqlite').exists()
+
+
+# upsert_hourly_readings ----------------------------------------------------
+
+DAY_START = meter_store.day_bounds('2026-01-27')[0]
+
+
+def quarter_hours(first, values_wh):
+    """Columnar 15-minute readings starting at epoch `first`"""
+    return {
+        'start': [first + i * 900 for i in range(len(values_wh))],
+        'duration': [900] * len(values_wh),
+        'value_wh': list(values_wh),
+    }
+
+
+def upsert(conn, columns, watermark=None):
+    return meter_store.upsert_hourly_readings(
+        conn, meter_store.aggregate_hourly(columns), watermark=watermark, meter_id='m1',
+        intervals=meter_store.native_intervals(columns))
+
+
+def stored_hours(conn):
+    return conn.execute("SELECT ts, value FROM meter_data WHERE meter_id = 'm1' ORDER BY ts").fetchall()
+
+
+def test_upsert_counts_new_revised_and_unchanged_hours(store):
+    counts = upsert(store, quarter_hours(DAY_START, [250] * 96))
+    assert (counts['new'], counts['revised'], counts['unchanged']) == (24, 0, 0)
+
+    counts = upsert(store, quarter_hours(DAY_START, [250] * 92 + [500] * 4))
+    assert (counts['new'], counts['revised'], counts['unchanged']) == (0, 1, 23)
+    assert stored_hours(store)[-1] == (DAY_START + 23 * 3600, 2.0)
+
+
+def test_upsert_keeps_rollups_in_step(store):
+    upsert(store, quarter_hours(DAY_START, [250] * 96))
+    upsert(store, quarter_hours(DAY_START + 12 * 3600, [500] * 4))
+
+    records, total, max_kwh = store.execute(
+        "SELECT records, total_kwh, max_kwh FROM daily_usage WHERE meter_id = 'm1' AND reading_date = '2026-01-27'"
+    ).fetchone()
+    assert (records, total, max_kwh) == (24, 25.0, 2.0)
+    assert store.execute("SELECT total_kwh FROM monthly_usage WHERE month = '2026-01'").fetchone()[0] == 25.0
+    assert store.execute("SELECT SUM(readings), SUM(total_kwh) FROM hourly_profile").fetchone() == (24, 25.0)
+
+
+def test_upsert_totals_an_hour_split_across_payloads(store):
+    upsert(store, quarter_hours(DAY_START, [100, 200]))
+    counts = upsert(store, quarter_hours(DAY_START + 1800, [300, 400]))
+
+    assert counts['revised'] == 1
+    assert stored_hours(store) == [(DAY_START, 1.0)]
+    assert store.execute("SELECT COUNT(*) FROM interval_data").fetchone()[0] == 4
+
+
+def test_watermark_only_moves_forward(store):
+    upsert(store, quarter_hours(DAY_START, [250] * 8), watermark=DAY_START + 7 * 900)
+    upsert(store, quarter_hours(DAY_START, [300] * 4), watermark=DAY_START + 3 * 900)
+
+    assert meter_store.get_watermark(store, 'm1') == DAY_START + 7 * 900
+
+
+# query_usage ----------------------------------------------------------------
+
+def store_pyramid(conn):
+    """Hourly-only (legacy) readings of 1 kWh for 2026-01-27 to 2026-02-02, 15-minute ones on 2026-02-02"""
+    meter_store.upsert_hourly_readings(
+        conn, hourly_rows(DAY_START, [1.0] * (6 * 24)), meter_id='m1')
+    upsert(conn, quarter_hours(meter_store.day_bounds('2026-02-02')[0], [250] * 96))
+
+
+def local_range(first, last):
+    return tuple(meter_store.local_to_epoch([first, last]))
+
+
+def query(conn, first, last, granularity):
+    return meter_store.query_usage(conn, *local_range(first, last), granularity)
+
+
+def test_aligned_ranges_read_the_rollups(store):
+    store_pyramid(store)
+
+    result = query(store, '2026-01-01', '2026-03-01', 'month')
+    assert result['level'] == 'month'
+    assert result['rows'] == [('2026-01', 5 * 24.0), ('2026-02', 2 * 24.0)]
+
+    result = query(store, '2026-02-01', '2026-02-03', 'day')
+    assert result['level'] == 'day'
+    assert result['rows'] == [('2026-02-01', 24.0), ('2026-02-02', 24.0)]
+
+
+def test_day_misaligned_range_sums_hours(store):
+    store_pyramid(store)
+
+    result = query(store, '2026-01-28 06:00:00', '2026-01-30', 'day')
+    assert result['level'] == 'hour'
+    assert result['rows'] == [('2026-01-28', 18.0), ('2026-01-29', 24.0)]
+
+    result = query(store, '2026-01-28 06:00:00', '2026-02-01', 'month')
+    assert result['level'] == 'hour'
+    assert result['rows'] == [('2026-01', 90.0)]
+
+
+def test_hour_misaligned_range_is_clipped_to_whole_hours(store):
+    store_pyramid(store)
+
+    # Legacy days have no interval_data; the hours are still served
+    result = query(store, '2026-01-28 06:30:00', '2026-01-28 09:15:00', 'hour')
+    assert result['level'] == 'hour'
+    assert (result['start'], result['end']) == local_range('2026-01-28 07:00:00', '2026-01-28 09:00:00')
+    assert result['rows'] == [('2026-01-28 07:00:00', 1.0), ('2026-01-28 08:00:00', 1.0)]
+
+    result = query(store, '2026-01-28 06:30:00', '2026-01-30', 'day')
+    assert result['level'] == 'hour'
+    assert result['rows'] == [('2026-01-28', 17.0), ('2026-01-29', 24.0)]
+
+
+def test_interval_granularity_reads_native_readings_only(store):
+    store_pyramid(store)
+
+    result = query(store, '2026-01-28', '2026-01-29', 'interval')
+    assert result == {'level': 'interval', 'start': local_range('2026-01-28', '2026-01-29')[0],
+                      'end': local_range('2026-01-28', '2026-01-29')[1], 'rows': []}
+
+    result = query(store, '2026-02-02 06:30:00', '2026-02-02 07:15:00', 'interval')
+    assert [label for label, _ in result['rows']] == [
+        '2026-02-02 06:30:00', '2026-02-02 06:45:00', '2026-02-02 07:00:00']
+    assert {value for _, value in result['rows']} == {0.25}
@@ -0,0 +1,69 @@
+"""Tests for parquet_snapshot.update_snapshot()"""
+
+import pyarrow.parquet as pq
+
+import meter_store
+import parquet_snapshot
+from conftest import hourly_rows
+
+
+def store_day(conn, day, value=1.0):
+    start, end = meter_store.day_bounds(day)
+    meter_store.upsert_hourly_readings(conn, hourly_rows(start, [value] * ((end - start) // 3600)), meter_id='m1')
+
+
+def partition(out_dir, month):
+    return out_dir / f"month={month}" / parquet_snapshot.PARTITION_FILE
+
+
+def test_only_changed_months_are_rewritten(store, tmp_path):
+    out_dir = tmp_path / 'parquet'
+    store_day(store, '2026-01-27')
+    store_day(store, '2026-02-03')
+
+    assert parquet_snapshot.update_snapshot(store, out_dir) == ['2026-01', '2026-02']
+    assert parquet_snapshot.update_snapshot(store, out_dir) == []
+
+    january = partition(out_dir, '2026-01').stat().st_mtime_ns
+    store_day(store, '2026-02-03', value=2.0)
+    assert parquet_snapshot.update_snapshot(store, out_dir) == ['2026-02']
+    assert partition(out_dir, '2026-01').stat().st_mtime_ns == january
+    assert set(pq.read_table(partition(out_dir, '2026-02')).column('value').to_pylist()) == {2.0}
+
+
+def test_missing_partition_or_old_layout_is_rewritten(store, tmp_path):
+    out_dir = tmp_path / 'parquet'
+    store_day(store, '2026-01-27')
+    parquet_snapshot.update_snapshot(store, out_dir)
+
+    partition(out_dir, '2026-01').unlink()
+    assert parquet_snapshot.update_snapshot(store, out_dir) == ['2026-01']
+
+    manifest = parquet_snapshot.load_manifest(out_dir)
+    manifest[parquet_snapshot.MANIFEST_VERSION_KEY] = parquet_snapshot.SNAPSHOT_VERSION - 1
+    parquet_snapshot.save_manifest(out_dir, manifest)
+    assert parquet_snapshot.update_snapshot(store, out_dir) == ['2026-01']
+
+
+def test_months_without_readings_are_removed(store, tmp_path):
+    out_dir = tmp_path / 'parquet'
+    store_day(store, '2026-01-27')
+    store_day(store, '2026-02-03')
+    parquet_snapshot.update_snapshot(store, out_dir)
+
+    store.execute("DELETE FROM meter_data WHERE dttm_start >= '2026-02-01'")
+    meter_store.rebuild_rollups(store)
+    assert parquet_snapshot.update_snapshot(store, out_dir) == []
+    assert not (out_dir / 'month=2026-02').exists()
+
+
+def test_repeated_dst_hour_keeps_both_readings(store, tmp_path):
+    out_dir = tmp_path / 'parquet'
+    store_day(store, '2025-11-02')
+    parquet_snapshot.update_snapshot(store, out_dir)
+
+    table = pq.read_table(partition(out_dir, '2025-11'))
+    starts = table.column('dttm_start').to_pylist()
+    assert table.num_rows == 25
+    assert len({start.timestamp() for start in starts}) == 25
+    assert [start.hour for start in starts[:3]] == [0, 1, 1]
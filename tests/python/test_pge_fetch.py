@@ -0,0 +1,120 @@
+"""Tests for pge_fetch.EspiFetcher"""
+
+import threading
+import time
+from email.utils import formatdate
+
+import pge_fetch
+
+URI = 'https://api.pge.com/GreenButtonConnect/espi/1_1/resource/Batch/Bulk/50098?correlationID=000000001'
+
+
+class FakeApi:
+    """SelfAccessApi stand-in counting token requests"""
+
+    cert = None
+
+    def __init__(self):
+        self.access_token = 'token-1'
+        self.token_requests = 0
+
+    def need_token(self):
+        return False
+
+    def get_token(self):
+        self.token_requests += 1
+        self.access_token = f"token-{self.token_requests + 1}"
+
+
+class FakeResponse:
+    def __init__(self, status_code, text='', headers=None):
+        self.status_code = status_code
+        self.text = text
+        self.headers = headers or {}
+
+
+class ScriptedSession:
+    """Answers GETs from a list of responses, recording the bearer token sent"""
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.tokens = []
+        self.lock = threading.Lock()
+
+    def get(self, uri, headers=None, timeout=None):
+        with self.lock:
+            self.tokens.append(headers['Authorization'])
+            return self.responses.pop(0)
+
+
+def fetcher_with(responses, monkeypatch, **kwargs):
+    delays = []
+    monkeypatch.setattr(pge_fetch.time, 'sleep', delays.append)
+    fetcher = pge_fetch.EspiFetcher(FakeApi(), **kwargs)
+    fetcher.session = ScriptedSession(responses)
+    return fetcher, delays
+
+
+def test_403_refreshes_the_token_once(monkeypatch):
+    fetcher, delays = fetcher_with([FakeResponse(403), FakeResponse(200, '<feed/>')], monkeypatch)
+    result = fetcher.fetch(URI)
+
+    assert result['ok'] and result['data'] == '<feed/>' and result['attempts'] == 2
+    assert fetcher.session.tokens == ['Bearer token-1', 'Bearer token-2']
+    assert delays == []  # retried at once with the new token
+
+    fetcher, _ = fetcher_with([FakeResponse(403), FakeResponse(403)], monkeypatch)
+    result = fetcher.fetch(URI)
+    assert not result['ok'] and result['error'] == 'HTTP 403' and result['attempts'] == 2
+    assert fetcher.pge_api.token_requests == 1
+
+
+def test_429_waits_for_retry_after(monkeypatch):
+    responses = [FakeResponse(429, headers={'Retry-After': '7'}), FakeResponse(503), FakeResponse(200, 'ok')]
+    fetcher, delays = fetcher_with(responses, monkeypatch)
+    result = fetcher.fetch(URI)
+
+    assert result['ok'] and result['attempts'] == 3
+    assert delays[0] >= 7
+    assert len(delays) == 2
+
+
+def test_gives_up_after_max_retries_and_on_client_errors(monkeypatch):
+    fetcher, delays = fetcher_with([FakeResponse(503)] * 3, monkeypatch, max_retries=2)
+    result = fetcher.fetch(URI)
+    assert not result['ok'] and result['attempts'] == 3 and len(delays) == 2
+
+    fetcher, delays = fetcher_with([FakeResponse(404)], monkeypatch)
+    result = fetcher.fetch(URI)
+    assert not result['ok'] and result['status'] == 404 and result['attempts'] == 1 and delays == []
+
+
+def test_parse_retry_after():
+    assert pge_fetch.parse_retry_after('12') == 12.0
+    assert pge_fetch.parse_retry_after(None) is None
+    assert pge_fetch.parse_retry_after('soon') is None
+    assert 25 <= pge_fetch.parse_retry_after(formatdate(time.time() + 30, usegmt=True)) <= 30
+
+
+def test_fetch_all_bounds_requests_in_flight(monkeypatch):
+    in_flight, peak = [0], [0]
+    lock = threading.Lock()
+
+    def fetch(uri):
+        with lock:
+            in_flight[0] += 1
+            peak[0] = max(peak[0], in_flight[0])
+        time.sleep(0.01)
+        with lock:
+            in_flight[0] -= 1
+        return {'uri': uri}
+
+    fetcher = pge_fetch.EspiFetcher(FakeApi(), concurrency=2)
+    monkeypatch.setattr(fetcher, 'fetch', fetch)
+    uris = [f"{URI[:-1]}{i}" for i in range(6)]
+
+    results = [result['uri'] for result in fetcher.fetch_all(uris)]
+    fetcher.close()
+
+    assert sorted(results) == sorted(uris)
+    assert peak[0] <= 2
@@ -0,0 +1,94 @@
+"""Tests for pipeline_metrics run records, Prometheus textfiles and profiles"""
+
+import json
+import threading
+
+import pytest
+
+import pipeline_metrics
+
+
+def read_records(out_dir, script='job'):
+    return [json.loads(line) for line in (out_dir / f"{script}.jsonl").read_text().splitlines()]
+
+
+def test_stages_and_counters_accumulate_across_threads():
+    metrics = pipeline_metrics.RunMetrics('job')
+
+    def work():
+        for _ in range(100):
+            with metrics.stage('parse') as stage:
+                stage['items'] += 2
+            metrics.incr('readings', 3)
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    metrics.add_time('fetch', 1.5, items=30)
+    metrics.finish()
+
+    record = metrics.record()
+    assert record['stages']['parse']['calls'] == 400
+    assert record['stages']['parse']['items'] == 800
+    assert record['stages']['fetch'] == {'seconds': 1.5, 'calls': 1, 'items': 30, 'items_per_sec': 20.0}
+    assert record['counters'] == {'readings': 1200}
+    assert record['status'] == 'ok'
+
+
+def test_instrument_appends_a_record_and_replaces_the_textfile(tmp_path):
+    for run in range(2):
+        with pipeline_metrics.instrument('job', out_dir=tmp_path) as metrics:
+            metrics.incr('bytes_fetched', 100 * (run + 1))
+            metrics.exit_code = 0
+
+    records = read_records(tmp_path)
+    assert [record['counters']['bytes_fetched'] for record in records] == [100, 200]
+    prom = (tmp_path / 'job.prom').read_text()
+    assert 'pge_pipeline_bytes_fetched{script="job"} 200\n' in prom
+    assert 'pge_pipeline_last_run_success{script="job"} 1\n' in prom
+    assert not (tmp_path / 'job.prom.tmp').exists()
+
+
+def test_failed_run_is_recorded_and_reraised(tmp_path):
+    with pytest.raises(RuntimeError):
+        with pipeline_metrics.instrument('job', out_dir=tmp_path) as metrics:
+            with metrics.stage('write'):
+                raise RuntimeError('database is locked')
+
+    record, = read_records(tmp_path)
+    assert record['status'] == 'error'
+    assert record['error'] == 'RuntimeError: database is locked'
+    assert record['stages']['write']['calls'] == 1
+    assert 'pge_pipeline_last_run_success{script="job"} 0\n' in (tmp_path / 'job.prom').read_text()
+
+
+def test_nonzero_exit_code_marks_the_run_failed():
+    metrics = pipeline_metrics.RunMetrics('job')
+    metrics.exit_code = 1
+    metrics.finish()
+    assert metrics.record()['status'] == 'error'
+
+
+def test_unwritable_metrics_dir_does_not_fail_the_run(tmp_path, caplog):
+    blocker = tmp_path / 'metrics'
+    blocker.write_text('')
+
+    with pipeline_metrics.instrument('job', out_dir=blocker) as metrics:
+        metrics.exit_code = 0
+    assert 'Could not write run metrics' in caplog.text
+
+
+def test_profiler_dumps_cpu_and_memory_profiles(tmp_path, monkeypatch):
+    monkeypatch.setattr(pipeline_metrics, 'PROFILE_MODES', {'cpu', 'memory'})
+
+    with pipeline_metrics.instrument('job', out_dir=tmp_path):
+        worker = threading.Thread(target=lambda: sum(range(1000)))
+        worker.start()
+        worker.join()
+
+    profiles = tmp_path / 'profiles'
+    for pattern in ('job-*.pstats', 'job-*-cpu.txt', 'job-*-memory.txt'):
+        assert len(list(profiles.glob(pattern))) == 1
+    assert 'Traced memory' in next(profiles.glob('job-*-memory.txt')).read_text()
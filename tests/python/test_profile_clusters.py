@@ -0,0 +1,72 @@
+"""Tests for profile_clusters.py"""
+
+import numpy as np
+
+import meter_store
+import profile_clusters
+from conftest import hourly_rows
+
+LOW = [0.2] * 24
+EVENING = [0.3] * 17 + [2.0] * 5 + [0.3] * 2
+HIGH = [1.5] * 24
+
+
+def synthetic_points(days_per_shape=10, seed=0):
+    """Noisy days of three load shapes, in shuffled order"""
+    rng = np.random.default_rng(seed)
+    shapes = np.array([HIGH, LOW, EVENING])
+    which = rng.permutation(np.repeat(np.arange(len(shapes)), days_per_shape))
+    return shapes[which] + rng.normal(0, 0.02, (len(which), 24)), which
+
+
+def test_clusters_are_numbered_by_daily_total():
+    points, which = synthetic_points()
+    result = profile_clusters.fit_k(points, 3, n_init=3)
+
+    totals = result['centers'].sum(axis=1)
+    assert list(totals) == sorted(totals)
+    # LOW < EVENING < HIGH by daily total, whatever order k-means found them in
+    expected = {0: 3, 1: 1, 2: 2}  # HIGH, LOW, EVENING
+    assert list(result['labels']) == [expected[shape] for shape in which]
+
+
+def test_labels_are_stable_across_runs_and_new_days():
+    points, _ = synthetic_points()
+    first = profile_clusters.fit_k(points, 3, n_init=3)
+    again = profile_clusters.fit_k(points, 3, n_init=3)
+    assert list(first['labels']) == list(again['labels'])
+
+    more_points, _ = synthetic_points(seed=1)
+    grown = profile_clusters.fit_k(np.vstack([points, more_points]), 3, n_init=3)
+    assert list(grown['labels'][:len(points)]) == list(first['labels'])
+
+
+def store_days(conn, first_day, shapes):
+    start = meter_store.day_bounds(first_day)[0]
+    meter_store.upsert_hourly_readings(
+        conn, hourly_rows(start, [value for shape in shapes for value in shape]), meter_id='m1')
+
+
+def test_update_clusters_reruns_only_when_data_changes(store):
+    store_days(store, '2026-01-05', [LOW, EVENING] * 5)
+
+    def update(**kwargs):
+        return profile_clusters.update_clusters(store, min_k=2, max_k=3, jobs=1, **kwargs)
+
+    assert update() == {'*': 'clustered', 'm1': 'clustered'}
+    assert update() == {'*': 'current', 'm1': 'current'}
+    assert dict(store.execute(
+        "SELECT reading_date, cluster FROM profile_assignments WHERE meter_id = 'm1' AND k = 2"
+    ).fetchall()) == {f"2026-01-{day:02d}": 1 if day % 2 else 2 for day in range(5, 15)}
+
+    store_days(store, '2026-01-15', [HIGH])
+    assert update(meters=['m1']) == {'m1': 'clustered'}
+    assert store.execute(
+        "SELECT cluster FROM profile_assignments WHERE meter_id = 'm1' AND k = 3 AND reading_date = '2026-01-15'"
+    ).fetchone() == (3,)
+    assert update(meters=['m1', 'other']) == {'m1': 'current'}
+
+
+def test_too_few_days_are_not_clustered(store):
+    store_days(store, '2026-01-05', [LOW])
+    assert profile_clusters.update_clusters(store, meters=['m1'], min_k=2, max_k=3, jobs=1) == {'m1': 'too few days'}
@@ -0,0 +1,69 @@
+"""Tests for query_service.py ETags"""
+
+import sqlite3
+import urllib.error
+import urllib.request
+
+import pytest
+
+import meter_store
+import query_service
+from conftest import hourly_rows
+
+FIRST_TS = meter_store.day_bounds('2026-01-27')[0]
+PATH = '/usage?start=2026-01-27&end=2026-01-28&granularity=day&stats=sum'
+
+
+@pytest.fixture
+def service(store):
+    meter_store.upsert_hourly_readings(store, hourly_rows(FIRST_TS, [1.0] * 24), meter_id='m1')
+    db_path = store.execute("PRAGMA database_list").fetchone()[2]
+    server, base_url = query_service.start_server(db_path, port=0)
+    yield store, base_url
+    server.shutdown()
+    server.server_close()
+
+
+def get(url, etag=None):
+    """Return (status, ETag) of a GET"""
+    request = urllib.request.Request(url, headers={'If-None-Match': etag} if etag else {})
+    try:
+        with urllib.request.urlopen(request) as response:
+            return response.status, response.headers['ETag']
+    except urllib.error.HTTPError as e:
+        return e.code, e.headers['ETag']
+
+
+def test_etag_survives_unchanged_ingest_and_checkpoint(service):
+    store, base_url = service
+    status, etag = get(base_url + PATH)
+    assert status == 200
+
+    counts = meter_store.upsert_hourly_readings(store, hourly_rows(FIRST_TS, [1.0] * 24), meter_id='m1')
+    assert counts['unchanged'] == 24
+    store.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    store.execute("VACUUM")
+    assert get(base_url + PATH, etag) == (304, etag)
+
+
+def test_etag_changes_with_the_data(service):
+    store, base_url = service
+    _, etag = get(base_url + PATH)
+
+    meter_store.upsert_hourly_readings(store, hourly_rows(FIRST_TS, [2.0]), meter_id='m1')
+    status, new_etag = get(base_url + PATH, etag)
+    assert status == 200 and new_etag != etag
+
+    meter_store.rebuild_rollups(store)
+    assert get(base_url + PATH, new_etag)[0] == 200
+
+
+def test_unmigrated_database_is_reported(tmp_path):
+    path = tmp_path / 'old.sqlite'
+    sqlite3.connect(path).close()
+    server, base_url = query_service.start_server(path, port=0)
+    try:
+        assert get(base_url + '/health')[0] == 503
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,102 @@
+"""Tests for repair_meter_data.py rule selection"""
+
+import meter_store
+import repair_meter_data
+from conftest import hourly_rows
+
+
+def load_days(conn, first_day, days):
+    """Store consecutive local days of hourly values, one list of 24 per day"""
+    start = meter_store.day_bounds(first_day)[0]
+    values = [value for day in days for value in day]
+    meter_store.upsert_hourly_readings(conn, hourly_rows(start, values), meter_id='m1')
+
+
+def stored(conn, day):
+    first, last = meter_store.day_bounds(day)
+    return [row[0] for row in conn.execute(
+        "SELECT value FROM meter_data WHERE ts >= ? AND ts < ? ORDER BY ts", (first, last))]
+
+
+def rule_for(*argv):
+    args = repair_meter_data.parse_args(list(argv))
+    return repair_meter_data.build_rule(args), args.period
+
+
+def test_detect_units_rescales_whole_wh_days(store):
+    # A Wh day with fractional and small readings, then a kWh day with one spike
+    wh_day = [115.0] * 20 + [260.5, 232.5, 5.0, 0.0]
+    kwh_day = [0.4] * 23 + [12.0]
+    load_days(store, '2026-01-27', [wh_day, kwh_day])
+
+    rule, (_, start, end) = rule_for('--period', '2026-01', '--detect-units')
+    summary = repair_meter_data.preview(store, rule, start, end)
+    assert summary['rows'] == 24
+    assert [day for _, day in summary['days']] == ['2026-01-27']
+
+    assert repair_meter_data.repair(store, rule, start, end) == 24
+    assert stored(store, '2026-01-27') == [v / 1000 for v in wh_day]
+    assert stored(store, '2026-01-28') == kwh_day
+    total = store.execute("SELECT total_kwh FROM daily_usage WHERE reading_date = '2026-01-27'").fetchone()[0]
+    assert abs(total - sum(wh_day) / 1000) < 1e-9
+
+
+def test_detect_units_is_idempotent(store):
+    load_days(store, '2026-01-27', [[150.0] * 24])
+    rule, (_, start, end) = rule_for('--period', '2026-01', '--detect-units')
+    repair_meter_data.repair(store, rule, start, end)
+
+    assert repair_meter_data.preview(store, rule, start, end)['rows'] == 0
+
+
+def test_scale_respects_value_filters_and_meter(store):
+    load_days(store, '2026-01-27', [[0.5] * 12 + [50.0] * 12])
+    rule, (_, start, end) = rule_for('--period', '2026-01-27:2026-01-27', '--scale', '0.01',
+                                     '--min-value', '10', '--meter', 'other')
+    assert repair_meter_data.preview(store, rule, start, end)['rows'] == 0
+
+    rule, (_, start, end) = rule_for('--period', '2026-01-27:2026-01-27', '--scale', '0.01',
+                                     '--min-value', '10')
+    repair_meter_data.repair(store, rule, start, end)
+    assert stored(store, '2026-01-27') == [0.5] * 24
+
+
+def test_shift_refuses_to_overwrite_readings(store):
+    load_days(store, '2026-01-27', [[1.0] * 24])
+    rule, (_, start, end) = rule_for('--period', '2026-01-27:2026-01-27', '--shift', '1',
+                                     '--max-value', '5')
+    summary = repair_meter_data.preview(store, rule, start, end)
+    assert summary['rows'] == 24
+    assert summary['collisions'] == 0  # every moved row vacates the slot the next one needs
+
+    rule, (_, start, end) = rule_for('--period', '2026-01-27:2026-01-27', '--shift', '1',
+                                     '--min-value', '5')
+    load_days(store, '2026-01-27', [[1.0] * 12 + [9.0] + [1.0] * 11])
+    summary = repair_meter_data.preview(store, rule, start, end)
+    assert summary['rows'] == 1 and summary['collisions'] == 1
+
+
+def test_shift_dry_run_leaves_the_database_untouched(store, tmp_path, capsys):
+    load_days(store, '2026-01-27', [[1.0] * 24])
+    store.commit()
+
+    assert repair_meter_data.main(['--db', str(tmp_path / 'meter.sqlite'), '--period', '2026-01-27:2026-01-27',
+                                   '--shift', '1', '--min-value', '5']) == 0
+    assert 'Nothing to repair' in capsys.readouterr().out
+
+    assert repair_meter_data.main(['--db', str(tmp_path / 'meter.sqlite'), '--period', '2026-01-27:2026-01-27',
+                                   '--shift', '-2']) == 0
+    out = capsys.readouterr().out
+    assert 'Rows affected: 24' in out and 'Dry run' in out
+    assert stored(store, '2026-01-27') == [1.0] * 24
+
+
+def test_shift_across_dst_derives_local_times(store):
+    load_days(store, '2026-03-07', [[1.0] * 24])
+    rule, (_, start, end) = rule_for('--period', '2026-03-07:2026-03-07', '--shift', '3')
+
+    assert repair_meter_data.repair(store, rule, start, end) == 24
+    local = [row[0] for row in store.execute("SELECT dttm_start FROM meter_data ORDER BY ts")]
+    # 23:00 on the 7th + 3h lands after the spring-forward gap at 02:00 on the 8th
+    assert local[:2] == ['2026-03-07 03:00:00', '2026-03-07 04:00:00']
+    assert local[-3:] == ['2026-03-08 00:00:00', '2026-03-08 01:00:00', '2026-03-08 03:00:00']
@@ -0,0 +1,101 @@
+"""Tests for token_cache.TokenCache"""
+
+import os
+import stat
+import threading
+import time
+
+import pytest
+
+import token_cache
+
+pytestmark = pytest.mark.skipif(os.name != 'posix', reason="file modes and fcntl locks are POSIX only")
+
+
+class FakeApi:
+    """SelfAccessApi stand-in whose get_token() issues numbered tokens"""
+
+    issued = 0
+    issue_lock = threading.Lock()
+
+    def __init__(self, client_id='client', lifetime=3600):
+        self.client_id = client_id
+        self.token_uri = 'https://example.test/token'
+        self.lifetime = lifetime
+        self.access_token = None
+        self.access_token_exp = None
+
+    def get_token(self):
+        time.sleep(0.05)  # Long enough for concurrent refreshes to overlap
+        with FakeApi.issue_lock:
+            FakeApi.issued += 1
+            self.access_token = f"token-{FakeApi.issued}"
+        self.access_token_exp = time.time() + self.lifetime
+
+
+@pytest.fixture(autouse=True)
+def reset_issued():
+    FakeApi.issued = 0
+
+
+def mode(path):
+    return stat.S_IMODE(path.stat().st_mode)
+
+
+def test_token_is_cached_owner_only_and_reused(tmp_path):
+    cache = token_cache.TokenCache(tmp_path / 'cache' / 'token.json')
+    cache.refresh(FakeApi())
+
+    assert mode(cache.path) == 0o600
+    assert mode(cache.path.parent) == 0o700
+    assert 'client' not in cache.path.read_text()
+
+    api = FakeApi()
+    cache.refresh(api)
+    assert api.access_token == 'token-1'
+    assert FakeApi.issued == 1
+
+
+def test_readable_cache_file_is_ignored_and_replaced(tmp_path):
+    cache = token_cache.TokenCache(tmp_path / 'token.json')
+    cache.refresh(FakeApi())
+    cache.path.chmod(0o644)
+
+    api = FakeApi()
+    cache.refresh(api)
+    assert api.access_token == 'token-2'
+    assert mode(cache.path) == 0o600
+
+
+@pytest.mark.parametrize('api, force', [
+    (FakeApi(client_id='other'), False),
+    (FakeApi(), True),
+])
+def test_other_credentials_or_forced_refresh_get_a_new_token(tmp_path, api, force):
+    cache = token_cache.TokenCache(tmp_path / 'token.json')
+    cache.refresh(FakeApi())
+
+    cache.refresh(api, force=force)
+    assert api.access_token == 'token-2'
+
+
+def test_token_about_to_expire_is_not_reused(tmp_path):
+    cache = token_cache.TokenCache(tmp_path / 'token.json')
+    cache.refresh(FakeApi(lifetime=token_cache.TOKEN_EXPIRY_MARGIN_SECONDS - 1))
+
+    api = FakeApi()
+    cache.refresh(api)
+    assert api.access_token == 'token-2'
+
+
+def test_concurrent_refreshes_fetch_one_token(tmp_path):
+    cache_path = tmp_path / 'token.json'
+    apis = [FakeApi() for _ in range(4)]
+    threads = [threading.Thread(target=token_cache.TokenCache(cache_path).refresh, args=(api,)) for api in apis]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert FakeApi.issued == 1
+    assert {api.access_token for api in apis} == {'token-1'}